@@ -69,10 +69,21 @@
 #               floating point generation. Used for
 #               "random" part of "Random Walk on a
 #               Discrete Line"
+#   *   array:  compact per-candidate storage for the
+#               population engine
+#   *   json / os / zlib: writing and reading
+#               checkpoints of long searches; imported
+#               by the checkpoint functions themselves,
+#               since most runs never checkpoint
+#   *   instrumentation: per-stage metrics and the
+#               generation counters (off unless
+#               enabled)
 #
 # ==================================================
 from timeit import default_timer # used to time performance
 import random
+from array import array
+import instrumentation
 
 
 
@@ -188,21 +199,31 @@ def removal_reproduce( population ):
 #       as we may never encounter the solution this way.
 #   -   Because of this, generations are given a finite,
 #       arbitrarily large cap.
-#
-# ==================================================
-def remove_spaces( original_string , population_size=5 ):
-    species_model  =  {
-                            'text': original_string,
-                            'fitness': removal_fitness(original_string)
-                      }
+#   -   checkpoint (a Checkpointer) saves the search
+#       periodically; state (from load_checkpoint)
+#       continues a saved search -- see
+#       resume_from_checkpoint
+#
+# ==================================================
+def remove_spaces( original_string , population_size=5 , checkpoint=None , state=None ):
+    if state is not None:
+        species_model , generation  =  _resume_state( state )
+    else:
+        species_model  =  {
+                                'text': original_string,
+                                'fitness': removal_fitness(original_string)
+                          }
+        generation     =  0
     population     =  [ species_model ] * population_size
-    generation     =  0
     while generation <= 500000:
         generation  +=  1
         population   =  removal_reproduce( population )
         population   =  sorted( population , key=lambda x : x[ 'fitness' ] , reverse=True )
         if population[ 0 ][ 'text' ].count( ' ' ) == 0:
             break
+        if checkpoint is not None and checkpoint.due( generation ):
+            checkpoint.save( 'remove' , 'dict' , population[ 0 ] , generation , population_size )
+    instrumentation.count( 'rwoadl.remove.generations' , generation )
     return population[ 0 ][ 'text' ]
 
 
@@ -312,26 +333,545 @@ def restore_reproduce( population , original_string ):
 #   -   Since the algorithm relies so heavily on probability,
 #       runtime performance can grow significantly as the
 #       length of the text increases.
-#
-# ==================================================
-def restore_spaces( original_string , removal , population_size ):
-    species_model  =  {
-                            'text'          :  removal,
-                            'fitness'       :  restore_fitness( removal , original_string , 0 ),
-                            'last_mutation' :  0
-                      }
+#   -   checkpoint (a Checkpointer) saves the search
+#       periodically; state (from load_checkpoint)
+#       continues a saved search -- see
+#       resume_from_checkpoint
+#
+# ==================================================
+def restore_spaces( original_string , removal , population_size , checkpoint=None , state=None ):
+    if state is not None:
+        species_model , generation  =  _resume_state( state )
+    else:
+        species_model  =  {
+                                'text'          :  removal,
+                                'fitness'       :  restore_fitness( removal , original_string , 0 ),
+                                'last_mutation' :  0
+                          }
+        generation     =  0
     population     =  [ species_model ] * population_size
-    generation     =  0
     while generation <= 50000000:
         generation  +=  1
         population   =  restore_reproduce( population , original_string )
         population   =  sorted( population, key=lambda x : x[ 'fitness' ] )
         if population[ 0 ][ 'fitness' ] == 0:
             break
+        if checkpoint is not None and checkpoint.due( generation ):
+            checkpoint.save( 'restore' , 'dict' , population[ 0 ] , generation , population_size )
+    instrumentation.count( 'rwoadl.restore.generations' , generation )
     return population[ 0 ][ 'text' ]
 
 
 
+# ==================================================
+# CLASS: Population
+# ==================================================
+#
+# Description:
+#   Compact stand-in for the list of candidate
+#   dictionaries used above. Every child differs from
+#   the shared parent by a single mutation, so a child
+#   is stored as just its mutation position; the only
+#   string kept alive is the parent's.
+#
+#       -   slot 0 is the parent itself (mutation -1),
+#           matching children[ 0 ] in the reproduce
+#           functions above
+#       -   'fitness' holds one score per slot, filled
+#           in by evaluate( )
+#       -   best( ) is a single linear scan; ties go to
+#           the lowest slot, just as the stable sort did
+#
+# ==================================================
+class Population( object ):
+    __slots__  =  ( 'parent' , 'parent_fitness' , 'last_mutation' , 'insert' ,
+                    'mutations' , 'fitness' )
+
+    # ==================================================
+    # METHOD: __init__
+    # ==================================================
+    #
+    # Input:
+    #       -   parent:         text every child mutates
+    #       -   parent_fitness: the parent's own score
+    #       -   size:           number of slots
+    #       -   insert:         True if a mutation inserts a
+    #                           space, False if it deletes a
+    #                           character
+    #       -   last_mutation:  the parent's mutation point
+    #
+    # ==================================================
+    def __init__( self , parent , parent_fitness , size , insert , last_mutation=0 ):
+        self.parent          =  parent
+        self.parent_fitness  =  parent_fitness
+        self.last_mutation   =  last_mutation
+        self.insert          =  insert
+        self.mutations       =  array( 'q' , [ -1 ] * size )
+        self.fitness         =  array( 'q' , [ parent_fitness ] * size )
+
+    # ==================================================
+    # METHOD: spawn
+    # ==================================================
+    #
+    # Task:   draw a fresh mutation point for every slot
+    #         after the parent, using the same random
+    #         calls (and so the same sequence for a given
+    #         seed) as removal_reproduce/restore_reproduce
+    #
+    # ==================================================
+    def spawn( self ):
+        low   =  self.last_mutation + 1 if self.insert else 0
+        high  =  len( self.parent ) - 1
+        for i in range( 1 , len( self.mutations ) ):
+            self.mutations[ i ]  =  random.randint( low , high )
+
+    # ==================================================
+    # METHOD: child
+    # ==================================================
+    #
+    # Input:  slot number
+    #
+    # Output: that candidate's text, built on demand
+    #
+    # ==================================================
+    def child( self , slot ):
+        position  =  self.mutations[ slot ]
+        if position < 0:
+            return self.parent
+        if self.insert:
+            return self.parent[ : position ] + ' ' + self.parent[ position : ]
+        return self.parent[ : position ] + self.parent[ position + 1 : ]
+
+    # ==================================================
+    # METHOD: evaluate
+    # ==================================================
+    #
+    # Input:  function scoring a candidate's text
+    #
+    # Task:   score every child in one pass; each child's
+    #         text only lives for the duration of its call
+    #
+    # ==================================================
+    def evaluate( self , score ):
+        fitness       =  self.fitness
+        fitness[ 0 ]  =  self.parent_fitness
+        for slot in range( 1 , len( fitness ) ):
+            fitness[ slot ]  =  score( self.child( slot ) )
+
+    # ==================================================
+    # METHOD: evaluate_with
+    # ==================================================
+    #
+    # Input:  incremental evaluator (see
+    #         IncrementalRemovalFitness and
+    #         IncrementalRestoreFitness)
+    #
+    # Task:   score every child from the parent's known
+    #         state and its mutation position alone,
+    #         without building any child text
+    #
+    # ==================================================
+    def evaluate_with( self , evaluator ):
+        fitness       =  self.fitness
+        fitness[ 0 ]  =  self.parent_fitness
+        score         =  evaluator.child_fitness
+        parent        =  self.parent
+        for slot in range( 1 , len( fitness ) ):
+            fitness[ slot ]  =  score( parent , self.parent_fitness , self.mutations[ slot ] )
+
+    # ==================================================
+    # METHOD: best
+    # ==================================================
+    #
+    # Input:  True if higher scores are better
+    #
+    # Output: slot of the best candidate (linear argmax)
+    #
+    # ==================================================
+    def best( self , highest=True ):
+        fitness  =  self.fitness
+        target   =  max( fitness ) if highest else min( fitness )
+        return fitness.index( target )
+
+    # ==================================================
+    # METHOD: model
+    # ==================================================
+    #
+    # Output: the parent as a candidate dictionary, in the
+    #         form used by the dictionary-based functions
+    #
+    # ==================================================
+    def model( self ):
+        return {
+                    'text'          :  self.parent,
+                    'fitness'       :  self.parent_fitness,
+                    'last_mutation' :  self.last_mutation
+               }
+
+    # ==================================================
+    # METHOD: advance
+    # ==================================================
+    #
+    # Input:  slot of the candidate that survives
+    #
+    # Task:   make that candidate the parent of the next
+    #         generation
+    #
+    # ==================================================
+    def advance( self , slot ):
+        if slot == 0:
+            return
+        self.last_mutation   =  self.mutations[ slot ]
+        self.parent          =  self.child( slot )
+        self.parent_fitness  =  self.fitness[ slot ]
+        self.mutations[ 0 ]  =  -1
+
+
+
+# ==================================================
+# CLASS: IncrementalRemovalFitness
+# ==================================================
+#
+# Description:
+#   Scores removal candidates in O(1) from the
+#   parent's state instead of recounting the whole
+#   text with removal_fitness.
+#
+#   removal_fitness is 2 * ( length - spaces ) - spaces,
+#   so deleting one character from the parent changes
+#   the score by:
+#       -   +1 if the deleted character was a space
+#       -   -2 otherwise
+#
+#   It also keeps the parent's space count, so "are
+#   all the spaces gone?" needs no rescan either.
+#
+# ==================================================
+class IncrementalRemovalFitness( object ):
+    __slots__  =  ( 'spaces' , )
+
+    def __init__( self , parent ):
+        self.spaces  =  parent.count( ' ' )
+
+    def child_fitness( self , parent , parent_fitness , position ):
+        if parent[ position ] == ' ':
+            return parent_fitness + 1
+        return parent_fitness - 2
+
+    def accept( self , parent , position ):
+        if parent[ position ] == ' ':
+            self.spaces  -=  1
+
+
+
+# ==================================================
+# CLASS: IncrementalRestoreFitness
+# ==================================================
+#
+# Description:
+#   Scores restore candidates in O(1) (apart from a
+#   walk across a run of spaces) instead of rescanning
+#   the candidate with restore_fitness.
+#
+#   The walk starts from the fully stripped text and
+#   only ever accepts a child that matches the
+#   original further than its parent, so every parent
+#   looks like:
+#       original[ : P ] + ( original[ P : ] stripped )
+#   where P, the first mismatch, is the index of the
+#   next space still missing: the k-th space of the
+#   original for some k. With that known, inserting a
+#   space at position m gives a first mismatch of:
+#       -   P, when m > P (the parent's mismatch stays)
+#       -   m, when m < P and original[ m ] is not a
+#           space
+#       -   the end of the run + 1, when m < P falls
+#           inside a run of spaces that stops before P
+#       -   the (k+1)-th space of the original, when m is
+#           P or in the run of spaces just before it
+#   and the score is len( original ) minus that index,
+#   exactly as restore_fitness computes it.
+#
+#   If the starting text is not the stripped original
+#   the reasoning above does not hold, and every child
+#   is scored with restore_fitness instead.
+#
+# ==================================================
+class IncrementalRestoreFitness( object ):
+    __slots__  =  ( 'original' , 'spaces' , 'k' , 'incremental' , 'last_mutation' )
+
+    def __init__( self , original_string , removal ):
+        self.original       =  original_string
+        self.spaces         =  [ i for i , c in enumerate( original_string ) if c == ' ' ]
+        self.k              =  0
+        self.incremental    =  removal == original_string.replace( ' ' , '' )
+        self.last_mutation  =  0
+
+    def _missing( self ):
+        if self.k < len( self.spaces ):
+            return self.spaces[ self.k ]
+        return len( self.original )
+
+    def child_fitness( self , parent , parent_fitness , position ):
+        original  =  self.original
+        length    =  len( parent ) + 1
+        if not self.incremental:
+            child  =  parent[ : position ] + ' ' + parent[ position : ]
+            return restore_fitness( child , original , self.last_mutation )
+        if length > len( original ):
+            return 10000
+        missing  =  self._missing( )
+        if position > missing:
+            mismatch  =  missing
+        elif original[ position ] != ' ':
+            mismatch  =  position
+        else:
+            mismatch  =  position + 1
+            while mismatch < missing and original[ mismatch ] == ' ':
+                mismatch  +=  1
+            if mismatch >= missing:
+                following  =  self.k + 1
+                mismatch   =  self.spaces[ following ] if following < len( self.spaces ) else length
+        if mismatch >= length:
+            return 0
+        return len( original ) - mismatch
+
+    def accept( self , parent , position ):
+        self.last_mutation  =  position
+        if self.incremental:
+            self.k  +=  1
+
+    def resume( self , parent , last_mutation ):
+        self.last_mutation  =  last_mutation
+        self.k              =  len( parent ) - ( len( self.original ) - len( self.spaces ) )
+
+
+
+# ==================================================
+# FUNCTION: remove_spaces_compact
+# ==================================================
+#
+# Input:
+#       -   original_string: string to remove spaces from
+#       -   population_size: number of candidates to produce each gen
+#
+# Output: string representing the original string with all spaces removed
+#
+# Task:   The same walk as remove_spaces, run on a
+#         Population: children are mutation positions
+#         rather than copied strings and dictionaries,
+#         they are scored incrementally from the parent's
+#         state, and the survivor is found with a linear
+#         scan rather than by sorting the generation
+#
+# ==================================================
+def remove_spaces_compact( original_string , population_size=5 , checkpoint=None , state=None ):
+    if state is not None:
+        model , generation  =  _resume_state( state )
+        population          =  Population( model[ 'text' ] , model[ 'fitness' ] ,
+                                           population_size , insert=False )
+    else:
+        population  =  Population( original_string , removal_fitness( original_string ) ,
+                                   population_size , insert=False )
+        generation  =  0
+    evaluator   =  IncrementalRemovalFitness( population.parent )
+    while generation <= 500000:
+        generation  +=  1
+        population.spawn( )
+        population.evaluate_with( evaluator )
+        best  =  population.best( highest=True )
+        if best:
+            evaluator.accept( population.parent , population.mutations[ best ] )
+        population.advance( best )
+        if evaluator.spaces == 0:
+            break
+        if checkpoint is not None and checkpoint.due( generation ):
+            checkpoint.save( 'remove' , 'compact' , population.model( ) , generation , population_size )
+    instrumentation.count( 'rwoadl.remove.generations' , generation )
+    return population.parent
+
+
+
+# ==================================================
+# FUNCTION: restore_spaces_compact
+# ==================================================
+#
+# Input:
+#       -   original_string: original string before spaces were removed
+#       -   removal: starting string where all the spaces have been removed already
+#       -   population_size: number of candidates to produce each gen
+#
+# Output: string representing the removal string with all spaces restored
+#
+# Task:   The same walk as restore_spaces, run on a
+#         Population (see remove_spaces_compact)
+#
+# ==================================================
+def restore_spaces_compact( original_string , removal , population_size , checkpoint=None ,
+                            state=None ):
+    evaluator   =  IncrementalRestoreFitness( original_string , removal )
+    if state is not None:
+        model , generation  =  _resume_state( state )
+        population          =  Population( model[ 'text' ] , model[ 'fitness' ] , population_size ,
+                                           insert=True , last_mutation=model[ 'last_mutation' ] )
+        evaluator.resume( model[ 'text' ] , model[ 'last_mutation' ] )
+    else:
+        population  =  Population( removal , restore_fitness( removal , original_string , 0 ) ,
+                                   population_size , insert=True )
+        generation  =  0
+    while generation <= 50000000:
+        generation  +=  1
+        population.spawn( )
+        population.evaluate_with( evaluator )
+        best  =  population.best( highest=False )
+        if best:
+            evaluator.accept( population.parent , population.mutations[ best ] )
+        population.advance( best )
+        if population.parent_fitness == 0:
+            break
+        if checkpoint is not None and checkpoint.due( generation ):
+            checkpoint.save( 'restore' , 'compact' , population.model( ) , generation , population_size )
+    instrumentation.count( 'rwoadl.restore.generations' , generation )
+    return population.parent
+
+
+
+# ==================================================
+# CLASS: Checkpointer
+# ==================================================
+#
+# Description:
+#   Periodically saves the state of a running search so
+#   it can be continued with resume_from_checkpoint
+#   after the process is killed. The state is the best
+#   candidate, its fitness and last mutation, the
+#   generation counter and the state of the random
+#   number generator: enough to continue exactly where
+#   the search stopped.
+#
+#   The check in the search loop is one modulo per
+#   generation; the file is JSON compressed with zlib,
+#   written to a temporary name and then renamed over
+#   the old checkpoint, so a crash mid-write never
+#   leaves a broken file behind.
+#
+# ==================================================
+class Checkpointer( object ):
+
+    # ==================================================
+    # METHOD: __init__
+    # ==================================================
+    #
+    # Input:
+    #       -   path:  file to keep the checkpoint in
+    #       -   every: generations between checkpoints
+    #
+    # ==================================================
+    def __init__( self , path , every=100000 ):
+        self.path   =  path
+        self.every  =  max( 1 , every )
+
+    def due( self , generation ):
+        return generation % self.every == 0
+
+    def save( self , mode , engine , model , generation , population_size ):
+        import json
+        import os
+        import zlib
+        version , internal , gauss  =  random.getstate( )
+        state  =  {
+                        'mode'            :  mode,
+                        'engine'          :  engine,
+                        'text'            :  model[ 'text' ],
+                        'fitness'         :  model[ 'fitness' ],
+                        'last_mutation'   :  model.get( 'last_mutation' , 0 ),
+                        'generation'      :  generation,
+                        'population_size' :  population_size,
+                        'rng'             :  [ version , list( internal ) , gauss ]
+                  }
+        data       =  zlib.compress( json.dumps( state ).encode( 'utf-8' ) )
+        temporary  =  self.path + '.tmp'
+        with open( temporary , 'wb' ) as f:
+            f.write( data )
+        os.replace( temporary , self.path )
+
+
+
+# ==================================================
+# FUNCTION: load_checkpoint
+# ==================================================
+#
+# Input:  path of a file written by a Checkpointer
+#
+# Output: the saved state dictionary
+#
+# ==================================================
+def load_checkpoint( path ):
+    import json
+    import zlib
+    with open( path , 'rb' ) as f:
+        state  =  json.loads( zlib.decompress( f.read( ) ).decode( 'utf-8' ) )
+    version , internal , gauss  =  state[ 'rng' ]
+    state[ 'rng' ]              =  ( version , tuple( internal ) , gauss )
+    return state
+
+
+
+# ==================================================
+# FUNCTION: _resume_state
+# ==================================================
+#
+# Input:  state dictionary from load_checkpoint
+#
+# Output: tuple of ( candidate dictionary , generation )
+#
+# Task:   put the random number generator back where
+#         it was and rebuild the best candidate
+#
+# ==================================================
+def _resume_state( state ):
+    random.setstate( state[ 'rng' ] )
+    model  =  {
+                    'text'          :  state[ 'text' ],
+                    'fitness'       :  state[ 'fitness' ],
+                    'last_mutation' :  state[ 'last_mutation' ]
+              }
+    return model , state[ 'generation' ]
+
+
+
+# ==================================================
+# FUNCTION: resume_from_checkpoint
+# ==================================================
+#
+# Input:
+#       -   path:            checkpoint file to continue from
+#       -   original_string: the original text
+#       -   removal:         (restore searches) the text
+#                            the search started from;
+#                            defaults to original_string
+#                            with its spaces removed, the
+#                            usual starting point
+#       -   checkpoint:      optional Checkpointer for the
+#                            continued search
+#
+# Output: the result of the continued search
+#
+# ==================================================
+def resume_from_checkpoint( path , original_string , removal=None , checkpoint=None ):
+    state            =  load_checkpoint( path )
+    if removal is None:
+        removal  =  original_string.replace( ' ' , '' )
+    population_size  =  state[ 'population_size' ]
+    compact          =  state[ 'engine' ] == 'compact'
+    if state[ 'mode' ] == 'remove':
+        solve  =  remove_spaces_compact if compact else remove_spaces
+        return solve( original_string , population_size , checkpoint=checkpoint , state=state )
+    solve  =  restore_spaces_compact if compact else restore_spaces
+    return solve( original_string , removal , population_size , checkpoint=checkpoint , state=state )
+
+
+
 # ==================================================
 # FUNCTION: print_pretty
 # ==================================================
@@ -383,26 +923,32 @@ def main():
 
     # Time to Gather Data
     start            =  default_timer( )
-    original_string  =  gather_text_from_file( 'sentence.txt' )
+    with instrumentation.stage( 'read' ) as stage:
+        original_string  =  gather_text_from_file( 'sentence.txt' )
+        nbytes           =  len( original_string.encode( 'utf-8' ) )
+        stage.add_bytes( nbytes )
     end              =  default_timer( )
     print( 'Reading File: %.3f ms' % ( ( end - start ) * 1000 ) )
 
     # Time to Remove Spaces
     start           =  default_timer( )
-    spaces_removed  =  remove_spaces( original_string , population_size=200 )
+    with instrumentation.stage( 'remove' , nbytes ):
+        spaces_removed  =  remove_spaces( original_string , population_size=200 )
     end             =  default_timer( )
     print( 'Removing Spaces: %.3f ms' % ( ( end - start ) * 1000 ) )
 
     # Time to Remove Spaces (took me ~4,536,977.693ms [~75mins] with 990,400-990,500 generations
     start            =  default_timer( )
-    spaces_restored  =  restore_spaces( original_string , spaces_removed , population_size=200 )
+    with instrumentation.stage( 'restore' , nbytes ):
+        spaces_restored  =  restore_spaces( original_string , spaces_removed , population_size=200 )
     end              =  default_timer( )
     print( 'Restoring Spaces: %.3f ms' % ( ( end - start ) * 1000 ) )
 
     # Print the Results nice and "pretty"
-    print_pretty( 'Original Text:'   , original_string )
-    print_pretty( 'Spaces Removed:'  , spaces_removed  )
-    print_pretty( 'Spaces Restored:' , spaces_restored )
+    with instrumentation.stage( 'output' ):
+        print_pretty( 'Original Text:'   , original_string )
+        print_pretty( 'Spaces Removed:'  , spaces_removed  )
+        print_pretty( 'Spaces Restored:' , spaces_restored )
     return
 
 
@@ -0,0 +1,415 @@
+# ==================================================
+# async_service.py
+# ==================================================
+#
+# Program: Space Removal and Replacement
+# Author:  Drake Young
+#
+# File Description:
+#   This file (async_service.py) lets asyncio code call
+#   the remove/restore routines of basic_method.py
+#   without blocking its event loop.
+#
+#   Requests are queued; a collector task gathers
+#   whatever has arrived (up to max_batch requests,
+#   waiting at most max_latency seconds for more) and
+#   hands the whole batch to an executor in one call,
+#   so the per-call cost of crossing into a worker is
+#   paid once per batch instead of once per request.
+#
+#   Backpressure comes from two limits:
+#       -   max_pending: the request queue's size;
+#           callers wait in remove( )/restore( ) once
+#           it is full
+#       -   max_inflight: batches handed to the executor
+#           and not yet finished; the collector stops
+#           taking new requests until one completes
+#
+#   Running the file starts a small stdio server: one
+#   JSON request per input line, one JSON response per
+#   output line (in completion order, matched by id).
+#
+# ==================================================
+
+
+
+# ==================================================
+# IMPORTS
+# ==================================================
+#
+#   *   argparse:           command line options of the
+#                           stdio server
+#   *   asyncio:            the event loop side
+#   *   concurrent.futures: ProcessPoolExecutor, the
+#                           default executor, and
+#                           BrokenExecutor, raised once
+#                           a worker has died
+#   *   functools:          partial, binding a batch to
+#                           its completion callback
+#   *   json / sys:         the stdio server protocol
+#   *   os:                 cpu_count, the default
+#                           number of workers
+#   *   basic_method:       the routines being served
+#   *   space_layout:       SpaceLayout, the layout type
+#
+# ==================================================
+import argparse
+import asyncio
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from functools import partial
+import json
+import os
+import sys
+
+from basic_method import remove_spaces_fast, restore_spaces
+from space_layout import SpaceLayout
+
+
+
+# ==================================================
+# CONSTANTS
+# ==================================================
+#
+#   *   DEFAULT_MAX_BATCH:    requests per batch
+#   *   DEFAULT_MAX_LATENCY:  seconds a request may wait
+#                             for its batch to fill
+#   *   DEFAULT_MAX_PENDING:  queued requests before
+#                             callers are made to wait
+#
+# ==================================================
+DEFAULT_MAX_BATCH    =  256
+DEFAULT_MAX_LATENCY  =  0.002
+DEFAULT_MAX_PENDING  =  10000
+
+
+
+# ==================================================
+# FUNCTION: _run_batch
+# ==================================================
+#
+# Input:  list of ( operation , arguments ) jobs
+#
+# Output: list of ( ok , value ) pairs, one per job;
+#         value is the result, or the exception raised
+#
+# Task:   the work done in the executor; a failing job
+#         does not fail the rest of its batch
+#
+# ==================================================
+def _run_batch( jobs ):
+    results  =  [ ]
+    for operation , arguments in jobs:
+        try:
+            results.append( ( True , _OPERATIONS[ operation ]( *arguments ) ) )
+        except Exception as error:
+            results.append( ( False , error ) )
+    return results
+
+_OPERATIONS  =  {
+                    'remove'  :  remove_spaces_fast,
+                    'restore' :  restore_spaces
+                }
+
+
+
+# ==================================================
+# CLASS: BatchingService
+# ==================================================
+#
+# Description:
+#   Micro-batching front-end over an executor. Must be
+#   used from a single event loop; the collector task
+#   is started on the first request.
+#
+# ==================================================
+class BatchingService( object ):
+
+    # ==================================================
+    # METHOD: __init__
+    # ==================================================
+    #
+    # Input:
+    #       -   executor:     executor to run batches on
+    #                         (a process pool is started,
+    #                         and owned, when omitted)
+    #       -   max_batch:    requests per batch
+    #       -   max_latency:  seconds to wait for a batch
+    #                         to fill
+    #       -   max_pending:  request queue size
+    #       -   max_inflight: batches running at once
+    #                         (defaults to twice the
+    #                         number of CPUs)
+    #
+    # ==================================================
+    def __init__( self , executor=None , max_batch=DEFAULT_MAX_BATCH ,
+                  max_latency=DEFAULT_MAX_LATENCY , max_pending=DEFAULT_MAX_PENDING ,
+                  max_inflight=None ):
+        self.owned         =  executor is None
+        self.executor      =  executor or ProcessPoolExecutor( )
+        self.max_batch     =  max( 1 , max_batch )
+        self.max_latency   =  max_latency
+        self.max_pending   =  max_pending
+        self.max_inflight  =  max_inflight or 2 * ( os.cpu_count( ) or 1 )
+        self.loop          =  None
+        self.queue         =  None
+        self.inflight      =  None
+        self.collector     =  None
+        self.batches       =  0
+        self.requests      =  0
+
+    # ==================================================
+    # METHOD: remove / restore
+    # ==================================================
+    #
+    # Output: same as basic_method.remove_spaces_fast /
+    #         basic_method.restore_spaces
+    #
+    # ==================================================
+    async def remove( self , text ):
+        return await self._submit( 'remove' , ( text , ) )
+
+    async def restore( self , stripped , layout ):
+        return await self._submit( 'restore' , ( stripped , layout ) )
+
+    async def _submit( self , operation , arguments ):
+        if self.collector is None:
+            self._start( )
+        future  =  self.loop.create_future( )
+        await self.queue.put( ( ( operation , arguments ) , future ) )
+        return await future
+
+    def _start( self ):
+        self.loop       =  asyncio.get_event_loop( )
+        self.queue      =  asyncio.Queue( maxsize=self.max_pending )
+        self.inflight   =  asyncio.Semaphore( self.max_inflight )
+        self.collector  =  asyncio.ensure_future( self._collect( ) )
+
+    # ==================================================
+    # METHOD: _collect
+    # ==================================================
+    #
+    # Task:   wait for a request, give the batch at most
+    #         max_latency seconds to fill, then dispatch
+    #         it once a slot for it is free
+    #
+    # Notes:
+    #       -   if the executor refuses the batch (a broken
+    #           or shut down pool), the batch's requests
+    #           fail with that error and the collector
+    #           carries on; a broken pool the service owns
+    #           is replaced
+    #
+    # ==================================================
+    async def _collect( self ):
+        while True:
+            batch  =  [ await self.queue.get( ) ]
+            self._drain( batch )
+            if len( batch ) < self.max_batch and self.max_latency > 0:
+                await asyncio.sleep( self.max_latency )
+                self._drain( batch )
+            await self.inflight.acquire( )
+            self.batches   +=  1
+            self.requests  +=  len( batch )
+            executor        =  self.executor
+            try:
+                running  =  self.loop.run_in_executor( executor , _run_batch ,
+                                                       [ job for job , _ in batch ] )
+            except Exception as error:
+                # drop the traceback: it holds this task's frame, which a caller
+                # clearing the traceback's frames would otherwise close
+                self.inflight.release( )
+                self._fail( batch , error.with_traceback( None ) )
+                self._replace_broken( executor , error )
+                continue
+            running.add_done_callback( partial( self._deliver , batch , executor ) )
+
+    def _drain( self , batch ):
+        while len( batch ) < self.max_batch and not self.queue.empty( ):
+            batch.append( self.queue.get_nowait( ) )
+
+    def _deliver( self , batch , executor , running ):
+        self.inflight.release( )
+        if running.cancelled( ):
+            results  =  [ ( False , asyncio.CancelledError( ) ) ] * len( batch )
+        elif running.exception( ) is not None:
+            results  =  [ ( False , running.exception( ) ) ] * len( batch )
+            self._replace_broken( executor , running.exception( ) )
+        else:
+            results  =  running.result( )
+        for ( _ , future ) , ( ok , value ) in zip( batch , results ):
+            if future.done( ):
+                continue
+            if ok:
+                future.set_result( value )
+            else:
+                future.set_exception( value )
+
+    def _fail( self , batch , error ):
+        for _ , future in batch:
+            if not future.done( ):
+                future.set_exception( error )
+
+    # ==================================================
+    # METHOD: _replace_broken
+    # ==================================================
+    #
+    # Input:
+    #       -   executor: the executor a batch failed on
+    #       -   error:    the error it failed with
+    #
+    # Task:   when a pool this service started has broken
+    #         (a worker died), start a fresh one so later
+    #         requests are served; batches already failed
+    #         on the old pool replace it only once
+    #
+    # ==================================================
+    def _replace_broken( self , executor , error ):
+        if self.owned and executor is self.executor and isinstance( error , BrokenExecutor ):
+            self.executor  =  ProcessPoolExecutor( )
+            executor.shutdown( wait=False )
+
+    # ==================================================
+    # METHOD: close
+    # ==================================================
+    #
+    # Task:   stop the collector, and shut down the
+    #         executor if this service started it
+    #
+    # ==================================================
+    async def close( self ):
+        if self.collector is not None:
+            self.collector.cancel( )
+            try:
+                await self.collector
+            except asyncio.CancelledError:
+                pass
+            self.collector  =  None
+        if self.owned:
+            self.executor.shutdown( wait=True )
+
+
+
+# ==================================================
+# FUNCTION: remove / restore
+# ==================================================
+#
+# Task:   module-level shortcuts using one shared
+#         BatchingService per event loop. The service of
+#         an earlier loop (e.g. a finished asyncio.run)
+#         is dropped when a new loop first calls, and its
+#         process pool is shut down with it (without
+#         waiting, so the new loop is not blocked).
+#
+# ==================================================
+_services  =  { }
+
+def default_service( ):
+    loop  =  asyncio.get_event_loop( )
+    if loop not in _services:
+        for service in _services.values( ):
+            if service.owned:
+                service.executor.shutdown( wait=False )
+        _services.clear( )
+        _services[ loop ]  =  BatchingService( )
+    return _services[ loop ]
+
+async def remove( text ):
+    return await default_service( ).remove( text )
+
+async def restore( stripped , layout ):
+    return await default_service( ).restore( stripped , layout )
+
+
+
+# ==================================================
+# FUNCTION: serve_stdio
+# ==================================================
+#
+# Input:
+#       -   service: the BatchingService to answer with
+#       -   reader:  file object to read requests from
+#       -   writer:  file object to write responses to
+#
+# Output: N/A (returns when the input ends)
+#
+# Protocol (one JSON object per line):
+#       {"id": 1, "op": "remove", "text": "a b"}
+#           -> {"id": 1, "text": "ab", "layout": [1]}
+#       {"id": 2, "op": "restore", "text": "ab", "layout": [1]}
+#           -> {"id": 2, "text": "a b"}
+#       failures answer {"id": ..., "error": "..."}
+#
+# ==================================================
+async def serve_stdio( service , reader=None , writer=None ):
+    reader   =  reader or sys.stdin
+    writer   =  writer or sys.stdout
+    loop     =  asyncio.get_event_loop( )
+    pending  =  set( )
+    while True:
+        line  =  await loop.run_in_executor( None , reader.readline )
+        if not line:
+            break
+        if line.strip( ):
+            task  =  asyncio.ensure_future( _answer( service , line , writer ) )
+            pending.add( task )
+            task.add_done_callback( pending.discard )
+    if pending:
+        await asyncio.wait( pending )
+    return
+
+async def _answer( service , line , writer ):
+    response  =  { }
+    try:
+        request           =  json.loads( line )
+        response[ 'id' ]  =  request.get( 'id' )
+        if request[ 'op' ] == 'remove':
+            stripped , layout       =  await service.remove( request[ 'text' ] )
+            response[ 'text' ]      =  stripped
+            response[ 'layout' ]    =  list( layout )
+        elif request[ 'op' ] == 'restore':
+            layout                  =  SpaceLayout( request[ 'layout' ] )
+            response[ 'text' ]      =  await service.restore( request[ 'text' ] , layout )
+        else:
+            raise ValueError( 'unknown op %r' % request[ 'op' ] )
+    except Exception as error:
+        response[ 'error' ]  =  '%s: %s' % ( type( error ).__name__ , error )
+    writer.write( json.dumps( response ) + '\n' )
+    writer.flush( )
+
+
+
+# ==================================================
+# FUNCTION: main
+# ==================================================
+#
+# Input:  command line arguments (defaults to sys.argv)
+#
+# Output: N/A
+#
+# ==================================================
+def main( argv=None ):
+    parser  =  argparse.ArgumentParser( description='Serve remove/restore requests over stdio.' )
+    parser.add_argument( '--workers' , type=int , default=None )
+    parser.add_argument( '--max-batch' , type=int , default=DEFAULT_MAX_BATCH )
+    parser.add_argument( '--max-latency-ms' , type=float , default=DEFAULT_MAX_LATENCY * 1000 )
+    parser.add_argument( '--max-pending' , type=int , default=DEFAULT_MAX_PENDING )
+    args    =  parser.parse_args( argv )
+
+    loop     =  asyncio.new_event_loop( )
+    asyncio.set_event_loop( loop )
+    service  =  BatchingService( ProcessPoolExecutor( max_workers=args.workers ) ,
+                                 args.max_batch , args.max_latency_ms / 1000.0 ,
+                                 args.max_pending )
+    service.owned  =  True
+    try:
+        loop.run_until_complete( serve_stdio( service ) )
+        loop.run_until_complete( service.close( ) )
+    finally:
+        loop.close( )
+    return
+
+
+
+# Only perform program operations if this file if it's the main file
+if __name__ == '__main__':
+    main( )
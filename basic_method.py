@@ -34,11 +34,32 @@
 # IMPORTS
 # ==================================================
 #
-#   *   timeit: default_timer is used for testing
-#               performance
+#   *   timeit:       default_timer is used for testing
+#                     performance
+#   *   array:        compact storage for the space
+#                     indices
+#   *   itertools:    accumulate/count/islice, used to
+#                     turn segment lengths into space
+#                     indices without a Python loop
+#   *   operator:     add, paired with the above
+#   *   re:           splitting on a set of separator
+#                     characters in one pass (imported
+#                     by remove_separators on first use,
+#                     to keep startup short)
+#   *   instrumentation: per-stage metrics (off unless
+#                     enabled)
+#   *   space_layout: SpaceLayout, the sorted index
+#                     type passed between the stages,
+#                     and SeparatorLayout, its
+#                     multi-separator counterpart
 #
 # ==================================================
 from timeit import default_timer # used to time performance
+from array import array
+from itertools import accumulate, count, islice
+from operator import add
+import instrumentation
+from space_layout import SeparatorLayout, SpaceLayout, symbol_typecode_for, typecode_for
 
 
 
@@ -62,22 +83,41 @@ def gather_text_from_file( file='text.txt' ):
 
 
 
+# ==================================================
+# FUNCTION: space_like
+# ==================================================
+#
+# Input:  String or bytes to operate on
+#
+# Output: the space character of the same type
+#         (' ' for strings, b' ' for bytes)
+#
+# ==================================================
+def space_like( text ):
+    if isinstance( text , ( bytes , bytearray , memoryview ) ):
+        return b' '
+    return ' '
+
+
+
 # ==================================================
 # FUNCTION: get_space_indices
 # ==================================================
 #
 # Input:  String to operate on
 #
-# Output: list of indices of the given string that
-#         contain the space ' ' character
+# Output: SpaceLayout of the indices of the given
+#         string that contain the space ' ' character
 #
-# Task:   Use a generator to create a list of indices
-#         on a condition that the index contains a space
-#         in the original string
+# Task:   Use a generator to collect the indices, in
+#         ascending order, on a condition that the index
+#         contains a space in the original string
 #
 # ==================================================
 def get_space_indices( text ):
-    return set(i for i in range( len( text ) ) if text[ i ] is ' ' )
+    positions  =  array( typecode_for( len( text ) ) ,
+                         ( i for i in range( len( text ) ) if text[ i ] == ' ' ) )
+    return SpaceLayout.from_array( positions )
 
 
 
@@ -85,16 +125,180 @@ def get_space_indices( text ):
 # FUNCTION: remove_spaces
 # ==================================================
 #
-# Input:  String to operate on.
+# Input:
+#       -   text:    String to operate on.
+#       -   indices: SpaceLayout (or any iterable) of
+#                    the indices to remove
 #
 # Output: string with all the given indices removed
 #
-# Task:   iterate backwards over the given indices, and
-#         "slice out" each of these indices
+# Task:   walk the indices in ascending order and join
+#         the runs of text that sit between them
 #
 # ==================================================
 def remove_spaces( text , indices ):
-    return ''.join(text[i] for i in range(len(text)) if i not in indices)
+    segments  =  [ ]
+    previous  =  0
+    for i in SpaceLayout.coerce( indices ):
+        segments.append( text[ previous : i ] )
+        previous  =  i + 1
+    segments.append( text[ previous : ] )
+    return space_like( text )[ : 0 ].join( segments )
+
+
+
+# ==================================================
+# FUNCTION: remove_spaces_fast
+# ==================================================
+#
+# Input:  String (or bytes) to operate on.
+#
+# Output: tuple of
+#       -   the text with all spaces removed
+#       -   SpaceLayout of where those spaces were
+#
+# Task:   Compute the stripped text and the layout
+#         together using C-level built-ins only:
+#       -   split on ' ' once; joining the pieces gives
+#           the stripped text
+#       -   the k-th space sits right after the first
+#           k + 1 pieces and the k spaces before it, so
+#           a running total of the piece lengths plus k
+#           gives its index
+#
+# Notes:
+#       -   get_space_indices + remove_spaces is kept as
+#           the pure-Python reference implementation;
+#           this function returns the same results
+#
+# ==================================================
+def remove_spaces_fast( text ):
+    space      =  space_like( text )
+    pieces     =  text.split( space )
+    stripped   =  space[ : 0 ].join( pieces )
+    ends       =  islice( accumulate( map( len , pieces ) ) , len( pieces ) - 1 )
+    positions  =  array( typecode_for( len( text ) ) , map( add , ends , count( ) ) )
+    return stripped , SpaceLayout.from_array( positions )
+
+
+
+# ==================================================
+# FUNCTION: remove_separators
+# ==================================================
+#
+# Input:
+#       -   text:       String (or bytes) to operate on.
+#       -   separators: the separator characters to
+#                       remove: a str or bytes alphabet,
+#                       or any iterable (set, list, ...)
+#                       of single characters or code
+#                       points (defaults to space, tab
+#                       and no-break space for strings,
+#                       space and tab for bytes)
+#
+# Output: tuple of
+#       -   the text with every separator removed
+#       -   SeparatorLayout of where each one was and
+#           which one it was
+#
+# Task:   Same idea as remove_spaces_fast, but one
+#         regular-expression split on a character class
+#         handles every separator at once. With a
+#         capturing group the split also returns the
+#         separators themselves, which become the
+#         per-position symbols.
+#
+# ==================================================
+def remove_separators( text , separators=None ):
+    import re
+    is_bytes    =  isinstance( text , ( bytes , bytearray ) )
+    separators  =  _alphabet( separators , is_bytes )
+    pattern     =  re.compile( separators[ : 0 ].join( ( _char( '([' , is_bytes ) ,
+                                                        re.escape( separators ) ,
+                                                        _char( '])' , is_bytes ) ) ) )
+    parts       =  pattern.split( text )
+    pieces      =  parts[ 0 : : 2 ]
+    found       =  parts[ 1 : : 2 ]
+    stripped    =  space_like( text )[ : 0 ].join( pieces )
+    ends        =  islice( accumulate( map( len , pieces ) ) , len( found ) )
+    positions   =  array( typecode_for( len( text ) ) , map( add , ends , count( ) ) )
+    lookup      =  { separators[ i : i + 1 ] : i for i in range( len( separators ) ) }
+    symbols     =  array( symbol_typecode_for( len( separators ) ) , map( lookup.__getitem__ , found ) )
+    return stripped , SeparatorLayout( SpaceLayout.from_array( positions ) , symbols , separators )
+
+
+
+# ==================================================
+# FUNCTION: _char
+# ==================================================
+#
+# Input:
+#       -   literal:  an ASCII str literal
+#       -   is_bytes: whether the text is bytes
+#
+# Output: the literal as the text's type, so it can be
+#         joined into a pattern for that text
+#
+# ==================================================
+def _char( literal , is_bytes ):
+    return literal.encode( 'ascii' ) if is_bytes else literal
+
+
+
+# ==================================================
+# FUNCTION: _alphabet
+# ==================================================
+#
+# Input:
+#       -   separators: as given to remove_separators
+#       -   is_bytes:   whether the text is bytes
+#
+# Output: the separators as a str (or bytes) alphabet
+#         of the text's type, each separator once, in
+#         the order given (sets in code point order, so
+#         the layout does not depend on hashing)
+#
+# ==================================================
+def _alphabet( separators , is_bytes ):
+    if separators is None:
+        return b' \t' if is_bytes else ' \t\u00a0'
+    if isinstance( separators , ( set , frozenset ) ):
+        separators  =  sorted( separators , key=_code_point )
+    codes  =  [ ]
+    for separator in separators:
+        code  =  _code_point( separator )
+        if code not in codes:
+            codes.append( code )
+    if not codes:
+        raise ValueError( 'no separators given' )
+    if is_bytes:
+        if max( codes ) > 0xff:
+            raise ValueError( 'separator code point %d does not fit in a byte' % max( codes ) )
+        return bytes( codes )
+    return ''.join( map( chr , codes ) )
+
+
+
+# ==================================================
+# FUNCTION: _code_point
+# ==================================================
+#
+# Input:  one separator: a single character (str or
+#         bytes) or an int code point
+#
+# Output: its code point
+#
+# Notes:
+#       -   raises ValueError for a string that is not
+#           exactly one character long
+#
+# ==================================================
+def _code_point( separator ):
+    if isinstance( separator , int ):
+        return separator
+    if len( separator ) != 1:
+        raise ValueError( 'separators must be single characters, got %r' % ( separator , ) )
+    return ord( separator )
 
 
 
@@ -102,22 +306,107 @@ def remove_spaces( text , indices ):
 # FUNCTION: restore_spaces
 # ==================================================
 #
-# Input:  String to operate on.
+# Input:
+#       -   text:    String to operate on.
+#       -   indices: SpaceLayout (or any iterable) of
+#                    the indices to fill with spaces
 #
 # Output: string with spaces inserted at each of the
 #         specified indices (index represents position
 #         of the string post-insertion)
 #
-# Task:   Iterate through the given indices and
-#         "slice in" a space ' ' character to the
-#         given text
+# Task:   Walk the indices in ascending order, cutting
+#         the text into the segments that sat between
+#         consecutive spaces, then join the segments
+#         back together with a single ' '.join
+#
+# Notes:
+#       -   the k-th space (counting from 0) sits at
+#           index p in the restored string, so the
+#           text before it ends at p - k in the
+#           stripped string
+#       -   back-to-back spaces simply produce empty
+#           segments, which the join handles for free
+#       -   one pass over the text, one allocation for
+#           the result: O(n) rather than O(n*k)
 #
 # ==================================================
 def restore_spaces( text , indices ):
-    result  =  text
-    for i in indices:
-        result  =  result[ : i ] + ' ' + result[ i : ]
-    return result
+    segments  =  [ ]
+    previous  =  0
+    for k , i in enumerate( SpaceLayout.coerce( indices ) ):
+        segments.append( text[ previous : i - k ] )
+        previous  =  i - k
+    segments.append( text[ previous : ] )
+    return space_like( text ).join( segments )
+
+
+
+# ==================================================
+# FUNCTION: restore_separators
+# ==================================================
+#
+# Input:
+#       -   text:   String (or bytes) to operate on.
+#       -   layout: SeparatorLayout from remove_separators
+#
+# Output: the text with every separator put back
+#
+# Task:   Cut the text into segments exactly as
+#         restore_spaces does, then interleave the
+#         segments with the recorded separators and
+#         join them once
+#
+# ==================================================
+def restore_separators( text , layout ):
+    segments  =  [ ]
+    previous  =  0
+    for k , i in enumerate( layout.positions ):
+        segments.append( text[ previous : i - k ] )
+        previous  =  i - k
+    segments.append( text[ previous : ] )
+    pieces            =  [ None ] * ( 2 * len( segments ) - 1 )
+    pieces[ 0 : : 2 ] =  segments
+    pieces[ 1 : : 2 ] =  map( layout.separators( ).__getitem__ , layout.symbols )
+    return space_like( text )[ : 0 ].join( pieces )
+
+
+
+# ==================================================
+# FUNCTION: restore_range
+# ==================================================
+#
+# Input:
+#       -   text:    stripped string to operate on.
+#       -   indices: SpaceLayout (or any iterable) of
+#                    the indices to fill with spaces
+#       -   start:   first index of the restored text
+#                    wanted
+#       -   end:     index one past the last wanted
+#
+# Output: the same as restore_spaces( text , indices )
+#         [ start : end ], without restoring the rest
+#
+# Task:   use rank queries on the layout to find which
+#         slice of the stripped text and which spaces
+#         fall inside the range, then restore only that
+#
+# Notes:
+#       -   the cost depends on the size of the range
+#           (plus two O(log n) searches), not on the
+#           size of the document
+#
+# ==================================================
+def restore_range( text , indices , start , end ):
+    layout  =  SpaceLayout.coerce( indices )
+    total   =  len( text ) + len( layout )
+    start   =  min( max( start , 0 ) , total )
+    end     =  min( max( end , start ) , total )
+    first   =  layout.rank( start )
+    last    =  layout.rank( end )
+    local   =  array( typecode_for( end - start ) ,
+                      map( ( -start ).__add__ , layout.positions[ first : last ] ) )
+    return restore_spaces( text[ start - first : end - last ] , SpaceLayout.from_array( local ) )
 
 
 
@@ -169,33 +458,48 @@ def print_pretty(label='RESULT', text='', divider_char='-', divider_len=50):
 def main():
     # Time to Gather Data
     start            =  default_timer( )
-    original_string  =  gather_text_from_file( 'large.txt' )
+    with instrumentation.stage( 'read' ) as stage:
+        original_string  =  gather_text_from_file( 'large.txt' )
+        nbytes           =  len( original_string.encode( 'utf-8' ) )
+        stage.add_bytes( nbytes )
     end              =  default_timer( )
     print( 'Reading File: %.3f ms' % ( ( end - start ) * 1000 ) )
 
     # Time to Gather Space Indices
     start          =  default_timer( )
-    space_indices  =  get_space_indices( original_string )
+    with instrumentation.stage( 'index' , nbytes ):
+        space_indices  =  get_space_indices( original_string )
     end            =  default_timer( )
     print( 'Gathering Indices: %.3f ms' % ( ( end - start ) * 1000 ) )
 
     # Time to Remove Spaces
     start           =  default_timer( )
-    spaces_removed  =  remove_spaces( original_string , space_indices )
+    with instrumentation.stage( 'remove' , nbytes ):
+        spaces_removed  =  remove_spaces( original_string , space_indices )
     end             =  default_timer( )
     print( 'Removing Spaces: %.3f ms' % ( ( end - start ) * 1000 ) )
 
+    # Time to Remove Spaces and Gather Indices Together (fast path)
+    start                         =  default_timer( )
+    with instrumentation.stage( 'remove_fast' , nbytes ):
+        fast_removed , fast_indices   =  remove_spaces_fast( original_string )
+    end                           =  default_timer( )
+    print( 'Removing Spaces (fast): %.3f ms' % ( ( end - start ) * 1000 ) )
+    print( 'Fast Path Matches: %s' % ( fast_removed == spaces_removed and fast_indices == space_indices ) )
+
     # Time to Restore the Spaces
     start            =  default_timer( )
-    spaces_restored  =  restore_spaces( spaces_removed , space_indices )
+    with instrumentation.stage( 'restore' , nbytes ):
+        spaces_restored  =  restore_spaces( spaces_removed , space_indices )
     end              =  default_timer( )
     print( 'Restoring Spaces: %.3f ms' % ( ( end - start ) * 1000 ) )
 
     # Print the Results "Pretty"
-    print_pretty( 'Original Text:'     , original_string )
-    print_pretty( 'Indices of Spaces:' , space_indices   )
-    print_pretty( 'Spaces Removed:'    , spaces_removed  )
-    print_pretty( 'Spaces Replaced:'   , spaces_restored )
+    with instrumentation.stage( 'output' ):
+        print_pretty( 'Original Text:'     , original_string )
+        print_pretty( 'Indices of Spaces:' , space_indices   )
+        print_pretty( 'Spaces Removed:'    , spaces_removed  )
+        print_pretty( 'Spaces Replaced:'   , spaces_restored )
     return
 
 
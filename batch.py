@@ -0,0 +1,325 @@
+# ==================================================
+# batch.py
+# ==================================================
+#
+# Program: Space Removal and Replacement
+# Author:  Drake Young
+#
+# File Description:
+#   This file (batch.py) strips the spaces from a
+#   whole corpus of documents at once: every file in
+#   a directory, or every path listed in a manifest.
+#
+#   One worker pool is started for the whole corpus
+#   and documents are handed to it in batches. The
+#   results go into a few large shards rather than
+#   one output file per document. Each shard is:
+#       -   shard-NNNNN.txt:         stripped bytes of
+#                                    its documents, back
+#                                    to back
+#       -   shard-NNNNN.layout:      serialized
+#                                    SpaceLayouts, back to
+#                                    back
+#       -   shard-NNNNN.index.jsonl: one JSON line per
+#                                    document with its path
+#                                    and where its text and
+#                                    layout sit in the shard
+#
+#   Documents are read as bytes, so layouts hold byte
+#   offsets (as in mmap_backend.py).
+#
+# ==================================================
+
+
+
+# ==================================================
+# IMPORTS
+# ==================================================
+#
+#   *   argparse:           command-line options
+#   *   collections:        deque, the in-flight window
+#   *   concurrent.futures: ProcessPoolExecutor, the
+#                           worker pool
+#   *   itertools:          islice, cutting batches
+#   *   json:               shard index lines
+#   *   os:                 walking directories
+#   *   timeit:             default_timer, throughput
+#   *   basic_method:       remove_spaces_fast
+#   *   space_layout:       SpaceLayout serialization
+#
+# ==================================================
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import json
+import os
+from timeit import default_timer
+
+from basic_method import remove_spaces_fast
+from space_layout import SpaceLayout
+
+
+
+# ==================================================
+# CONSTANTS
+# ==================================================
+#
+#   *   DEFAULT_SHARD_SIZE: stripped bytes per shard
+#                           before starting a new one
+#   *   DEFAULT_BATCH_SIZE: documents sent to a worker
+#                           per round trip
+#   *   BATCHES_PER_WORKER: batches in flight per worker;
+#                           bounds the results held back
+#                           behind a slow document
+#
+# ==================================================
+DEFAULT_SHARD_SIZE  =  64 << 20
+DEFAULT_BATCH_SIZE  =  64
+BATCHES_PER_WORKER  =  2
+
+
+
+# ==================================================
+# FUNCTION: collect_paths
+# ==================================================
+#
+# Input:  a directory, or a manifest file listing one
+#         path per line (blank lines and lines starting
+#         with '#' are skipped)
+#
+# Output: list of document paths, in a stable order
+#
+# ==================================================
+def collect_paths( source ):
+    if os.path.isdir( source ):
+        paths  =  [ ]
+        for root , dirs , files in os.walk( source ):
+            dirs.sort( )
+            paths.extend( os.path.join( root , name ) for name in sorted( files ) )
+        return paths
+    with open( source , 'r' ) as manifest:
+        return [ line.strip( ) for line in manifest
+                 if line.strip( ) and not line.lstrip( ).startswith( '#' ) ]
+
+
+
+# ==================================================
+# FUNCTION: _strip_document
+# ==================================================
+#
+# Input:  path of one document
+#
+# Output: tuple of ( path , original size , stripped
+#         bytes , serialized layout )
+#
+# Task:   the work done in each worker process
+#
+# ==================================================
+def _strip_document( path ):
+    with open( path , 'rb' ) as f:
+        data  =  f.read( )
+    stripped , layout  =  remove_spaces_fast( data )
+    return path , len( data ) , stripped , layout.to_bytes( )
+
+def _strip_batch( paths ):
+    return [ _strip_document( path ) for path in paths ]
+
+
+
+# ==================================================
+# FUNCTION: _ordered_batches
+# ==================================================
+#
+# Input:
+#       -   pool:       the worker pool
+#       -   paths:      document paths
+#       -   batch_size: documents per batch
+#       -   window:     batches in flight at once
+#
+# Output: generator of _strip_document results, in
+#         path order
+#
+# Task:   keep at most window batches submitted and
+#         hand results back oldest first, so a slow
+#         document holds up output (and the pool stops
+#         being fed) instead of letting finished results
+#         pile up in memory
+#
+# ==================================================
+def _ordered_batches( pool , paths , batch_size , window ):
+    paths    =  iter( paths )
+    pending  =  deque( )
+    while True:
+        batch  =  list( islice( paths , max( 1 , batch_size ) ) )
+        if batch:
+            pending.append( pool.submit( _strip_batch , batch ) )
+        if pending and ( not batch or len( pending ) >= window ):
+            for result in pending.popleft( ).result( ):
+                yield result
+        elif not batch:
+            return
+
+
+
+# ==================================================
+# CLASS: ShardWriter
+# ==================================================
+#
+# Description:
+#   Appends documents to the current shard and rolls
+#   over to a new shard once shard_size stripped bytes
+#   have been written.
+#
+# ==================================================
+class ShardWriter( object ):
+
+    def __init__( self , output_dir , shard_size=DEFAULT_SHARD_SIZE ):
+        self.output_dir  =  output_dir
+        self.shard_size  =  shard_size
+        self.shards      =  0
+        self.files       =  None
+        os.makedirs( output_dir , exist_ok=True )
+
+    def _open_shard( self ):
+        base        =  os.path.join( self.output_dir , 'shard-%05d' % self.shards )
+        self.files  =  ( open( base + '.txt' , 'wb' ) ,
+                         open( base + '.layout' , 'wb' ) ,
+                         open( base + '.index.jsonl' , 'w' ) )
+        self.shards  +=  1
+
+    def write( self , path , stripped , layout_bytes ):
+        if self.files is None or self.files[ 0 ].tell( ) >= self.shard_size:
+            self.close( )
+            self._open_shard( )
+        text_file , layout_file , index_file  =  self.files
+        entry  =  {
+                        'path'          :  path,
+                        'text_offset'   :  text_file.tell( ),
+                        'text_length'   :  len( stripped ),
+                        'layout_offset' :  layout_file.tell( ),
+                        'layout_length' :  len( layout_bytes )
+                  }
+        text_file.write( stripped )
+        layout_file.write( layout_bytes )
+        index_file.write( json.dumps( entry ) + '\n' )
+
+    def close( self ):
+        if self.files is not None:
+            for f in self.files:
+                f.close( )
+            self.files  =  None
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self , *exc_info ):
+        self.close( )
+        return False
+
+
+
+# ==================================================
+# FUNCTION: read_shard
+# ==================================================
+#
+# Input:  path of a shard's .index.jsonl file
+#
+# Output: generator of ( path , stripped bytes ,
+#         SpaceLayout ) for every document in the shard
+#
+# ==================================================
+def read_shard( index_path ):
+    base  =  index_path[ : -len( '.index.jsonl' ) ]
+    with open( index_path , 'r' ) as index_file , \
+         open( base + '.txt' , 'rb' ) as text_file , \
+         open( base + '.layout' , 'rb' ) as layout_file:
+        for line in index_file:
+            entry  =  json.loads( line )
+            text_file.seek( entry[ 'text_offset' ] )
+            layout_file.seek( entry[ 'layout_offset' ] )
+            stripped  =  text_file.read( entry[ 'text_length' ] )
+            layout    =  SpaceLayout.from_bytes( layout_file.read( entry[ 'layout_length' ] ) )
+            yield entry[ 'path' ] , stripped , layout
+
+
+
+# ==================================================
+# FUNCTION: process_corpus
+# ==================================================
+#
+# Input:
+#       -   source:     directory or manifest file
+#       -   output_dir: where the shards are written
+#       -   workers:    number of processes (defaults
+#                       to the number of CPUs)
+#       -   shard_size: stripped bytes per shard
+#       -   batch_size: documents per worker round trip
+#
+# Output: dictionary of aggregate statistics
+#         (documents, bytes, seconds, documents/sec,
+#         bytes/sec, shards)
+#
+# Task:   start one pool, stream the documents through
+#         it in order (a bounded window of batches at a
+#         time), and append each result to the shards as
+#         it comes back
+#
+# ==================================================
+def process_corpus( source , output_dir , workers=None , shard_size=DEFAULT_SHARD_SIZE ,
+                    batch_size=DEFAULT_BATCH_SIZE ):
+    paths      =  collect_paths( source )
+    workers    =  workers or os.cpu_count( ) or 1
+    documents  =  0
+    total      =  0
+    start      =  default_timer( )
+    with ShardWriter( output_dir , shard_size ) as writer , \
+         ProcessPoolExecutor( max_workers=workers ) as pool:
+        results  =  _ordered_batches( pool , paths , batch_size , workers * BATCHES_PER_WORKER )
+        for path , size , stripped , layout_bytes in results:
+            writer.write( path , stripped , layout_bytes )
+            documents  +=  1
+            total      +=  size
+    seconds  =  default_timer( ) - start
+    return {
+                'documents'         :  documents,
+                'bytes'             :  total,
+                'seconds'           :  seconds,
+                'documents_per_sec' :  documents / seconds if seconds else 0.0,
+                'bytes_per_sec'     :  total / seconds if seconds else 0.0,
+                'shards'            :  writer.shards
+           }
+
+
+
+# ==================================================
+# FUNCTION: main
+# ==================================================
+#
+# Input:  command-line arguments
+#
+# Output: prints the aggregate statistics
+#
+# ==================================================
+def main( argv=None ):
+    parser  =  argparse.ArgumentParser( description='Strip spaces from a corpus of documents.' )
+    parser.add_argument( 'source' , help='directory of documents, or a manifest of paths' )
+    parser.add_argument( 'output_dir' , help='directory to write the shards to' )
+    parser.add_argument( '--workers' , type=int , default=None )
+    parser.add_argument( '--shard-size' , type=int , default=DEFAULT_SHARD_SIZE )
+    parser.add_argument( '--batch-size' , type=int , default=DEFAULT_BATCH_SIZE )
+    args    =  parser.parse_args( argv )
+
+    stats  =  process_corpus( args.source , args.output_dir , args.workers ,
+                              args.shard_size , args.batch_size )
+    print( 'Documents: %d in %d shard(s)' % ( stats[ 'documents' ] , stats[ 'shards' ] ) )
+    print( 'Elapsed: %.3f ms' % ( stats[ 'seconds' ] * 1000 ) )
+    print( 'Throughput: %.1f documents/sec, %.1f bytes/sec'
+           % ( stats[ 'documents_per_sec' ] , stats[ 'bytes_per_sec' ] ) )
+    return
+
+
+
+# Only perform program operations if this file if it's the main file
+if __name__ == '__main__':
+    main( )
@@ -0,0 +1,432 @@
+# ==================================================
+# benchmark.py
+# ==================================================
+#
+# Program: Space Removal and Replacement
+# Author:  Drake Young
+#
+# File Description:
+#   This file (benchmark.py) measures every remove /
+#   restore strategy in the project on synthetic
+#   text, so results are comparable between runs and
+#   between machines.
+#
+#   The text is generated from a seed, so the same
+#   size/density/run-length always gives the same
+#   corpus. Each measurement does warmup rounds, then
+#   repeated timed trials, and reports percentiles.
+#   Results can be written to JSON and compared with
+#   an earlier run to catch throughput regressions.
+#
+# ==================================================
+
+
+
+# ==================================================
+# IMPORTS
+# ==================================================
+#
+#   *   argparse: command-line options
+#   *   io:       in-memory files for the streaming
+#                 strategy
+#   *   json:     saving / loading results
+#   *   random:   seeded corpus generation
+#   *   timeit:   default_timer, the clock
+#   *   project modules: the strategies under test
+#
+# ==================================================
+import argparse
+import io
+import json
+import random
+from timeit import default_timer
+
+import basic_method
+import numpy_engine
+import parallel
+import RWOADL_initial
+import streaming
+
+
+
+# ==================================================
+# CONSTANTS
+# ==================================================
+#
+#   *   SIZE_SUFFIXES:     multipliers for sizes given
+#                          as e.g. '64K' or '1G'
+#   *   DEFAULT_SIZES:     quick run, 10 B .. 1 MiB
+#   *   FULL_SIZES:        10 B .. 1 GiB
+#   *   DEFAULT_DENSITIES: fraction of characters that
+#                          are spaces
+#   *   DEFAULT_RUNS:      length of each run of spaces
+#   *   PERCENTILES:       reported for every result
+#   *   GENERATOR_BLOCK:   corpora larger than this are
+#                          built by repeating one block
+#
+# ==================================================
+SIZE_SUFFIXES      =  { 'K' : 1 << 10 , 'M' : 1 << 20 , 'G' : 1 << 30 }
+DEFAULT_SIZES      =  [ 10 , 1 << 10 , 64 << 10 , 1 << 20 ]
+FULL_SIZES         =  [ 10 , 1 << 10 , 1 << 20 , 16 << 20 , 256 << 20 , 1 << 30 ]
+DEFAULT_DENSITIES  =  [ 0.0 , 0.05 , 0.17 , 0.5 ]
+DEFAULT_RUNS       =  [ 1 , 8 ]
+PERCENTILES        =  [ 50 , 90 , 99 ]
+GENERATOR_BLOCK    =  1 << 20
+LETTERS            =  'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ.,!?'
+
+
+
+# ==================================================
+# FUNCTION: generate_corpus
+# ==================================================
+#
+# Input:
+#       -   size:       length of the text to build
+#       -   density:    fraction of it that is spaces
+#                       (0.0 .. 1.0)
+#       -   run_length: spaces per run between words
+#       -   seed:       random seed
+#
+# Output: deterministic string of exactly 'size'
+#         characters
+#
+# Task:   alternate words and runs of spaces, choosing
+#         the average word length so that the runs make
+#         up 'density' of the text. Large corpora repeat
+#         one generated block to keep generation fast.
+#
+# ==================================================
+def generate_corpus( size , density , run_length=1 , seed=0 ):
+    rng    =  random.Random( '%d:%r:%d:%d' % ( size , density , run_length , seed ) )
+    block  =  min( size , GENERATOR_BLOCK )
+    if density <= 0:
+        text  =  ''.join( rng.choice( LETTERS ) for _ in range( block ) )
+    else:
+        mean_word  =  max( run_length * ( 1 - density ) / density , 0.0 )
+        parts      =  [ ]
+        length     =  0
+        while length < block:
+            word     =  max( 0 , int( round( rng.uniform( 0 , 2 * mean_word ) ) ) )
+            parts.append( ''.join( rng.choice( LETTERS ) for _ in range( word ) ) )
+            parts.append( ' ' * run_length )
+            length  +=  word + run_length
+        text  =  ''.join( parts )[ : block ]
+    if size > block:
+        text  =  ( text * ( size // block + 1 ) )[ : size ]
+    return text
+
+
+
+# ==================================================
+# STRATEGIES
+# ==================================================
+#
+# Each strategy is a ( remove , restore , max_size )
+# triple:
+#       -   remove( text ) returns ( stripped , state )
+#       -   restore( stripped , state , text ) returns
+#           the restored text
+#       -   max_size skips the strategy above that
+#           input size (None for no limit)
+#
+# ==================================================
+def _reference_remove( text ):
+    layout  =  basic_method.get_space_indices( text )
+    return basic_method.remove_spaces( text , layout ) , layout
+
+def _streaming_remove( text ):
+    stripped , positions  =  [ ] , [ ]
+    for chunk , chunk_positions in streaming.remove_spaces_stream( io.StringIO( text ) ):
+        stripped.append( chunk )
+        positions.append( chunk_positions )
+    return ''.join( stripped ) , positions
+
+def _streaming_restore( stripped , positions , text ):
+    return ''.join( streaming.restore_spaces_stream( io.StringIO( stripped ) , positions ) )
+
+# The walk cannot restore a space at the very start or
+# end of its text, and needs some text to mutate, so it
+# runs on the corpus with its edge spaces trimmed; the
+# edges are put back around its result.
+def _rwoadl_edges( text ):
+    core  =  text.strip( ' ' )
+    lead  =  len( text ) - len( text.lstrip( ' ' ) )
+    return text[ : lead ] , core , text[ lead + len( core ) : ]
+
+def _rwoadl_remove( text ):
+    random.seed( 0 )
+    core  =  _rwoadl_edges( text )[ 1 ]
+    if ' ' not in core:
+        return core , None
+    return RWOADL_initial.remove_spaces( core , population_size=20 ) , None
+
+def _rwoadl_restore( stripped , state , text ):
+    random.seed( 0 )
+    lead , core , trail  =  _rwoadl_edges( text )
+    if ' ' not in core:
+        return lead + stripped + trail
+    return lead + RWOADL_initial.restore_spaces( core , stripped , population_size=20 ) + trail
+
+STRATEGIES  =  {
+    'basic_reference' :  ( _reference_remove ,
+                           lambda s , l , t : basic_method.restore_spaces( s , l ) , 16 << 20 ),
+    'basic_fast'      :  ( basic_method.remove_spaces_fast ,
+                           lambda s , l , t : basic_method.restore_spaces( s , l ) , None ),
+    'separators'      :  ( basic_method.remove_separators ,
+                           lambda s , l , t : basic_method.restore_separators( s , l ) , None ),
+    'streaming'       :  ( _streaming_remove , _streaming_restore , None ),
+    'parallel'        :  ( parallel.remove_spaces_parallel ,
+                           lambda s , l , t : parallel.restore_spaces_parallel( s , l ) , None ),
+    'rwoadl'          :  ( _rwoadl_remove , _rwoadl_restore , 64 ),
+}
+if numpy_engine.HAVE_NUMPY:
+    STRATEGIES[ 'numpy' ]  =  ( numpy_engine.remove_spaces_fast ,
+                                lambda s , l , t : numpy_engine.restore_spaces( s , l ) , None )
+
+
+
+# ==================================================
+# FUNCTION: percentile
+# ==================================================
+#
+# Input:  sorted list of samples, percentile (0..100)
+#
+# Output: nearest-rank percentile of the samples
+#
+# ==================================================
+def percentile( samples , pct ):
+    rank  =  max( 1 , int( -( -pct * len( samples ) // 100 ) ) )
+    return samples[ min( rank , len( samples ) ) - 1 ]
+
+
+
+# ==================================================
+# FUNCTION: time_stage
+# ==================================================
+#
+# Input:
+#       -   func:    zero-argument callable to time
+#       -   warmup:  untimed calls first
+#       -   repeats: timed calls
+#
+# Output: tuple of ( sorted list of seconds per call ,
+#         result of the last call )
+#
+# Notes:
+#       -   raises ValueError unless repeats is at least
+#           1 (there would be no samples to summarize)
+#
+# ==================================================
+def time_stage( func , warmup , repeats ):
+    if repeats < 1:
+        raise ValueError( 'repeats must be at least 1, got %d' % repeats )
+    result  =  None
+    for _ in range( warmup ):
+        result  =  func( )
+    samples  =  [ ]
+    for _ in range( repeats ):
+        start   =  default_timer( )
+        result  =  func( )
+        samples.append( default_timer( ) - start )
+    return sorted( samples ) , result
+
+
+
+# ==================================================
+# FUNCTION: summarize
+# ==================================================
+#
+# Output: result dictionary for one stage of one
+#         strategy on one corpus
+#
+# ==================================================
+def summarize( strategy , stage , size , density , run_length , samples ):
+    result  =  {
+                    'strategy'   :  strategy,
+                    'stage'      :  stage,
+                    'size'       :  size,
+                    'density'    :  density,
+                    'run_length' :  run_length,
+                    'trials'     :  len( samples ),
+                    'min_s'      :  samples[ 0 ],
+                    'mean_s'     :  sum( samples ) / len( samples )
+               }
+    for pct in PERCENTILES:
+        result[ 'p%d_s' % pct ]  =  percentile( samples , pct )
+    median  =  result[ 'p50_s' ]
+    result[ 'mb_per_s' ]  =  size / median / 1e6 if median else float( 'inf' )
+    return result
+
+
+
+# ==================================================
+# FUNCTION: run_benchmark
+# ==================================================
+#
+# Input:
+#       -   sizes, densities, run_lengths: the corpora
+#       -   strategies: names from STRATEGIES
+#       -   warmup / repeats: rounds per measurement
+#       -   seed: corpus seed
+#
+# Output: list of result dictionaries (see summarize)
+#
+# Task:   for every corpus and strategy, time the remove
+#         and restore stages, and check the round trip
+#         gives back the original text
+#
+# ==================================================
+def run_benchmark( sizes=DEFAULT_SIZES , densities=DEFAULT_DENSITIES , run_lengths=DEFAULT_RUNS ,
+                   strategies=None , warmup=1 , repeats=5 , seed=0 ):
+    results  =  [ ]
+    for size in sizes:
+        for density in densities:
+            for run_length in run_lengths:
+                text  =  generate_corpus( size , density , run_length , seed )
+                for name in strategies or sorted( STRATEGIES ):
+                    remove , restore , max_size  =  STRATEGIES[ name ]
+                    if max_size is not None and size > max_size:
+                        continue
+                    samples , ( stripped , state )  =  time_stage( lambda : remove( text ) ,
+                                                                  warmup , repeats )
+                    results.append( summarize( name , 'remove' , size , density , run_length ,
+                                               samples ) )
+                    samples , restored  =  time_stage( lambda : restore( stripped , state , text ) ,
+                                                       warmup , repeats )
+                    results.append( summarize( name , 'restore' , size , density , run_length ,
+                                               samples ) )
+                    if restored != text:
+                        raise AssertionError( '%s did not round-trip (size=%d, density=%r)'
+                                              % ( name , size , density ) )
+    return results
+
+
+
+# ==================================================
+# FUNCTION: compare_results
+# ==================================================
+#
+# Input:
+#       -   baseline:  results from an earlier run
+#       -   current:   results from this run
+#       -   tolerance: allowed fractional slowdown
+#
+# Output: list of ( key , baseline MB/s , current MB/s )
+#         for every measurement that got slower than
+#         the tolerance allows
+#
+# ==================================================
+def compare_results( baseline , current , tolerance=0.10 ):
+    def key( result ):
+        return ( result[ 'strategy' ] , result[ 'stage' ] , result[ 'size' ] ,
+                 result[ 'density' ] , result[ 'run_length' ] )
+    previous     =  { key( result ) : result[ 'mb_per_s' ] for result in baseline }
+    regressions  =  [ ]
+    for result in current:
+        before  =  previous.get( key( result ) )
+        if before and result[ 'mb_per_s' ] < before * ( 1 - tolerance ):
+            regressions.append( ( key( result ) , before , result[ 'mb_per_s' ] ) )
+    return regressions
+
+
+
+# ==================================================
+# FUNCTION: parse_size
+# ==================================================
+#
+# Input:  size such as '10', '64K', '1G'
+#
+# Output: the size in characters
+#
+# ==================================================
+def parse_size( text ):
+    text  =  text.strip( ).upper( ).rstrip( 'B' )
+    if text and text[ -1 ] in SIZE_SUFFIXES:
+        return int( float( text[ : -1 ] ) * SIZE_SUFFIXES[ text[ -1 ] ] )
+    return int( text )
+
+
+
+# ==================================================
+# FUNCTION: count_at_least
+# ==================================================
+#
+# Input:  smallest allowed value
+#
+# Output: argparse type function parsing an int that is
+#         at least that value
+#
+# ==================================================
+def count_at_least( minimum ):
+    def count( text ):
+        value  =  int( text )
+        if value < minimum:
+            raise argparse.ArgumentTypeError( 'must be at least %d, got %d' % ( minimum , value ) )
+        return value
+    return count
+
+
+
+# ==================================================
+# FUNCTION: main
+# ==================================================
+#
+# Input:  command-line arguments
+#
+# Output: prints a results table; optionally writes
+#         JSON and reports regressions against a
+#         baseline (exit status 1 if any were found)
+#
+# ==================================================
+def main( argv=None ):
+    parser  =  argparse.ArgumentParser( description='Benchmark the space removal strategies.' )
+    parser.add_argument( '--sizes' , default=None ,
+                         help='comma-separated sizes, e.g. 10,1K,1M (default: quick set)' )
+    parser.add_argument( '--full' , action='store_true' , help='sizes from 10 B up to 1 GiB' )
+    parser.add_argument( '--densities' , default=','.join( map( str , DEFAULT_DENSITIES ) ) )
+    parser.add_argument( '--runs' , default=','.join( map( str , DEFAULT_RUNS ) ) )
+    parser.add_argument( '--strategies' , default=None ,
+                         help='comma-separated, from: %s' % ', '.join( sorted( STRATEGIES ) ) )
+    parser.add_argument( '--warmup' , type=count_at_least( 0 ) , default=1 )
+    parser.add_argument( '--repeats' , type=count_at_least( 1 ) , default=5 )
+    parser.add_argument( '--seed' , type=int , default=0 )
+    parser.add_argument( '--output' , default=None , help='write results to this JSON file' )
+    parser.add_argument( '--baseline' , default=None , help='JSON results to compare against' )
+    parser.add_argument( '--tolerance' , type=float , default=0.10 )
+    args    =  parser.parse_args( argv )
+
+    if args.sizes:
+        sizes  =  [ parse_size( size ) for size in args.sizes.split( ',' ) ]
+    else:
+        sizes  =  FULL_SIZES if args.full else DEFAULT_SIZES
+    results  =  run_benchmark( sizes ,
+                               [ float( d ) for d in args.densities.split( ',' ) ] ,
+                               [ int( r ) for r in args.runs.split( ',' ) ] ,
+                               args.strategies.split( ',' ) if args.strategies else None ,
+                               args.warmup , args.repeats , args.seed )
+
+    print( '%-16s %-8s %12s %8s %4s %12s %12s %10s'
+           % ( 'strategy' , 'stage' , 'size' , 'density' , 'run' , 'p50 ms' , 'p99 ms' , 'MB/s' ) )
+    for r in results:
+        print( '%-16s %-8s %12d %8.2f %4d %12.3f %12.3f %10.1f'
+               % ( r[ 'strategy' ] , r[ 'stage' ] , r[ 'size' ] , r[ 'density' ] ,
+                   r[ 'run_length' ] , r[ 'p50_s' ] * 1000 , r[ 'p99_s' ] * 1000 , r[ 'mb_per_s' ] ) )
+
+    if args.output:
+        with open( args.output , 'w' ) as f:
+            json.dump( { 'seed' : args.seed , 'results' : results } , f , indent=2 )
+    if args.baseline:
+        with open( args.baseline , 'r' ) as f:
+            baseline  =  json.load( f )[ 'results' ]
+        regressions  =  compare_results( baseline , results , args.tolerance )
+        for key , before , after in regressions:
+            print( 'REGRESSION %s: %.1f -> %.1f MB/s' % ( key , before , after ) )
+        if regressions:
+            raise SystemExit( 1 )
+    return
+
+
+
+# Only perform program operations if this file if it's the main file
+if __name__ == '__main__':
+    main( )
@@ -0,0 +1,462 @@
+# ==================================================
+# cli.py
+# ==================================================
+#
+# Program: Space Removal and Replacement
+# Author:  Drake Young
+#
+# File Description:
+#   This file (cli.py) is a command line tool for
+#   stripping and restoring spaces inside Unix
+#   pipelines:
+#
+#       python cli.py strip   [INPUT] [-o OUT] [--layout FILE]
+#       python cli.py restore [INPUT] [-o OUT]  --layout FILE
+#       python cli.py bench   [benchmark.py options]
+#
+#   INPUT and OUT default to stdin and stdout. Text is
+#   handled as raw bytes, block by block, through
+#   buffered binary I/O, so memory use does not grow
+#   with the input and no decoding is done. The layout
+#   file is the streaming.py format (every space
+#   position as a little-endian 64-bit integer).
+#
+#   With --workers, blocks are processed on a process
+#   (or thread) pool; at most a few blocks per worker
+#   are in flight, and output is always written in
+#   input order.
+#
+#   Nothing but the result is written to the output.
+#   --stats and --pretty report to stderr, and are off
+#   by default.
+#
+# ==================================================
+
+
+
+# ==================================================
+# IMPORTS
+# ==================================================
+#
+#   *   collections:        deque, the in-flight window
+#   *   os / sys:           standard streams
+#   *   array:              global layout positions
+#   *   timeit:             default_timer for --stats
+#   *   basic_method:       the per-block routines
+#   *   streaming:          layout file format and
+#                           restore block splitting
+#
+#   Imported where first needed, so a one-off run with
+#   a single worker starts quickly:
+#   *   argparse:           full command line parsing,
+#                           for bench, --help and any
+#                           arguments _parse_simple does
+#                           not handle (it imports re and
+#                           gettext, tens of milliseconds)
+#   *   concurrent.futures: process and thread pools
+#   *   contextlib:         redirect_stdout, sending
+#                           print_pretty to stderr
+#
+# ==================================================
+from collections import deque
+import os
+import sys
+from array import array
+from timeit import default_timer
+
+from basic_method import print_pretty, remove_spaces_fast, restore_spaces
+from streaming import POSITION_TYPECODE, read_layout_stream, restore_chunks, write_layout_chunk
+
+
+
+# ==================================================
+# CONSTANTS
+# ==================================================
+#
+#   *   DEFAULT_BLOCK_SIZE:  bytes read per block
+#   *   OUTPUT_BUFFER_SIZE:  buffer of output files
+#   *   BLOCKS_PER_WORKER:   blocks in flight per worker
+#
+# ==================================================
+DEFAULT_BLOCK_SIZE  =  1 << 20
+OUTPUT_BUFFER_SIZE  =  1 << 20
+BLOCKS_PER_WORKER   =  4
+
+
+
+# ==================================================
+# FUNCTION: read_blocks
+# ==================================================
+#
+# Input:
+#       -   fileobj:    binary file to read
+#       -   block_size: bytes per block
+#       -   lines:      end every block at a line break
+#                       (whole lines of about block_size
+#                       bytes)
+#
+# Output: generator of non-empty byte blocks
+#
+# ==================================================
+def read_blocks( fileobj , block_size=DEFAULT_BLOCK_SIZE , lines=False ):
+    while True:
+        if lines:
+            block  =  b''.join( fileobj.readlines( block_size ) )
+        else:
+            block  =  fileobj.read( block_size )
+        if not block:
+            return
+        yield block
+
+
+
+# ==================================================
+# FUNCTION: ordered_map
+# ==================================================
+#
+# Input:
+#       -   func:    function applied to every item
+#       -   items:   iterable of items (read lazily)
+#       -   workers: pool size; 1 or less runs inline
+#       -   pool:    'process' or 'thread'
+#
+# Output: generator of func( item ), in item order
+#
+# Task:   keep up to BLOCKS_PER_WORKER items per worker
+#         in flight and hand back results oldest first,
+#         so a slow block holds up output but never
+#         reorders it
+#
+# ==================================================
+def ordered_map( func , items , workers=1 , pool='process' ):
+    if not workers or workers <= 1:
+        for item in items:
+            yield func( item )
+        return
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    executor_class  =  ProcessPoolExecutor if pool == 'process' else ThreadPoolExecutor
+    window          =  deque( )
+    with executor_class( max_workers=workers ) as executor:
+        for item in items:
+            window.append( executor.submit( func , item ) )
+            if len( window ) >= workers * BLOCKS_PER_WORKER:
+                yield window.popleft( ).result( )
+        while window:
+            yield window.popleft( ).result( )
+
+
+
+# ==================================================
+# FUNCTION: _restore_block
+# ==================================================
+#
+# Task:   the per-block restore, kept at module level
+#         so it can be pickled
+#
+# ==================================================
+def _restore_block( job ):
+    return restore_spaces( *job )
+
+
+
+# ==================================================
+# FUNCTION: strip_stream
+# ==================================================
+#
+# Input:
+#       -   source:      binary file to strip
+#       -   destination: binary file for the stripped text
+#       -   layout_file: optional binary file for the
+#                        space positions
+#       -   block_size:  bytes per block
+#       -   workers:     pool size
+#       -   pool:        'process' or 'thread'
+#       -   lines:       cut blocks at line breaks and
+#                        flush after every block
+#
+# Output: number of bytes read
+#
+# ==================================================
+def strip_stream( source , destination , layout_file=None , block_size=DEFAULT_BLOCK_SIZE ,
+                  workers=1 , pool='process' , lines=False ):
+    offset  =  0
+    blocks  =  read_blocks( source , block_size , lines )
+    for stripped , layout in ordered_map( remove_spaces_fast , blocks , workers , pool ):
+        destination.write( stripped )
+        if layout_file is not None:
+            write_layout_chunk( layout_file , array( POSITION_TYPECODE ,
+                                                     map( offset.__add__ , layout ) ) )
+        offset  +=  len( stripped ) + len( layout )
+        if lines:
+            destination.flush( )
+    return offset
+
+
+
+# ==================================================
+# FUNCTION: restore_stream
+# ==================================================
+#
+# Input:
+#       -   source:      binary file of stripped text
+#       -   layout_file: binary layout file
+#       -   destination: binary file for the restored text
+#       -   block_size:  bytes per block
+#       -   workers:     pool size
+#       -   pool:        'process' or 'thread'
+#
+# Output: number of bytes written
+#
+# ==================================================
+def restore_stream( source , layout_file , destination , block_size=DEFAULT_BLOCK_SIZE ,
+                    workers=1 , pool='process' ):
+    written  =  0
+    jobs     =  restore_chunks( source , read_layout_stream( layout_file , block_size ) ,
+                                block_size )
+    for restored in ordered_map( _restore_block , jobs , workers , pool ):
+        destination.write( restored )
+        written  +=  len( restored )
+    return written
+
+
+
+# ==================================================
+# CLASS: _Tee
+# ==================================================
+#
+# Description:
+#   Wraps a file and keeps a copy of everything read
+#   from or written to it, for --pretty.
+#
+# ==================================================
+class _Tee( object ):
+
+    def __init__( self , fileobj ):
+        self.fileobj  =  fileobj
+        self.parts    =  [ ]
+
+    def read( self , size=-1 ):
+        data  =  self.fileobj.read( size )
+        self.parts.append( data )
+        return data
+
+    def readlines( self , hint=-1 ):
+        lines  =  self.fileobj.readlines( hint )
+        self.parts.extend( lines )
+        return lines
+
+    def write( self , data ):
+        self.parts.append( data )
+        return self.fileobj.write( data )
+
+    def flush( self ):
+        self.fileobj.flush( )
+
+    def text( self ):
+        return b''.join( self.parts ).decode( 'utf-8' , 'replace' )
+
+
+
+# ==================================================
+# FUNCTION: _open_input / _open_output
+# ==================================================
+#
+# Task:   '-' or no path means the standard stream;
+#         output files get a large write buffer
+#
+# ==================================================
+def _open_input( path ):
+    if path is None or path == '-':
+        return sys.stdin.buffer
+    return open( path , 'rb' )
+
+def _open_output( path ):
+    if path is None or path == '-':
+        return sys.stdout.buffer
+    return open( path , 'wb' , buffering=OUTPUT_BUFFER_SIZE )
+
+
+
+# ==================================================
+# FUNCTION: _run
+# ==================================================
+#
+# Input:  parsed arguments of strip or restore
+#
+# Output: N/A
+#
+# ==================================================
+def _run( args ):
+    source       =  _open_input( args.input )
+    destination  =  _open_output( args.output )
+    layout_file  =  None
+    if args.command == 'restore':
+        layout_file  =  open( args.layout , 'rb' )
+    elif args.layout:
+        layout_file  =  open( args.layout , 'wb' , buffering=OUTPUT_BUFFER_SIZE )
+    if args.pretty:
+        source       =  _Tee( source )
+        destination  =  _Tee( destination )
+
+    start  =  default_timer( )
+    try:
+        if args.command == 'strip':
+            nbytes  =  strip_stream( source , destination , layout_file , args.block_size ,
+                                     args.workers , args.pool , args.lines )
+        else:
+            nbytes  =  restore_stream( source , layout_file , destination , args.block_size ,
+                                       args.workers , args.pool )
+        destination.flush( )
+    finally:
+        for f in ( source , destination , layout_file ):
+            f  =  getattr( f , 'fileobj' , f )
+            if f is not None and f not in ( sys.stdin.buffer , sys.stdout.buffer ):
+                f.close( )
+    seconds  =  default_timer( ) - start
+
+    if args.stats:
+        sys.stderr.write( '%s: %d bytes in %.3f ms (%.1f MB/s)\n'
+                          % ( args.command , nbytes , seconds * 1000 ,
+                              nbytes / seconds / 1e6 if seconds else 0.0 ) )
+    if args.pretty:
+        from contextlib import redirect_stdout
+        labels  =  ( ( 'Original Text:' , 'Spaces Removed:' ) if args.command == 'strip'
+                     else ( 'Spaces Removed:' , 'Spaces Restored:' ) )
+        with redirect_stdout( sys.stderr ):
+            print_pretty( labels[ 0 ] , source.text( ) )
+            print_pretty( labels[ 1 ] , destination.text( ) )
+    return
+
+
+
+# ==================================================
+# FUNCTION: _parse_simple
+# ==================================================
+#
+# Input:  command line arguments
+#
+# Output: the same namespace main( )'s parser would
+#         give for a strip or restore command, or None
+#         when the arguments need the full parser
+#         (bench, --help, errors, anything unusual)
+#
+# Task:   the everyday strip/restore command lines,
+#         parsed without importing argparse
+#
+# ==================================================
+_VALUED   =  { '-o' : 'output' , '--output' : 'output' , '--layout' : 'layout' ,
+               '--block-size' : 'block_size' , '--workers' : 'workers' , '--pool' : 'pool' }
+_FLAGS    =  { '--stats' : 'stats' , '--pretty' : 'pretty' , '--lines' : 'lines' }
+
+def _parse_simple( argv ):
+    from types import SimpleNamespace
+    if not argv or argv[ 0 ] not in ( 'strip' , 'restore' ):
+        return None
+    args  =  SimpleNamespace( command=argv[ 0 ] , input=None , output=None , layout=None ,
+                              block_size=DEFAULT_BLOCK_SIZE , workers=1 , pool='process' ,
+                              stats=False , pretty=False , lines=False )
+    words  =  iter( argv[ 1 : ] )
+    for word in words:
+        name , equals , value  =  word.partition( '=' )
+        if name in _VALUED:
+            if not equals:
+                value  =  next( words , None )
+            if value is None:
+                return None
+            setattr( args , _VALUED[ name ] , value )
+        elif word in _FLAGS and ( word != '--lines' or args.command == 'strip' ):
+            setattr( args , _FLAGS[ word ] , True )
+        elif ( word == '-' or not word.startswith( '-' ) ) and args.input is None:
+            args.input  =  word
+        else:
+            return None
+    if args.pool not in ( 'process' , 'thread' ) or ( args.command == 'restore' and not args.layout ):
+        return None
+    try:
+        args.block_size , args.workers  =  int( args.block_size ) , int( args.workers )
+    except ValueError:
+        return None
+    return args
+
+
+
+# ==================================================
+# FUNCTION: main
+# ==================================================
+#
+# Input:  command line arguments (defaults to sys.argv)
+#
+# Output: N/A
+#
+# Task:   run strip or restore; common command lines are
+#         parsed by _parse_simple, everything else by
+#         argparse
+#
+# ==================================================
+def main( argv=None ):
+    argv  =  sys.argv[ 1 : ] if argv is None else list( argv )
+    args  =  _parse_simple( argv )
+    if args is None:
+        args  =  _parse_full( argv )
+    if args is None:
+        return
+    try:
+        _run( args )
+    except BrokenPipeError:
+        # the reader went away (e.g. "| head"); stop quietly
+        os.dup2( os.open( os.devnull , os.O_WRONLY ) , sys.stdout.fileno( ) )
+        raise SystemExit( 1 )
+    return
+
+
+
+# ==================================================
+# FUNCTION: _parse_full
+# ==================================================
+#
+# Input:  command line arguments
+#
+# Output: parsed strip/restore arguments, or None once
+#         bench has been run
+#
+# ==================================================
+def _parse_full( argv ):
+    import argparse
+    parser       =  argparse.ArgumentParser( description='Strip and restore spaces.' )
+    subparsers   =  parser.add_subparsers( dest='command' )
+    subparsers.required  =  True
+
+    for name in ( 'strip' , 'restore' ):
+        sub  =  subparsers.add_parser( name , help='%s spaces' % name )
+        sub.add_argument( 'input' , nargs='?' , default=None , help='input file (default: stdin)' )
+        sub.add_argument( '-o' , '--output' , default=None , help='output file (default: stdout)' )
+        sub.add_argument( '--layout' , required=( name == 'restore' ) ,
+                          help='layout file to write (strip) or read (restore)' )
+        sub.add_argument( '--block-size' , type=int , default=DEFAULT_BLOCK_SIZE )
+        sub.add_argument( '--workers' , type=int , default=1 )
+        sub.add_argument( '--pool' , choices=( 'process' , 'thread' ) , default='process' )
+        sub.add_argument( '--stats' , action='store_true' , help='report throughput on stderr' )
+        sub.add_argument( '--pretty' , action='store_true' ,
+                          help='also print the input and result on stderr' )
+        if name == 'strip':
+            sub.add_argument( '--lines' , action='store_true' ,
+                              help='cut blocks at line breaks and flush after each' )
+        else:
+            sub.set_defaults( lines=False )
+
+    subparsers.add_parser( 'bench' , help='run benchmark.py (takes its options)' , add_help=False )
+
+    args , extra  =  parser.parse_known_args( argv )
+    if args.command == 'bench':
+        import benchmark
+        benchmark.main( extra )
+        return None
+    if extra:
+        parser.error( 'unrecognized arguments: %s' % ' '.join( extra ) )
+    return args
+
+
+
+# Only perform program operations if this file if it's the main file
+if __name__ == '__main__':
+    main( )
@@ -0,0 +1,361 @@
+# ==================================================
+# container.py
+# ==================================================
+#
+# Program: Space Removal and Replacement
+# Author:  Drake Young
+#
+# File Description:
+#   This file (container.py) defines an on-disk format
+#   holding stripped text together with its space
+#   layout, so a document can be stripped once and
+#   restored later (elsewhere) from the file alone.
+#
+# File Format (all integers little-endian):
+#   -   header:  HEADER_FORMAT below; magic, version,
+#                flags, lengths, block size and a CRC-32
+#                of everything after the header
+#   -   index:   one INDEX_FORMAT entry per block of
+#                block_size spaces: the block's first
+#                position, where its packed gaps start in
+#                the layout section, and their bit width
+#   -   layout:  per block, the gaps between consecutive
+#                positions (minus one), bit-packed at the
+#                block's width
+#   -   text:    the stripped text (UTF-8 for strings)
+#
+#   Gaps between spaces are usually a word length, so
+#   they pack into a few bits each; the file is then
+#   smaller than the original text, which spent a whole
+#   byte on every space. The index lets a reader decode
+#   only the blocks covering a range of positions.
+#
+# ==================================================
+
+
+
+# ==================================================
+# IMPORTS
+# ==================================================
+#
+#   *   struct:       header and index packing
+#   *   zlib:         crc32 checksum
+#   *   array:        decoded positions
+#   *   bisect:       locating blocks by position
+#   *   operator:     sub, for computing gaps
+#   *   basic_method: remove_spaces_fast/restore_spaces
+#   *   restored_text: RestoredText, the lazy result
+#   *   space_layout: SpaceLayout, the index type
+#
+# ==================================================
+import struct
+import zlib
+from array import array
+from bisect import bisect_right
+from operator import sub
+
+from basic_method import remove_spaces_fast, restore_spaces
+from restored_text import RestoredText
+from space_layout import SpaceLayout, typecode_for
+
+
+
+# ==================================================
+# CONSTANTS
+# ==================================================
+#
+#   *   MAGIC / VERSION:    identify the format
+#   *   FLAG_TEXT:          set when the stripped text
+#                           was a str (stored as UTF-8)
+#   *   HEADER_FORMAT:      magic, version, flags,
+#                           reserved, original length,
+#                           stripped bytes, space count,
+#                           layout bytes, block size, crc32
+#   *   INDEX_FORMAT:       first position, byte offset,
+#                           bit width
+#   *   DEFAULT_BLOCK_SIZE: spaces per random-access block
+#
+# ==================================================
+MAGIC               =  b'SRRC'
+VERSION             =  1
+FLAG_TEXT           =  0x01
+HEADER_FORMAT       =  '<4sBBHQQQQII'
+HEADER_SIZE         =  struct.calcsize( HEADER_FORMAT )
+INDEX_FORMAT        =  '<QQB'
+INDEX_SIZE          =  struct.calcsize( INDEX_FORMAT )
+DEFAULT_BLOCK_SIZE  =  1024
+
+
+
+# ==================================================
+# FUNCTION: _pack_block / _unpack_block
+# ==================================================
+#
+# Task:   bit-pack a block's gaps (minus one) at a fixed
+#         width, and reverse it. The bits are built as a
+#         string of '0'/'1' so both directions stay
+#         linear in the block size.
+#
+# ==================================================
+def _pack_block( block ):
+    gaps   =  [ gap - 1 for gap in map( sub , block[ 1 : ] , block[ : -1 ] ) ]
+    width  =  max( gaps ).bit_length( ) if gaps else 0
+    if width == 0:
+        return 0 , b''
+    bits   =  ''.join( format( gap , '0%db' % width ) for gap in gaps )
+    size   =  ( len( bits ) + 7 ) // 8
+    return width , int( bits.ljust( size * 8 , '0' ) , 2 ).to_bytes( size , 'big' )
+
+def _unpack_block( first , count , width , data , typecode ):
+    positions  =  array( typecode , ( first , ) )
+    if count <= 1:
+        return positions
+    if width == 0:
+        positions.extend( range( first + 1 , first + count ) )
+        return positions
+    bits      =  format( int.from_bytes( data , 'big' ) , '0%db' % ( len( data ) * 8 ) )
+    position  =  first
+    for i in range( 0 , ( count - 1 ) * width , width ):
+        position  +=  int( bits[ i : i + width ] , 2 ) + 1
+        positions.append( position )
+    return positions
+
+def _packed_size( count , width ):
+    return ( max( count - 1 , 0 ) * width + 7 ) // 8
+
+
+
+# ==================================================
+# FUNCTION: write_container
+# ==================================================
+#
+# Input:
+#       -   fileobj:    binary file to write to
+#       -   stripped:   stripped text (str or bytes)
+#       -   indices:    SpaceLayout (or iterable) of the
+#                       removed spaces
+#       -   block_size: spaces per random-access block
+#
+# Output: N/A (the container is written to fileobj)
+#
+# ==================================================
+def write_container( fileobj , stripped , indices , block_size=DEFAULT_BLOCK_SIZE ):
+    layout     =  SpaceLayout.coerce( indices )
+    positions  =  layout.positions
+    original   =  len( stripped ) + len( layout )
+    flags      =  0
+    if isinstance( stripped , str ):
+        flags     |=  FLAG_TEXT
+        stripped   =  stripped.encode( 'utf-8' )
+
+    index   =  [ ]
+    blocks  =  [ ]
+    offset  =  0
+    for start in range( 0 , len( positions ) , block_size ):
+        block          =  positions[ start : start + block_size ]
+        width , data   =  _pack_block( block )
+        index.append( struct.pack( INDEX_FORMAT , block[ 0 ] , offset , width ) )
+        blocks.append( data )
+        offset        +=  len( data )
+
+    body    =  [ b''.join( index ) , b''.join( blocks ) , bytes( stripped ) ]
+    crc     =  0
+    for part in body:
+        crc  =  zlib.crc32( part , crc )
+    header  =  struct.pack( HEADER_FORMAT , MAGIC , VERSION , flags , 0 , original ,
+                            len( stripped ) , len( layout ) , offset , block_size , crc )
+    fileobj.write( header )
+    for part in body:
+        fileobj.write( part )
+
+
+
+# ==================================================
+# FUNCTION: _read_exact
+# ==================================================
+#
+# Input:
+#       -   fileobj: binary file
+#       -   size:    bytes wanted
+#
+# Output: exactly size bytes
+#
+# Notes:
+#       -   raises ValueError('truncated container') when
+#           the file ends first, so a cut-short file never
+#           surfaces as a struct.error or as a silently
+#           short layout or text
+#
+# ==================================================
+def _read_exact( fileobj , size ):
+    data  =  fileobj.read( size )
+    if len( data ) < size:
+        raise ValueError( 'truncated container' )
+    return data
+
+
+
+# ==================================================
+# CLASS: ContainerReader
+# ==================================================
+#
+# Description:
+#   Reads a container from a seekable binary file.
+#   Only the header and block index are read up front;
+#   the layout blocks and the text are read on demand,
+#   so a range of positions can be decoded without
+#   touching the rest of the file.
+#
+# ==================================================
+class ContainerReader( object ):
+
+    def __init__( self , fileobj ):
+        self.fileobj  =  fileobj
+        self.base     =  fileobj.tell( )
+        header        =  _read_exact( fileobj , HEADER_SIZE )
+        ( magic , version , self.flags , _ , self.original_length , self.stripped_bytes ,
+          self.space_count , self.layout_bytes , self.block_size , self.crc )  =  \
+            struct.unpack( HEADER_FORMAT , header )
+        if magic != MAGIC:
+            raise ValueError( 'not a space container' )
+        if version != VERSION:
+            raise ValueError( 'unsupported container version %d' % version )
+
+        if self.block_size == 0 and self.space_count:
+            raise ValueError( 'corrupt container header (block size 0)' )
+
+        blocks         =  -( -self.space_count // self.block_size ) if self.space_count else 0
+        self.index     =  list( struct.iter_unpack( INDEX_FORMAT ,
+                                                    _read_exact( fileobj , blocks * INDEX_SIZE ) ) )
+        self.firsts    =  [ entry[ 0 ] for entry in self.index ]
+        self.typecode  =  typecode_for( self.original_length )
+        self.layout_start  =  self.base + HEADER_SIZE + blocks * INDEX_SIZE
+        self.text_start    =  self.layout_start + self.layout_bytes
+
+    # ==================================================
+    # METHOD: block
+    # ==================================================
+    #
+    # Input:  block number
+    #
+    # Output: array of that block's positions
+    #
+    # ==================================================
+    def block( self , number ):
+        first , offset , width  =  self.index[ number ]
+        count                   =  min( self.block_size ,
+                                        self.space_count - number * self.block_size )
+        self.fileobj.seek( self.layout_start + offset )
+        data  =  _read_exact( self.fileobj , _packed_size( count , width ) )
+        return _unpack_block( first , count , width , data , self.typecode )
+
+    # ==================================================
+    # METHOD: layout
+    # ==================================================
+    #
+    # Output: the full SpaceLayout
+    #
+    # ==================================================
+    def layout( self ):
+        positions  =  array( self.typecode )
+        for number in range( len( self.index ) ):
+            positions.extend( self.block( number ) )
+        return SpaceLayout.from_array( positions )
+
+    # ==================================================
+    # METHOD: layout_range
+    # ==================================================
+    #
+    # Input:  start/end positions (end exclusive)
+    #
+    # Output: array of the positions p with
+    #         start <= p < end, decoding only the blocks
+    #         that can hold them
+    #
+    # ==================================================
+    def layout_range( self , start , end ):
+        positions  =  array( self.typecode )
+        number     =  max( bisect_right( self.firsts , start ) - 1 , 0 )
+        while number < len( self.index ) and self.firsts[ number ] < end:
+            positions.extend( p for p in self.block( number ) if start <= p < end )
+            number  +=  1
+        return positions
+
+    # ==================================================
+    # METHOD: stripped
+    # ==================================================
+    #
+    # Output: the stripped text (str or bytes, as it was
+    #         written)
+    #
+    # ==================================================
+    def stripped( self ):
+        self.fileobj.seek( self.text_start )
+        data  =  _read_exact( self.fileobj , self.stripped_bytes )
+        if self.flags & FLAG_TEXT:
+            return data.decode( 'utf-8' )
+        return data
+
+    # ==================================================
+    # METHOD: verify
+    # ==================================================
+    #
+    # Output: N/A (raises ValueError on a bad checksum)
+    #
+    # ==================================================
+    def verify( self ):
+        self.fileobj.seek( self.base + HEADER_SIZE )
+        remaining  =  self.text_start + self.stripped_bytes - self.fileobj.tell( )
+        crc        =  0
+        while remaining > 0:
+            data  =  self.fileobj.read( min( remaining , 1 << 20 ) )
+            if not data:
+                raise ValueError( 'truncated container' )
+            crc         =  zlib.crc32( data , crc )
+            remaining  -=  len( data )
+        if crc != self.crc:
+            raise ValueError( 'container checksum mismatch' )
+
+
+
+# ==================================================
+# FUNCTION: read_container
+# ==================================================
+#
+# Input:
+#       -   fileobj: binary file positioned at a
+#                    container
+#       -   verify:  check the CRC-32 before returning
+#
+# Output: tuple of ( stripped text , SpaceLayout )
+#
+# ==================================================
+def read_container( fileobj , verify=True ):
+    reader  =  ContainerReader( fileobj )
+    if verify:
+        reader.verify( )
+    return reader.stripped( ) , reader.layout( )
+
+
+
+# ==================================================
+# FUNCTION: strip_to_container / restore_from_container
+# ==================================================
+#
+# Task:   the whole round trip through a container:
+#         remove the spaces and save the result, or load
+#         a saved result and put the spaces back (with
+#         lazy=True, as a RestoredText view that is only
+#         restored as it is read)
+#
+# ==================================================
+def strip_to_container( text , fileobj , block_size=DEFAULT_BLOCK_SIZE ):
+    stripped , layout  =  remove_spaces_fast( text )
+    write_container( fileobj , stripped , layout , block_size )
+    return layout
+
+def restore_from_container( fileobj , verify=True , lazy=False ):
+    stripped , layout  =  read_container( fileobj , verify )
+    if lazy:
+        return RestoredText( stripped , layout )
+    return restore_spaces( stripped , layout )
@@ -0,0 +1,547 @@
+# ==================================================
+# dispatch.py
+# ==================================================
+#
+# Program: Space Removal and Replacement
+# Author:  Drake Young
+#
+# File Description:
+#   This file (dispatch.py) picks a remove/restore
+#   engine for each call, so callers do not have to
+#   choose one by hand:
+#       -   python:   basic_method's reference routines
+#       -   builtin:  basic_method's C-level split/join
+#       -   numpy:    numpy_engine (when NumPy is
+#                     installed)
+#       -   parallel: parallel.py's process pool (on
+#                     machines with more than one CPU)
+#
+#   Each call is placed by its size and its space
+#   density (from a short sample of the text when
+#   removing, exactly from the layout when restoring).
+#   The engine for each size and density comes from a
+#   profile measured once on this machine with the
+#   benchmark.py corpus generator and cached as JSON.
+#   The profile is remeasured when it was made on a
+#   different setup (Python version, CPU count, NumPy
+#   availability).
+#
+#   Engines are imported only when first chosen, so
+#   small inputs never load NumPy or multiprocessing.
+#
+# ==================================================
+
+
+
+# ==================================================
+# IMPORTS
+# ==================================================
+#
+#   *   argparse:  command line options
+#   *   bisect:    looking up size and density buckets
+#   *   functools: partial, binding the shared executor
+#                  to the parallel engine
+#   *   importlib: loading engines on first use
+#   *   json / os: the cached profile file
+#   *   platform / sys: the machine fingerprint
+#
+#   Imported where first needed:
+#   *   benchmark: corpus generation and timing, for
+#                  calibrate( )
+#   *   concurrent.futures: the parallel engine's
+#                  process pool
+#
+# ==================================================
+import argparse
+from bisect import bisect_left, bisect_right
+from functools import partial
+import importlib
+import importlib.util
+import json
+import os
+import platform
+import sys
+
+
+
+# ==================================================
+# CONSTANTS
+# ==================================================
+#
+#   *   PROFILE_VERSION:   bumped when the profile layout
+#                          or the engines change
+#   *   DEFAULT_PROFILE:   where the profile is cached
+#                          (overridden by the
+#                          SPACE_REMOVAL_PROFILE variable)
+#   *   ENGINES:           name -> ( module , remove ,
+#                          restore ) function names
+#   *   DENSITY_BOUNDS:    upper bounds of the density
+#                          buckets ...
+#   *   DENSITY_SAMPLES:   ... and the density each is
+#                          measured at
+#   *   CALIBRATION_SIZES: input sizes measured
+#   *   PYTHON_MAX_SIZE:   the reference engine is not
+#                          measured (or used) above this
+#   *   SAMPLE_SIZE:       characters sampled for the
+#                          density of text to strip
+#   *   CORPUS_BLOCK:      calibration corpora repeat a
+#                          generated block of this size
+#   *   PRUNE_FACTOR:      engines this many times slower
+#                          than the fastest stop being
+#                          measured at larger sizes ...
+#   *   PRUNE_MIN_SIZE:    ... once they lose by that much
+#                          at this size or above
+#
+# ==================================================
+PROFILE_VERSION    =  1
+DEFAULT_PROFILE    =  os.path.join( os.path.expanduser( '~' ) , '.cache' , 'space_removal' ,
+                                    'dispatch_profile.json' )
+ENGINES            =  {
+                            'python'   :  ( 'dispatch' , '_python_remove' , '_python_restore' ),
+                            'builtin'  :  ( 'basic_method' , 'remove_spaces_fast' , 'restore_spaces' ),
+                            'numpy'    :  ( 'numpy_engine' , 'remove_spaces_fast' , 'restore_spaces' ),
+                            'parallel' :  ( 'parallel' , 'remove_spaces_parallel' ,
+                                            'restore_spaces_parallel' )
+                      }
+DENSITY_BOUNDS     =  [ 0.02 , 0.10 , 0.30 ]
+DENSITY_SAMPLES    =  [ 0.01 , 0.05 , 0.17 , 0.50 ]
+CALIBRATION_SIZES  =  [ 16 , 256 , 4 << 10 , 64 << 10 , 1 << 20 , 4 << 20 ]
+PYTHON_MAX_SIZE    =  64 << 10
+SAMPLE_SIZE        =  4096
+CORPUS_BLOCK       =  64 << 10
+PRUNE_FACTOR       =  4
+PRUNE_MIN_SIZE     =  64 << 10
+
+
+
+# ==================================================
+# FUNCTION: _python_remove / _python_restore
+# ==================================================
+#
+# Task:   the reference engine: basic_method's original
+#         generator-based index scan and removal
+#
+# ==================================================
+def _python_remove( text ):
+    import basic_method
+    layout  =  basic_method.get_space_indices( text )
+    return basic_method.remove_spaces( text , layout ) , layout
+
+def _python_restore( text , indices ):
+    import basic_method
+    return basic_method.restore_spaces( text , indices )
+
+
+
+# ==================================================
+# FUNCTION: fingerprint
+# ==================================================
+#
+# Output: dictionary describing this machine and
+#         install; a profile made under a different
+#         fingerprint is not trusted
+#
+# ==================================================
+def fingerprint( ):
+    return {
+                'version' :  PROFILE_VERSION,
+                'python'  :  '%d.%d' % sys.version_info[ : 2 ],
+                'machine' :  platform.machine( ),
+                'cpus'    :  os.cpu_count( ) or 1,
+                'numpy'   :  importlib.util.find_spec( 'numpy' ) is not None
+           }
+
+def available_engines( ):
+    info     =  fingerprint( )
+    engines  =  [ 'python' , 'builtin' ]
+    if info[ 'numpy' ]:
+        engines.append( 'numpy' )
+    if info[ 'cpus' ] > 1:
+        engines.append( 'parallel' )
+    return engines
+
+
+
+# ==================================================
+# FUNCTION: calibrate
+# ==================================================
+#
+# Input:
+#       -   sizes:   input sizes to measure
+#       -   repeats: timed calls per measurement
+#
+# Output: profile dictionary: for each stage and
+#         density bucket, a list of [ size , engine ]
+#         steps, in increasing size
+#
+# Task:   time every available engine on benchmark
+#         corpora of each size and density; the fastest
+#         (by median) wins that size. An engine more than
+#         PRUNE_FACTOR times slower than the winner at a
+#         size of PRUNE_MIN_SIZE or more (past any fixed
+#         per-call overhead) is not timed again at larger
+#         sizes for that density. One block of
+#         corpus per density is generated, repeated up to
+#         the largest size and cut down for the smaller
+#         ones, which keeps calibration to a few seconds.
+#         The parallel engine is timed on one process
+#         pool kept for the whole calibration, as the
+#         Dispatcher uses it, so pool start-up is not
+#         counted in every call.
+#
+# ==================================================
+def calibrate( sizes=CALIBRATION_SIZES , repeats=3 ):
+    pool  =  _SharedPool( )
+    try:
+        return _calibrate( sizes , repeats , pool )
+    finally:
+        pool.close( )
+
+def _calibrate( sizes , repeats , pool ):
+    import basic_method
+    import benchmark
+    engines  =  available_engines( )
+    profile  =  { 'fingerprint' : fingerprint( ) , 'remove' : [ ] , 'restore' : [ ] }
+    for density in DENSITY_SAMPLES:
+        block    =  benchmark.generate_corpus( min( max( sizes ) , CORPUS_BLOCK ) , density )
+        corpus   =  block * ( -( -max( sizes ) // len( block ) ) )
+        steps    =  { 'remove' : [ ] , 'restore' : [ ] }
+        dropped  =  { 'remove' : set( ) , 'restore' : set( ) }
+        for size in sorted( sizes ):
+            text               =  corpus[ : size ]
+            stripped , layout  =  basic_method.remove_spaces_fast( text )
+            jobs               =  { 'remove'  :  lambda func : func( text ),
+                                    'restore' :  lambda func : func( stripped , layout ) }
+            for stage , stage_steps in steps.items( ):
+                timings  =  [ ]
+                for name in engines:
+                    if name in dropped[ stage ] or not _worth_timing( name , stage , size ):
+                        continue
+                    func        =  _functions( name , pool )[ stage == 'restore' ]
+                    samples , _ =  benchmark.time_stage( lambda : jobs[ stage ]( func ) , 1 , repeats )
+                    timings.append( ( samples[ len( samples ) // 2 ] , name ) )
+                fastest , winner  =  min( timings )
+                if size >= PRUNE_MIN_SIZE:
+                    dropped[ stage ].update( name for seconds , name in timings
+                                             if seconds > PRUNE_FACTOR * fastest )
+                if not stage_steps or stage_steps[ -1 ][ 1 ] != winner:
+                    stage_steps.append( [ size , winner ] )
+        for stage in steps:
+            steps[ stage ][ 0 ][ 0 ]  =  0
+            profile[ stage ].append( steps[ stage ] )
+    return profile
+
+
+
+# ==================================================
+# FUNCTION: _worth_timing
+# ==================================================
+#
+# Input:
+#       -   name:  engine name
+#       -   stage: 'remove' or 'restore'
+#       -   size:  calibration size in characters
+#
+# Output: whether calibrate( ) should time this engine
+#         at this size: the python engine only removes,
+#         and only up to PYTHON_MAX_SIZE; the parallel
+#         engine only from parallel.MIN_PARALLEL_SIZE up
+#         (below it, parallel.py runs serially anyway)
+#
+# ==================================================
+def _worth_timing( name , stage , size ):
+    if name == 'python':
+        # the reference restore is basic_method.restore_spaces, i.e. 'builtin'
+        return stage == 'remove' and size <= PYTHON_MAX_SIZE
+    if name == 'parallel':
+        return size >= _parallel_minimum( )
+    return True
+
+
+
+# ==================================================
+# FUNCTION: _parallel_minimum
+# ==================================================
+#
+# Output: parallel.MIN_PARALLEL_SIZE, importing
+#         parallel.py only when the parallel engine is
+#         actually being calibrated
+#
+# ==================================================
+def _parallel_minimum( ):
+    import parallel
+    return parallel.MIN_PARALLEL_SIZE
+
+
+
+# ==================================================
+# FUNCTION: load_profile / save_profile
+# ==================================================
+#
+# Input:  path of the profile file (defaults to
+#         SPACE_REMOVAL_PROFILE or DEFAULT_PROFILE)
+#
+# Output (load): the profile, or None when it is
+#                missing, unreadable or from a
+#                different fingerprint
+#
+# ==================================================
+def profile_path( path=None ):
+    return path or os.environ.get( 'SPACE_REMOVAL_PROFILE' ) or DEFAULT_PROFILE
+
+def load_profile( path=None ):
+    try:
+        with open( profile_path( path ) , 'r' ) as f:
+            profile  =  json.load( f )
+    except ( OSError , ValueError ):
+        return None
+    if profile.get( 'fingerprint' ) != fingerprint( ):
+        return None
+    return profile
+
+def save_profile( profile , path=None ):
+    path       =  profile_path( path )
+    directory  =  os.path.dirname( path )
+    if directory and not os.path.isdir( directory ):
+        os.makedirs( directory )
+    temporary  =  path + '.tmp'
+    with open( temporary , 'w' ) as f:
+        json.dump( profile , f , indent=2 )
+    os.replace( temporary , path )
+
+
+
+# ==================================================
+# FUNCTION: _functions
+# ==================================================
+#
+# Input:
+#       -   name: engine name
+#       -   pool: _SharedPool whose executor the parallel
+#                 engine runs on (a pool per call if None)
+#
+# Output: tuple of ( remove , restore ) functions,
+#         importing the engine's module if needed
+#
+# ==================================================
+_loaded  =  { }
+
+def _functions( name , pool=None ):
+    if name not in _loaded:
+        module_name , remove , restore  =  ENGINES[ name ]
+        module                          =  importlib.import_module( module_name )
+        _loaded[ name ]                 =  ( getattr( module , remove ) , getattr( module , restore ) )
+    remove , restore  =  _loaded[ name ]
+    if name == 'parallel' and pool is not None:
+        executor  =  pool.executor( )
+        return partial( remove , executor=executor ) , partial( restore , executor=executor )
+    return remove , restore
+
+
+
+# ==================================================
+# CLASS: _SharedPool
+# ==================================================
+#
+# Description:
+#   One process pool for the parallel engine, started
+#   the first time that engine is chosen and reused
+#   for every call after, until close( ).
+#
+# ==================================================
+class _SharedPool( object ):
+
+    def __init__( self ):
+        self.pool  =  None
+
+    def executor( self ):
+        if self.pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+            self.pool  =  ProcessPoolExecutor( max_workers=os.cpu_count( ) or 1 )
+        return self.pool
+
+    def close( self ):
+        if self.pool is not None:
+            self.pool.shutdown( wait=True )
+            self.pool  =  None
+
+
+
+# ==================================================
+# CLASS: Dispatcher
+# ==================================================
+#
+# Description:
+#   Routes remove/restore calls through a profile.
+#   Each lookup is two binary searches over a handful
+#   of thresholds. The parallel engine's process pool
+#   is started on first use and kept until close( ).
+#
+# ==================================================
+class Dispatcher( object ):
+
+    # ==================================================
+    # METHOD: __init__
+    # ==================================================
+    #
+    # Input:  profile from calibrate( ) / load_profile( )
+    #
+    # Task:   split each stage's steps into parallel
+    #         lists of sizes and engines for bisect
+    #
+    # ==================================================
+    def __init__( self , profile ):
+        self.profile  =  profile
+        self.pool     =  _SharedPool( )
+        self.tables   =  { }
+        for stage in ( 'remove' , 'restore' ):
+            self.tables[ stage ]  =  [ ( [ size for size , _ in steps ] ,
+                                         [ engine for _ , engine in steps ] )
+                                       for steps in profile[ stage ] ]
+
+    # ==================================================
+    # METHOD: load (classmethod)
+    # ==================================================
+    #
+    # Input:
+    #       -   path:      profile file to use
+    #       -   calibrate_missing: measure (and save) a
+    #                              profile if there is no
+    #                              usable one
+    #
+    # Output: a Dispatcher
+    #
+    # ==================================================
+    @classmethod
+    def load( cls , path=None , calibrate_missing=True ):
+        profile  =  load_profile( path )
+        if profile is None and calibrate_missing:
+            profile  =  calibrate( )
+            try:
+                save_profile( profile , path )
+            except OSError:
+                pass                              # read-only home: keep it in memory
+        return cls( profile or _fallback_profile( ) )
+
+    # ==================================================
+    # METHOD: choose
+    # ==================================================
+    #
+    # Input:
+    #       -   stage:   'remove' or 'restore'
+    #       -   size:    length of the (original) text
+    #       -   density: fraction of it that is spaces
+    #
+    # Output: name of the engine to use
+    #
+    # ==================================================
+    def choose( self , stage , size , density ):
+        sizes , engines  =  self.tables[ stage ][ bisect_left( DENSITY_BOUNDS , density ) ]
+        return engines[ max( bisect_right( sizes , size ) - 1 , 0 ) ]
+
+    # ==================================================
+    # METHOD: remove_spaces / restore_spaces
+    # ==================================================
+    #
+    # Output: same as basic_method.remove_spaces_fast /
+    #         basic_method.restore_spaces
+    #
+    # ==================================================
+    def remove_spaces( self , text ):
+        sample  =  text[ : SAMPLE_SIZE ]
+        space   =  b' ' if isinstance( text , ( bytes , bytearray ) ) else ' '
+        density =  sample.count( space ) / len( sample ) if sample else 0.0
+        engine  =  self.choose( 'remove' , len( text ) , density )
+        return _functions( engine , self.pool )[ 0 ]( text )
+
+    def restore_spaces( self , text , indices ):
+        size     =  len( text ) + len( indices )
+        density  =  len( indices ) / size if size else 0.0
+        engine   =  self.choose( 'restore' , size , density )
+        return _functions( engine , self.pool )[ 1 ]( text , indices )
+
+    def close( self ):
+        self.pool.close( )
+
+
+
+# ==================================================
+# FUNCTION: _fallback_profile
+# ==================================================
+#
+# Output: fixed profile used when calibration was
+#         declined: the C-level builtins everywhere
+#
+# ==================================================
+def _fallback_profile( ):
+    steps  =  [ [ [ 0 , 'builtin' ] ] for _ in DENSITY_SAMPLES ]
+    return { 'fingerprint' : fingerprint( ) , 'remove' : steps , 'restore' : steps }
+
+
+
+# ==================================================
+# FUNCTION: remove_spaces / restore_spaces
+# ==================================================
+#
+# Task:   module-level shortcuts through one shared
+#         Dispatcher, loaded (or calibrated) on first use
+#
+# ==================================================
+_default  =  None
+
+def default_dispatcher( ):
+    global _default
+    if _default is None:
+        _default  =  Dispatcher.load( )
+    return _default
+
+def remove_spaces( text ):
+    return default_dispatcher( ).remove_spaces( text )
+
+def restore_spaces( text , indices ):
+    return default_dispatcher( ).restore_spaces( text , indices )
+
+
+
+# ==================================================
+# FUNCTION: main
+# ==================================================
+#
+# Input:  command line arguments (defaults to sys.argv)
+#
+# Output: N/A (prints the profile in use)
+#
+# ==================================================
+def main( argv=None ):
+    parser  =  argparse.ArgumentParser( description='Calibrate or show the engine profile.' )
+    parser.add_argument( '--calibrate' , action='store_true' , help='measure a new profile' )
+    parser.add_argument( '--sizes' , default=None , help='comma-separated sizes, e.g. 16,4K,16M' )
+    parser.add_argument( '--repeats' , type=int , default=3 )
+    parser.add_argument( '--profile' , default=None , help='profile file to read/write' )
+    args    =  parser.parse_args( argv )
+
+    if args.calibrate:
+        import benchmark
+        sizes    =  ( [ benchmark.parse_size( size ) for size in args.sizes.split( ',' ) ]
+                      if args.sizes else CALIBRATION_SIZES )
+        profile  =  calibrate( sizes , args.repeats )
+        save_profile( profile , args.profile )
+    else:
+        profile  =  load_profile( args.profile )
+        if profile is None:
+            print( 'No profile for this machine yet; run with --calibrate.' )
+            return
+
+    print( 'Profile: %s' % profile_path( args.profile ) )
+    for stage in ( 'remove' , 'restore' ):
+        for bound , steps in zip( DENSITY_BOUNDS + [ 1.0 ] , profile[ stage ] ):
+            print( '%-8s density <= %.2f: %s'
+                   % ( stage , bound , ', '.join( '%s from %d' % ( engine , size )
+                                                  for size , engine in steps ) ) )
+    return
+
+
+
+# Only perform program operations if this file if it's the main file
+if __name__ == '__main__':
+    main( )
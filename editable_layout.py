@@ -0,0 +1,408 @@
+# ==================================================
+# editable_layout.py
+# ==================================================
+#
+# Program: Space Removal and Replacement
+# Author:  Drake Young
+#
+# File Description:
+#   This file (editable_layout.py) keeps the stripped
+#   text and space layout of a document that is still
+#   being edited, so an insert or delete costs time in
+#   proportion to the edit rather than to the document.
+#
+#   The document is held as a list of blocks of about
+#   BLOCK_SIZE characters of original text; each block
+#   stores its own stripped text and the positions of
+#   its spaces relative to the block start. Two Fenwick
+#   (binary indexed) trees sum the blocks' original
+#   lengths and space counts, so the block holding an
+#   offset, or the k-th space, is found in O(log n).
+#
+#   An edit inside one block rebuilds only that block.
+#   Blocks split, merged or dropped at the end of the
+#   document (as appending does) are pushed onto or
+#   popped off the Fenwick trees in O(log n); only such
+#   changes in the middle rebuild the trees, which is
+#   O(number of blocks) and happens at most once per
+#   BLOCK_SIZE / 4 characters of edits.
+#
+# ==================================================
+
+
+
+# ==================================================
+# IMPORTS
+# ==================================================
+#
+#   *   array:        global positions of layout( )
+#   *   basic_method: remove/restore of single blocks
+#   *   space_layout: SpaceLayout, the layout type
+#
+# ==================================================
+from array import array
+
+from basic_method import remove_spaces_fast, restore_spaces
+from space_layout import SpaceLayout, typecode_for
+
+
+
+# ==================================================
+# CONSTANTS
+# ==================================================
+#
+#   *   BLOCK_SIZE: target characters of original text
+#                   per block; blocks are split above
+#                   twice this and merged with a
+#                   neighbour below a quarter of it
+#
+# ==================================================
+BLOCK_SIZE  =  4096
+
+
+
+# ==================================================
+# CLASS: FenwickTree
+# ==================================================
+#
+# Description:
+#   Prefix sums over a list of non-negative integers,
+#   with O(log n) point updates, prefix queries and
+#   searches by cumulative value.
+#
+# ==================================================
+class FenwickTree( object ):
+    __slots__  =  ( 'tree' , )
+
+    def __init__( self , values=( ) ):
+        tree  =  [ 0 ]
+        tree.extend( values )
+        for i in range( 1 , len( tree ) ):
+            parent  =  i + ( i & -i )
+            if parent < len( tree ):
+                tree[ parent ]  +=  tree[ i ]
+        self.tree  =  tree
+
+    def __len__( self ):
+        return len( self.tree ) - 1
+
+    # ==================================================
+    # METHOD: append / pop
+    # ==================================================
+    #
+    # append: add a value after the last one, O(log n)
+    # pop:    remove the last value and return it,
+    #         O(log n)
+    #
+    # ==================================================
+    def append( self , value ):
+        i  =  len( self.tree )
+        self.tree.append( value + self.prefix( i - 1 ) - self.prefix( i - ( i & -i ) ) )
+
+    def pop( self ):
+        count  =  len( self )
+        value  =  self.prefix( count ) - self.prefix( count - 1 )
+        self.tree.pop( )
+        return value
+
+    # ==================================================
+    # METHOD: add
+    # ==================================================
+    #
+    # Input:
+    #       -   index: position of the value, from 0
+    #       -   delta: amount to add to it
+    #
+    # ==================================================
+    def add( self , index , delta ):
+        tree  =  self.tree
+        i     =  index + 1
+        while i < len( tree ):
+            tree[ i ]  +=  delta
+            i          +=  i & -i
+
+    # ==================================================
+    # METHOD: prefix
+    # ==================================================
+    #
+    # Input:  count of leading values
+    #
+    # Output: sum of the first count values
+    #
+    # ==================================================
+    def prefix( self , count ):
+        tree   =  self.tree
+        total  =  0
+        while count > 0:
+            total  +=  tree[ count ]
+            count  -=  count & -count
+        return total
+
+    # ==================================================
+    # METHOD: search
+    # ==================================================
+    #
+    # Input:  target cumulative value
+    #
+    # Output: tuple of ( index , remainder ): the first
+    #         value whose running total exceeds target,
+    #         and how far into that value target falls.
+    #         index is len( self ) when target is at or
+    #         past the total.
+    #
+    # ==================================================
+    def search( self , target ):
+        tree      =  self.tree
+        position  =  0
+        step      =  1 << ( len( tree ) - 1 ).bit_length( )
+        while step:
+            nxt  =  position + step
+            if nxt < len( tree ) and tree[ nxt ] <= target:
+                position  =  nxt
+                target   -=  tree[ nxt ]
+            step  >>=  1
+        return position , target
+
+
+
+# ==================================================
+# CLASS: EditableLayout
+# ==================================================
+#
+# Description:
+#   Stripped text plus space layout of a document that
+#   can be edited in place. Offsets are indices into
+#   the original (spaced) text; str and bytes are both
+#   supported.
+#
+# ==================================================
+class EditableLayout( object ):
+
+    # ==================================================
+    # METHOD: __init__
+    # ==================================================
+    #
+    # Input:
+    #       -   text:       initial document
+    #       -   block_size: target characters per block
+    #
+    # ==================================================
+    def __init__( self , text='' , block_size=BLOCK_SIZE ):
+        self.block_size  =  max( 1 , block_size )
+        self.minimum     =  max( 1 , self.block_size // 4 )
+        self.empty       =  text[ : 0 ]
+        self.blocks      =  [ remove_spaces_fast( piece ) for piece in self._cut( text ) ]
+        self._reindex( )
+
+    # ==================================================
+    # METHOD: _reindex
+    # ==================================================
+    #
+    # Task:   rebuild both Fenwick trees from the blocks
+    #
+    # ==================================================
+    def _reindex( self ):
+        self.lengths  =  FenwickTree( len( s ) + len( l ) for s , l in self.blocks )
+        self.spaces   =  FenwickTree( len( l ) for s , l in self.blocks )
+
+    # ==================================================
+    # METHOD: _cut
+    # ==================================================
+    #
+    # Input:  original text of one or more blocks
+    #
+    # Output: list of pieces, one per block; a piece over
+    #         twice block_size is cut into equal pieces of
+    #         about block_size, so none is left under the
+    #         minimum
+    #
+    # ==================================================
+    def _cut( self , piece ):
+        if len( piece ) <= 2 * self.block_size:
+            return [ piece ] if piece else [ ]
+        count  =  -( -len( piece ) // self.block_size )
+        return [ piece[ len( piece ) * i // count : len( piece ) * ( i + 1 ) // count ]
+                 for i in range( count ) ]
+
+    def __len__( self ):
+        return self.lengths.prefix( len( self.lengths ) )
+
+    # ==================================================
+    # METHOD: _locate
+    # ==================================================
+    #
+    # Input:  offset into the original text, 0..len
+    #
+    # Output: tuple of ( block , offset within block );
+    #         the end of the text is placed at the end
+    #         of the last block
+    #
+    # ==================================================
+    def _locate( self , offset ):
+        block , local  =  self.lengths.search( offset )
+        if block == len( self.blocks ) and block:
+            block  -=  1
+            local   =  self._block_length( block )
+        return block , local
+
+    def _block_length( self , block ):
+        stripped , layout  =  self.blocks[ block ]
+        return len( stripped ) + len( layout )
+
+    def _block_text( self , block ):
+        return restore_spaces( *self.blocks[ block ] )
+
+    # ==================================================
+    # METHOD: replace
+    # ==================================================
+    #
+    # Input:
+    #       -   start: first original index to replace
+    #       -   end:   index after the last one to replace
+    #       -   text:  replacement (may be empty)
+    #
+    # Output: N/A
+    #
+    # Task:   rebuild only the blocks the range touches;
+    #         a one-block edit that leaves the block at a
+    #         reasonable size just updates the trees, and
+    #         so does replacing the blocks at the end
+    #
+    # ==================================================
+    def replace( self , start , end , text ):
+        if not 0 <= start <= end <= len( self ):
+            raise IndexError( 'edit range %d:%d outside document of length %d'
+                              % ( start , end , len( self ) ) )
+        if not self.blocks:
+            self.blocks  =  [ remove_spaces_fast( piece ) for piece in self._cut( text ) ]
+            self._reindex( )
+            return
+        first , head  =  self._locate( start )
+        if end > start:
+            last , tail  =  self._locate( end - 1 )
+            tail        +=  1
+        else:
+            last , tail  =  first , head
+        if first == last:
+            old_length  =  self._block_length( first )
+            new_length  =  old_length - ( tail - head ) + len( text )
+            if self.minimum <= new_length <= 2 * self.block_size:
+                old_spaces            =  len( self.blocks[ first ][ 1 ] )
+                self.blocks[ first ]  =  _splice( self.blocks[ first ] , head , tail , text )
+                self.lengths.add( first , new_length - old_length )
+                self.spaces.add( first , len( self.blocks[ first ][ 1 ] ) - old_spaces )
+                return
+            original  =  self._block_text( first )
+            piece     =  original[ : head ] + text + original[ tail : ]
+        else:
+            piece     =  self.empty.join( [ self._block_text( first )[ : head ] , text ,
+                                            self._block_text( last )[ tail : ] ] )
+        if len( piece ) < self.minimum and last + 1 < len( self.blocks ):
+            last   +=  1
+            piece  +=  self._block_text( last )
+        elif len( piece ) < self.minimum and first > 0:
+            first  -=  1
+            piece   =  self._block_text( first ) + piece
+        blocks  =  [ remove_spaces_fast( p ) for p in self._cut( piece ) ]
+        if last + 1 < len( self.blocks ):
+            self.blocks[ first : last + 1 ]  =  blocks
+            self._reindex( )
+            return
+        # the edit reaches the end: swap the trailing blocks in place
+        for _ in range( first , last + 1 ):
+            self.lengths.pop( )
+            self.spaces.pop( )
+        self.blocks[ first : ]  =  blocks
+        for stripped , layout in blocks:
+            self.lengths.append( len( stripped ) + len( layout ) )
+            self.spaces.append( len( layout ) )
+
+    def insert( self , offset , text ):
+        self.replace( offset , offset , text )
+
+    def delete( self , start , end ):
+        self.replace( start , end , self.empty )
+
+    def append( self , text ):
+        self.replace( len( self ) , len( self ) , text )
+
+    # ==================================================
+    # METHOD: rank / select
+    # ==================================================
+    #
+    # rank:   number of spaces before an original index,
+    #         O(log n); index - rank( index ) is where it
+    #         lands in the stripped text
+    # select: original index of the k-th space (from 0),
+    #         O(log n)
+    #
+    # ==================================================
+    def rank( self , index ):
+        if index >= len( self ):
+            return self.spaces.prefix( len( self.spaces ) )
+        block , local  =  self._locate( max( index , 0 ) )
+        return self.spaces.prefix( block ) + self.blocks[ block ][ 1 ].rank( local )
+
+    def select( self , k ):
+        block , remainder  =  self.spaces.search( k )
+        if k < 0 or block >= len( self.blocks ):
+            raise IndexError( 'space %d out of range' % k )
+        return self.lengths.prefix( block ) + self.blocks[ block ][ 1 ].select( remainder )
+
+    # ==================================================
+    # METHOD: stripped / layout / text
+    # ==================================================
+    #
+    # Output: the whole stripped text, its SpaceLayout
+    #         (global positions), or the original text;
+    #         each is O(n), for handing the document on
+    #
+    # ==================================================
+    def stripped( self ):
+        return self.empty.join( s for s , l in self.blocks )
+
+    def layout( self ):
+        positions  =  array( typecode_for( len( self ) ) )
+        offset     =  0
+        for stripped , layout in self.blocks:
+            positions.extend( map( offset.__add__ , layout ) )
+            offset  +=  len( stripped ) + len( layout )
+        return SpaceLayout.from_array( positions )
+
+    def text( self ):
+        return self.empty.join( restore_spaces( s , l ) for s , l in self.blocks )
+
+
+
+# ==================================================
+# FUNCTION: _splice
+# ==================================================
+#
+# Input:
+#       -   block: ( stripped , SpaceLayout ) of one block
+#       -   head:  first block offset to replace
+#       -   tail:  block offset after the last to replace
+#       -   text:  replacement
+#
+# Output: the edited block as ( stripped , SpaceLayout )
+#
+# Task:   edit the stripped text and positions directly:
+#         keep what lies before head, strip only the new
+#         text, and shift what lies from tail on by the
+#         change in length; the block's original text is
+#         never rebuilt
+#
+# ==================================================
+def _splice( block , head , tail , text ):
+    stripped , layout      =  block
+    positions              =  layout.positions
+    before , after         =  layout.rank( head ) , layout.rank( tail )
+    inserted , new_layout  =  remove_spaces_fast( text )
+    shift                  =  len( text ) - ( tail - head )
+    length                 =  len( stripped ) + len( layout ) + shift
+    result                 =  array( typecode_for( length ) , positions[ : before ] )
+    result.extend( map( head.__add__ , new_layout ) )
+    result.extend( map( shift.__add__ , positions[ after : ] ) )
+    stripped               =  ( stripped[ : head - before ] + inserted
+                                + stripped[ tail - after : ] )
+    return stripped , SpaceLayout.from_array( result )
@@ -0,0 +1,410 @@
+# ==================================================
+# instrumentation.py
+# ==================================================
+#
+# Program: Space Removal and Replacement
+# Author:  Drake Young
+#
+# File Description:
+#   This file (instrumentation.py) lets the pipeline
+#   stages (read, index, remove, restore, output)
+#   report how long they took, how many bytes they
+#   handled and, optionally, how much memory they
+#   allocated, plus free-form counters such as the
+#   number of RWOADL generations.
+#
+#   Events go to pluggable sinks:
+#       -   JsonLinesSink:   one JSON object per line
+#       -   MetricsRegistry: in-process counters and
+#                            totals, rendered in the
+#                            Prometheus text format
+#       -   any callable taking the event dictionary
+#
+#   Instrumentation is off until enable( ) is called.
+#   While it is off, stage( ) hands back one shared
+#   do-nothing object and count( ) returns at once, so
+#   the instrumented code pays for a single global
+#   lookup and comparison. Importing this file is
+#   cheap too: json, threading and tracemalloc are
+#   only imported once a sink or allocation tracing
+#   needs them.
+#
+# ==================================================
+
+
+
+# ==================================================
+# IMPORTS
+# ==================================================
+#
+#   *   time:        wall-clock timestamps for events,
+#                    and perf_counter, the stage clock
+#
+#   Imported where first needed:
+#   *   json:        JsonLinesSink output
+#   *   threading:   locks around sinks and registry,
+#                    per-thread stage stacks
+#   *   tracemalloc: optional allocation tracking
+#
+# ==================================================
+import time
+from time import perf_counter as default_timer
+
+
+
+# ==================================================
+# GLOBALS
+# ==================================================
+#
+#   *   _collector: the active Collector, or None when
+#                   instrumentation is disabled
+#
+# ==================================================
+_collector  =  None
+
+
+
+# ==================================================
+# CLASS: _NullStage
+# ==================================================
+#
+# Description:
+#   What stage( ) returns while disabled: a reusable
+#   context manager that does nothing.
+#
+# ==================================================
+class _NullStage( object ):
+    __slots__  =  ( )
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self , *exc_info ):
+        return False
+
+    def add_bytes( self , nbytes ):
+        return
+
+_NULL_STAGE  =  _NullStage( )
+
+
+
+# ==================================================
+# CLASS: _Stage
+# ==================================================
+#
+# Description:
+#   Times one stage and reports it to the collector
+#   when the with-block ends.
+#
+#   With allocation tracing, each stage resets the
+#   tracemalloc peak on entry so its own peak can be
+#   read on exit. To keep the peak of an enclosing
+#   stage right, the peak seen so far is first folded
+#   into the enclosing stage, and a stage's peak is
+#   passed up to it on exit.
+#
+# ==================================================
+class _Stage( object ):
+    __slots__  =  ( 'collector' , 'name' , 'nbytes' , 'start' , 'memory' , 'peak' )
+
+    def __init__( self , collector , name , nbytes ):
+        self.collector  =  collector
+        self.name       =  name
+        self.nbytes     =  nbytes
+        self.start      =  None
+        self.memory     =  None
+        self.peak       =  0
+
+    def add_bytes( self , nbytes ):
+        self.nbytes  +=  nbytes
+
+    def __enter__( self ):
+        if self.collector.trace_allocations:
+            import tracemalloc
+            open_stages  =  self.collector.open_stages( )
+            if open_stages:
+                open_stages[ -1 ].fold_peak( tracemalloc.get_traced_memory( )[ 1 ] )
+            if hasattr( tracemalloc , 'reset_peak' ):
+                tracemalloc.reset_peak( )
+            self.memory  =  tracemalloc.get_traced_memory( )[ 0 ]
+            open_stages.append( self )
+        self.start  =  default_timer( )
+        return self
+
+    def fold_peak( self , peak ):
+        self.peak  =  max( self.peak , peak )
+
+    def __exit__( self , exc_type , exc , traceback ):
+        seconds  =  default_timer( ) - self.start
+        event    =  {
+                        'type'    :  'stage',
+                        'name'    :  self.name,
+                        'seconds' :  seconds,
+                        'bytes'   :  self.nbytes,
+                        'ok'      :  exc_type is None
+                    }
+        if self.memory is not None:
+            import tracemalloc
+            current , peak          =  tracemalloc.get_traced_memory( )
+            self.fold_peak( peak )
+            open_stages             =  self.collector.open_stages( )
+            if open_stages and open_stages[ -1 ] is self:
+                open_stages.pop( )
+            if open_stages:
+                open_stages[ -1 ].fold_peak( self.peak )
+            event[ 'alloc_bytes' ]  =  current - self.memory
+            event[ 'peak_bytes' ]   =  self.peak - self.memory
+        self.collector.emit( event )
+        return False
+
+
+
+# ==================================================
+# CLASS: Collector
+# ==================================================
+#
+# Description:
+#   Fans events out to the configured sinks. With
+#   allocation tracing it also keeps the stack of open
+#   stages (one per thread, so stages running at the
+#   same time in different threads do not pop each
+#   other), and remembers whether enable( ) started
+#   tracemalloc (so disable( ) stops only what it
+#   started).
+#
+# ==================================================
+class Collector( object ):
+
+    def __init__( self , sinks=( ) , trace_allocations=False ):
+        self.sinks              =  list( sinks )
+        self.trace_allocations  =  trace_allocations
+        self.started_tracing    =  False
+        self.local              =  None
+        if trace_allocations:
+            import threading
+            self.local  =  threading.local( )
+
+    def add_sink( self , sink ):
+        self.sinks.append( sink )
+
+    def open_stages( self ):
+        try:
+            return self.local.stages
+        except AttributeError:
+            self.local.stages  =  [ ]
+            return self.local.stages
+
+    def emit( self , event ):
+        event[ 'time' ]  =  time.time( )
+        for sink in self.sinks:
+            sink( event )
+
+
+
+# ==================================================
+# CLASS: JsonLinesSink
+# ==================================================
+#
+# Description:
+#   Writes every event as one line of JSON to a file
+#   object (or to a path, opened for appending).
+#
+# ==================================================
+class JsonLinesSink( object ):
+
+    def __init__( self , target ):
+        import json
+        import threading
+        self.dumps  =  json.dumps
+        self.owned  =  isinstance( target , str )
+        self.file   =  open( target , 'a' ) if self.owned else target
+        self.lock   =  threading.Lock( )
+
+    def __call__( self , event ):
+        line  =  self.dumps( event , sort_keys=True ) + '\n'
+        with self.lock:
+            self.file.write( line )
+            self.file.flush( )
+
+    def close( self ):
+        if self.owned:
+            self.file.close( )
+
+
+
+# ==================================================
+# CLASS: MetricsRegistry
+# ==================================================
+#
+# Description:
+#   In-process aggregation of events, in the spirit of
+#   a Prometheus client registry:
+#       -   per stage: calls, seconds and bytes totals
+#           (and allocated bytes when traced)
+#       -   per counter: running total
+#   render( ) produces the Prometheus text format.
+#
+# ==================================================
+class MetricsRegistry( object ):
+
+    def __init__( self , prefix='space_removal' ):
+        import threading
+        self.prefix    =  prefix
+        self.stages    =  { }
+        self.counters  =  { }
+        self.lock      =  threading.Lock( )
+
+    def __call__( self , event ):
+        with self.lock:
+            if event[ 'type' ] == 'stage':
+                totals  =  self.stages.setdefault( event[ 'name' ] ,
+                                                   { 'calls' : 0 , 'seconds' : 0.0 , 'bytes' : 0 ,
+                                                     'alloc_bytes' : 0 } )
+                totals[ 'calls' ]        +=  1
+                totals[ 'seconds' ]      +=  event[ 'seconds' ]
+                totals[ 'bytes' ]        +=  event[ 'bytes' ]
+                totals[ 'alloc_bytes' ]  +=  event.get( 'alloc_bytes' , 0 )
+            else:
+                name                    =  event[ 'name' ]
+                self.counters[ name ]   =  self.counters.get( name , 0 ) + event[ 'value' ]
+
+    def snapshot( self ):
+        with self.lock:
+            return ( { name : dict( totals ) for name , totals in self.stages.items( ) } ,
+                     dict( self.counters ) )
+
+    def render( self ):
+        stages , counters  =  self.snapshot( )
+        lines              =  [ ]
+        for metric , key in ( ( 'stage_calls_total' , 'calls' ) ,
+                              ( 'stage_seconds_total' , 'seconds' ) ,
+                              ( 'stage_bytes_total' , 'bytes' ) ,
+                              ( 'stage_alloc_bytes_total' , 'alloc_bytes' ) ):
+            lines.append( '# TYPE %s_%s counter' % ( self.prefix , metric ) )
+            for name in sorted( stages ):
+                lines.append( '%s_%s{stage="%s"} %s'
+                              % ( self.prefix , metric , name , stages[ name ][ key ] ) )
+        for name in sorted( counters ):
+            metric  =  '%s_%s_total' % ( self.prefix , name.replace( '.' , '_' ) )
+            lines.append( '# TYPE %s counter' % metric )
+            lines.append( '%s %s' % ( metric , counters[ name ] ) )
+        return '\n'.join( lines ) + '\n'
+
+
+
+# ==================================================
+# FUNCTION: enable / disable / enabled
+# ==================================================
+#
+# Input (enable):
+#       -   sinks:             sinks / callables that
+#                              receive every event
+#       -   trace_allocations: also report memory
+#                              allocated per stage
+#                              (starts tracemalloc if
+#                              it is not already
+#                              tracing)
+#
+# Output (enable): the active Collector, so more sinks
+#                  can be added later
+#
+# Notes:
+#       -   disable( ) stops tracemalloc only if enable( )
+#           started it; tracing the caller started
+#           before enable( ) is left running
+#
+# ==================================================
+def enable( sinks=( ) , trace_allocations=False ):
+    global _collector
+    disable( )
+    collector  =  Collector( sinks , trace_allocations )
+    if trace_allocations:
+        import tracemalloc
+        if not tracemalloc.is_tracing( ):
+            tracemalloc.start( )
+            collector.started_tracing  =  True
+    _collector  =  collector
+    return _collector
+
+def disable( ):
+    global _collector
+    if _collector is not None and _collector.started_tracing:
+        import tracemalloc
+        if tracemalloc.is_tracing( ):
+            tracemalloc.stop( )
+    _collector  =  None
+
+def enabled( ):
+    return _collector is not None
+
+
+
+# ==================================================
+# FUNCTION: stage
+# ==================================================
+#
+# Input:
+#       -   name:   stage name ('read', 'index', ...)
+#       -   nbytes: bytes handled, if known up front
+#                   (more can be added with add_bytes)
+#
+# Output: context manager timing the with-block
+#
+# ==================================================
+def stage( name , nbytes=0 ):
+    collector  =  _collector
+    if collector is None:
+        return _NULL_STAGE
+    return _Stage( collector , name , nbytes )
+
+
+
+# ==================================================
+# FUNCTION: count
+# ==================================================
+#
+# Input:
+#       -   name:  counter name
+#       -   value: amount to add
+#
+# Output: N/A
+#
+# ==================================================
+def count( name , value=1 ):
+    collector  =  _collector
+    if collector is None:
+        return
+    collector.emit( { 'type' : 'counter' , 'name' : name , 'value' : value } )
+
+
+
+# ==================================================
+# FUNCTION: instrumented
+# ==================================================
+#
+# Input:  stage name
+#
+# Output: decorator timing every call of the decorated
+#         function as that stage; the size of the first
+#         argument is reported as the bytes handled (a
+#         str counts as its UTF-8 encoding)
+#
+# ==================================================
+def instrumented( name ):
+    def decorate( func ):
+        def wrapper( *args , **kwargs ):
+            collector  =  _collector
+            if collector is None:
+                return func( *args , **kwargs )
+            nbytes  =  0
+            if args and isinstance( args[ 0 ] , str ):
+                nbytes  =  len( args[ 0 ].encode( 'utf-8' ) )
+            elif args and hasattr( args[ 0 ] , '__len__' ):
+                nbytes  =  len( args[ 0 ] )
+            with _Stage( collector , name , nbytes ):
+                return func( *args , **kwargs )
+        wrapper.__name__  =  func.__name__
+        wrapper.__doc__   =  func.__doc__
+        return wrapper
+    return decorate
@@ -0,0 +1,296 @@
+# ==================================================
+# layout_cache.py
+# ==================================================
+#
+# Program: Space Removal and Replacement
+# Author:  Drake Young
+#
+# File Description:
+#   This file (layout_cache.py) remembers the results of
+#   remove_spaces_fast and restore_spaces, so documents
+#   that are stripped or restored again and again
+#   (templates, boilerplate, repeated log lines) are
+#   served without being rescanned.
+#
+#   Entries are content-addressed: a remove result is
+#   keyed by a BLAKE2 digest of the text, a restore
+#   result by a digest of the stripped text and its
+#   layout. Memory is capped by a byte budget; when it
+#   is exceeded the least recently used entries are
+#   evicted. With a spill directory, evicted entries
+#   are written there in the container.py format and
+#   read back (instead of recomputed) on a later miss.
+#
+# ==================================================
+
+
+
+# ==================================================
+# IMPORTS
+# ==================================================
+#
+#   *   collections:  OrderedDict, the LRU order
+#   *   hashlib:      blake2b content digests
+#   *   os:           spill file paths
+#   *   sys:          getsizeof, for the byte budget
+#   *   threading:    lock around the cache
+#   *   basic_method: remove_spaces_fast/restore_spaces
+#   *   container:    the spill file format
+#   *   space_layout: SpaceLayout, the layout type
+#
+# ==================================================
+from collections import OrderedDict
+import hashlib
+import os
+import sys
+import threading
+
+from basic_method import remove_spaces_fast, restore_spaces
+from container import read_container, write_container
+from space_layout import SpaceLayout
+
+
+
+# ==================================================
+# CONSTANTS
+# ==================================================
+#
+#   *   DEFAULT_MAX_BYTES: default memory budget
+#   *   DIGEST_SIZE:       bytes per content digest
+#
+# ==================================================
+DEFAULT_MAX_BYTES  =  64 << 20
+DIGEST_SIZE        =  16
+
+
+
+# ==================================================
+# FUNCTION: _digest
+# ==================================================
+#
+# Input:
+#       -   kind:   b'r' (remove) or b's' (restore),
+#                   keeping the two kinds of entry apart
+#       -   text:   str or bytes to hash
+#       -   layout: (restore only) SpaceLayout to hash
+#                   along with the text
+#
+# Output: hex digest naming the entry
+#
+# ==================================================
+def _digest( kind , text , layout=None ):
+    h  =  hashlib.blake2b( kind , digest_size=DIGEST_SIZE )
+    if isinstance( text , str ):
+        h.update( b't' )
+        h.update( text.encode( 'utf-8' , 'surrogatepass' ) )
+    else:
+        h.update( b'b' )
+        h.update( text )
+    if layout is not None:
+        h.update( layout.positions.typecode.encode( 'ascii' ) )
+        h.update( layout.positions )
+    return h.hexdigest( )
+
+
+
+# ==================================================
+# CLASS: LayoutCache
+# ==================================================
+#
+# Description:
+#   Byte-budgeted LRU cache in front of the remove and
+#   restore routines. Cached layouts are shared between
+#   callers and must not be modified.
+#
+# ==================================================
+class LayoutCache( object ):
+
+    # ==================================================
+    # METHOD: __init__
+    # ==================================================
+    #
+    # Input:
+    #       -   max_bytes: memory budget for cached entries
+    #       -   spill_dir: optional directory evicted
+    #                      entries are written to
+    #
+    # ==================================================
+    def __init__( self , max_bytes=DEFAULT_MAX_BYTES , spill_dir=None ):
+        self.max_bytes  =  max_bytes
+        self.spill_dir  =  spill_dir
+        self.entries    =  OrderedDict( )
+        self.bytes      =  0
+        self.lock       =  threading.Lock( )
+        self.counters   =  { 'hits' : 0 , 'misses' : 0 , 'disk_hits' : 0 ,
+                             'evictions' : 0 , 'spills' : 0 }
+        if spill_dir is not None and not os.path.isdir( spill_dir ):
+            os.makedirs( spill_dir )
+
+    # ==================================================
+    # METHOD: remove
+    # ==================================================
+    #
+    # Input:  text to strip
+    #
+    # Output: ( stripped , SpaceLayout ), as from
+    #         basic_method.remove_spaces_fast
+    #
+    # ==================================================
+    def remove( self , text ):
+        key    =  _digest( b'r' , text )
+        entry  =  self._lookup( key , False )
+        if entry is None:
+            entry  =  remove_spaces_fast( text )
+            self._store( key , entry , entry )
+        return entry
+
+    # ==================================================
+    # METHOD: restore
+    # ==================================================
+    #
+    # Input:
+    #       -   stripped: text without its spaces
+    #       -   indices:  SpaceLayout (or iterable) of the
+    #                     space positions
+    #
+    # Output: the restored text, as from
+    #         basic_method.restore_spaces
+    #
+    # ==================================================
+    def restore( self , stripped , indices ):
+        layout  =  SpaceLayout.coerce( indices )
+        key     =  _digest( b's' , stripped , layout )
+        entry   =  self._lookup( key , True )
+        if entry is None:
+            entry  =  restore_spaces( stripped , layout )
+            self._store( key , entry , ( stripped , layout ) )
+        return entry
+
+    # ==================================================
+    # METHOD: _lookup
+    # ==================================================
+    #
+    # Input:
+    #       -   key:      entry digest
+    #       -   restored: whether the entry is a restore
+    #                     result (the text) rather than a
+    #                     remove result (the pair)
+    #
+    # Output: the cached value, or None on a miss
+    #
+    # Task:   check memory, then the spill directory; a
+    #         spilled entry is brought back into memory
+    #
+    # ==================================================
+    def _lookup( self , key , restored ):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end( key )
+                self.counters[ 'hits' ]  +=  1
+                return self.entries[ key ][ 0 ]
+        path  =  self._spill_path( key )
+        if path is None or not os.path.exists( path ):
+            with self.lock:
+                self.counters[ 'misses' ]  +=  1
+            return None
+        with open( path , 'rb' ) as f:
+            document  =  read_container( f , verify=False )
+        value  =  restore_spaces( *document ) if restored else document
+        with self.lock:
+            self.counters[ 'disk_hits' ]  +=  1
+        self._store( key , value , document )
+        return value
+
+    # ==================================================
+    # METHOD: _store
+    # ==================================================
+    #
+    # Input:
+    #       -   key:      entry digest
+    #       -   value:    what lookups return
+    #       -   document: ( stripped , layout ) pair the
+    #                     value was made from, for spilling
+    #
+    # Task:   insert as most recently used, then evict
+    #         from the least recently used end until the
+    #         budget holds again
+    #
+    # ==================================================
+    def _store( self , key , value , document ):
+        size     =  _entry_size( value , document )
+        evicted  =  [ ]
+        with self.lock:
+            if key in self.entries:
+                return
+            if size > self.max_bytes:
+                evicted.append( ( key , document ) )
+            else:
+                self.entries[ key ]  =  ( value , document , size )
+                self.bytes          +=  size
+                while self.bytes > self.max_bytes:
+                    old , ( _ , old_document , old_size )  =  self.entries.popitem( last=False )
+                    self.bytes                             -=  old_size
+                    self.counters[ 'evictions' ]           +=  1
+                    evicted.append( ( old , old_document ) )
+        for old , old_document in evicted:
+            self._spill( old , old_document )
+
+    def _spill( self , key , document ):
+        path  =  self._spill_path( key )
+        if path is None or os.path.exists( path ):
+            return
+        temporary  =  path + '.tmp'
+        with open( temporary , 'wb' ) as f:
+            write_container( f , document[ 0 ] , document[ 1 ] )
+        os.replace( temporary , path )
+        with self.lock:
+            self.counters[ 'spills' ]  +=  1
+
+    def _spill_path( self , key ):
+        if self.spill_dir is None:
+            return None
+        return os.path.join( self.spill_dir , key + '.spl' )
+
+    # ==================================================
+    # METHOD: stats
+    # ==================================================
+    #
+    # Output: dictionary of hit/miss/eviction counters,
+    #         plus the entries and bytes held in memory
+    #
+    # ==================================================
+    def stats( self ):
+        with self.lock:
+            stats                   =  dict( self.counters )
+            stats[ 'entries' ]      =  len( self.entries )
+            stats[ 'bytes' ]        =  self.bytes
+            stats[ 'max_bytes' ]    =  self.max_bytes
+        lookups                 =  stats[ 'hits' ] + stats[ 'disk_hits' ] + stats[ 'misses' ]
+        stats[ 'hit_rate' ]     =  ( stats[ 'hits' ] + stats[ 'disk_hits' ] ) / lookups if lookups else 0.0
+        return stats
+
+    def clear( self ):
+        with self.lock:
+            self.entries.clear( )
+            self.bytes  =  0
+
+
+
+# ==================================================
+# FUNCTION: _entry_size
+# ==================================================
+#
+# Input:
+#       -   value:    the cached value
+#       -   document: ( stripped , layout ) pair kept
+#                     for spilling
+#
+# Output: approximate bytes held by the entry
+#
+# ==================================================
+def _entry_size( value , document ):
+    stripped , layout  =  document
+    size               =  sys.getsizeof( stripped ) + layout.nbytes
+    if value is not document:
+        size  +=  sys.getsizeof( value )
+    return size
@@ -0,0 +1,220 @@
+# ==================================================
+# mmap_backend.py
+# ==================================================
+#
+# Program: Space Removal and Replacement
+# Author:  Drake Young
+#
+# File Description:
+#   This file (mmap_backend.py) runs the index, remove
+#   and restore stages directly on memory-mapped
+#   files instead of decoding the whole file into a
+#   Python string first.
+#
+#   It works on raw bytes, so it assumes the space is
+#   the single byte 0x20 (true for ASCII and UTF-8).
+#   Indices are byte offsets, not character offsets.
+#
+# ==================================================
+
+
+
+# ==================================================
+# IMPORTS
+# ==================================================
+#
+#   *   mmap:         memory-mapped file access
+#   *   array:        compact storage for the indices
+#   *   basic_method: remove_spaces_fast, applied one
+#                     chunk at a time
+#   *   space_layout: SpaceLayout, the index type
+#
+# ==================================================
+import mmap
+from array import array
+
+from basic_method import remove_spaces_fast
+from space_layout import SpaceLayout, typecode_for
+
+
+
+# ==================================================
+# CONSTANTS
+# ==================================================
+#
+#   *   DEFAULT_CHUNK_SIZE: bytes handled per step;
+#                           bounds the temporary copies
+#   *   SPACE_BYTE:         the space as an integer
+#
+# ==================================================
+DEFAULT_CHUNK_SIZE  =  1 << 20
+SPACE_BYTE          =  0x20
+
+
+
+# ==================================================
+# FUNCTION: gather_buffer_from_file
+# ==================================================
+#
+# Input:  Name of file (or defaults to 'text.txt')
+#
+# Output: read-only mmap of the file's bytes (or b''
+#         for an empty file, which cannot be mapped)
+#
+# Task:   map the file instead of reading it; pages are
+#         only loaded as the later stages touch them
+#
+# ==================================================
+def gather_buffer_from_file( file='text.txt' ):
+    with open( file , 'rb' ) as f:
+        try:
+            return mmap.mmap( f.fileno( ) , 0 , access=mmap.ACCESS_READ )
+        except ValueError:                 # empty file
+            return b''
+
+
+
+# ==================================================
+# FUNCTION: get_space_indices_mmap
+# ==================================================
+#
+# Input:
+#       -   buffer:     mmap, bytes or memoryview
+#       -   chunk_size: bytes scanned per step
+#
+# Output: SpaceLayout of the byte offsets of 0x20
+#
+# Task:   scan the buffer one bounded chunk at a time,
+#         shifting each chunk's indices by its offset
+#
+# ==================================================
+def get_space_indices_mmap( buffer , chunk_size=DEFAULT_CHUNK_SIZE ):
+    positions  =  array( typecode_for( len( buffer ) ) )
+    for offset in range( 0 , len( buffer ) , chunk_size ):
+        chunk          =  bytes( buffer[ offset : offset + chunk_size ] )
+        _ , layout     =  remove_spaces_fast( chunk )
+        positions.extend( map( offset.__add__ , layout ) )
+    return SpaceLayout.from_array( positions )
+
+
+
+# ==================================================
+# FUNCTION: remove_spaces_mmap
+# ==================================================
+#
+# Input:
+#       -   buffer:      mmap, bytes or memoryview
+#       -   output_path: file to write the stripped
+#                        bytes to (created/overwritten)
+#       -   chunk_size:  bytes handled per step
+#
+# Output: SpaceLayout of the removed spaces
+#
+# Task:   count the spaces first (a C-level count per
+#         chunk), which gives the exact size of the
+#         output; then size the output file, map it, and
+#         strip each chunk once with remove_spaces_fast,
+#         writing its bytes and keeping its layout
+#
+# ==================================================
+def remove_spaces_mmap( buffer , output_path , chunk_size=DEFAULT_CHUNK_SIZE ):
+    size       =  len( buffer ) - _count_spaces( buffer , chunk_size )
+    positions  =  array( typecode_for( len( buffer ) ) )
+    with _sized_output( output_path , size ) as out:
+        written  =  0
+        for offset in range( 0 , len( buffer ) , chunk_size ):
+            chunk                                       =  bytes( buffer[ offset : offset + chunk_size ] )
+            stripped , layout                           =  remove_spaces_fast( chunk )
+            out[ written : written + len( stripped ) ]  =  stripped
+            written                                    +=  len( stripped )
+            positions.extend( map( offset.__add__ , layout ) )
+    return SpaceLayout.from_array( positions )
+
+
+
+# ==================================================
+# FUNCTION: _count_spaces
+# ==================================================
+#
+# Input:
+#       -   buffer:     mmap, bytes or memoryview
+#       -   chunk_size: bytes counted per step
+#
+# Output: number of space bytes in the buffer
+#
+# Task:   count one bounded chunk at a time, so a large
+#         mapping is never copied whole
+#
+# ==================================================
+def _count_spaces( buffer , chunk_size ):
+    return sum( bytes( buffer[ offset : offset + chunk_size ] ).count( b' ' )
+                for offset in range( 0 , len( buffer ) , chunk_size ) )
+
+
+
+# ==================================================
+# FUNCTION: restore_spaces_mmap
+# ==================================================
+#
+# Input:
+#       -   buffer:      mmap, bytes or memoryview of
+#                        the stripped bytes
+#       -   indices:     SpaceLayout (or iterable) of
+#                        the spaces to put back
+#       -   output_path: file to write the restored
+#                        bytes to (created/overwritten)
+#
+# Output: N/A (restored bytes are written to the file)
+#
+# Task:   pre-size and map the output, then copy each
+#         run of stripped bytes across through a
+#         memoryview (no intermediate copies) and set
+#         the byte at every space index to 0x20
+#
+# ==================================================
+def restore_spaces_mmap( buffer , indices , output_path ):
+    layout  =  SpaceLayout.coerce( indices )
+    size    =  len( buffer ) + len( layout )
+    with memoryview( buffer ) as view , _sized_output( output_path , size ) as out:
+        previous  =  0
+        for k , i in enumerate( layout ):
+            out[ previous + k : i ]  =  view[ previous : i - k ]
+            out[ i ]                 =  SPACE_BYTE
+            previous                 =  i - k
+        out[ previous + len( layout ) : ]  =  view[ previous : ]
+
+
+
+# ==================================================
+# CLASS: _sized_output
+# ==================================================
+#
+# Description:
+#   Context manager that creates output_path at
+#   exactly 'size' bytes and yields a writable mmap of
+#   it (or a throwaway bytearray when size is 0, since
+#   an empty file cannot be mapped).
+#
+# ==================================================
+class _sized_output( object ):
+
+    def __init__( self , output_path , size ):
+        self.output_path  =  output_path
+        self.size         =  size
+        self.file         =  None
+        self.map          =  None
+
+    def __enter__( self ):
+        self.file  =  open( self.output_path , 'w+b' )
+        self.file.truncate( self.size )
+        if self.size == 0:
+            return bytearray( )
+        self.map   =  mmap.mmap( self.file.fileno( ) , self.size , access=mmap.ACCESS_WRITE )
+        return self.map
+
+    def __exit__( self , *exc_info ):
+        if self.map is not None:
+            self.map.flush( )
+            self.map.close( )
+        self.file.close( )
+        return False
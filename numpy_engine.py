@@ -0,0 +1,207 @@
+# ==================================================
+# numpy_engine.py
+# ==================================================
+#
+# Program: Space Removal and Replacement
+# Author:  Drake Young
+#
+# File Description:
+#   This file (numpy_engine.py) mirrors the index,
+#   remove and restore functions of basic_method.py
+#   using vectorized NumPy operations:
+#       -   the text is viewed as an array of codes
+#       -   the spaces are found with one comparison
+#       -   removal is a boolean mask
+#       -   restoration scatters the stripped codes
+#           into a pre-filled output array
+#
+#   NumPy is optional. When it is not installed,
+#   every function here falls back to the equivalent
+#   routine in basic_method.py.
+#
+# ==================================================
+
+
+
+# ==================================================
+# IMPORTS
+# ==================================================
+#
+#   *   numpy:        optional; vectorized array math
+#   *   array:        converting to SpaceLayout storage
+#   *   basic_method: fallbacks when NumPy is missing
+#   *   space_layout: SpaceLayout, the index type
+#
+# ==================================================
+from array import array
+
+import basic_method
+from space_layout import SpaceLayout, typecode_for
+
+try:
+    import numpy as np
+except ImportError:                         # NumPy is optional
+    np = None
+
+HAVE_NUMPY  =  np is not None
+
+
+
+# ==================================================
+# CONSTANTS
+# ==================================================
+#
+#   *   SPACE_CODE: code point / byte value of ' '
+#
+# ==================================================
+SPACE_CODE  =  0x20
+
+
+
+# ==================================================
+# FUNCTION: _as_codes
+# ==================================================
+#
+# Input:  string, bytes, bytearray, memoryview or mmap
+#
+# Output: tuple of
+#       -   NumPy array with one element per character
+#           (uint8 for bytes and ASCII strings, uint32
+#           code points for other strings)
+#       -   function turning such an array back into
+#           the input's type
+#
+# ==================================================
+def _as_codes( text ):
+    if not isinstance( text , str ):
+        return np.frombuffer( text , dtype=np.uint8 ) , _to_bytes
+    try:
+        return np.frombuffer( text.encode( 'ascii' ) , dtype=np.uint8 ) , _to_ascii
+    except UnicodeEncodeError:
+        return np.frombuffer( text.encode( 'utf-32-le' ) , dtype='<u4' ) , _to_utf32
+
+def _to_bytes( codes ):
+    return codes.tobytes( )
+
+def _to_ascii( codes ):
+    return codes.tobytes( ).decode( 'ascii' )
+
+def _to_utf32( codes ):
+    return codes.astype( '<u4' , copy=False ).tobytes( ).decode( 'utf-32-le' )
+
+
+
+# ==================================================
+# FUNCTION: _layout_from_positions / _positions_from_layout
+# ==================================================
+#
+# Task:   convert between a NumPy index array and the
+#         array('I'/'Q') stored by SpaceLayout, going
+#         through the raw buffer rather than Python ints
+#
+# ==================================================
+def _layout_from_positions( positions , length ):
+    packed  =  array( typecode_for( length ) )
+    packed.frombytes( positions.astype( np.dtype( packed.typecode ) , copy=False ).tobytes( ) )
+    return SpaceLayout.from_array( packed )
+
+def _positions_from_layout( layout ):
+    return np.frombuffer( layout.positions , dtype=np.dtype( layout.positions.typecode ) )
+
+
+
+# ==================================================
+# FUNCTION: get_space_indices
+# ==================================================
+#
+# Input:  String (or bytes) to operate on
+#
+# Output: SpaceLayout of the indices holding ' '
+#
+# Task:   compare every code against ' ' at once and
+#         collect the indices that matched
+#
+# ==================================================
+def get_space_indices( text ):
+    if not HAVE_NUMPY:
+        return basic_method.remove_spaces_fast( text )[ 1 ]
+    codes , _  =  _as_codes( text )
+    return _layout_from_positions( np.flatnonzero( codes == SPACE_CODE ) , len( codes ) )
+
+
+
+# ==================================================
+# FUNCTION: remove_spaces
+# ==================================================
+#
+# Input:
+#       -   text:    String (or bytes) to operate on.
+#       -   indices: SpaceLayout (or any iterable) of
+#                    the indices to remove
+#
+# Output: text with all the given indices removed
+#
+# Task:   clear the given indices in a keep-mask and
+#         select the remaining codes
+#
+# ==================================================
+def remove_spaces( text , indices ):
+    if not HAVE_NUMPY:
+        return basic_method.remove_spaces( text , indices )
+    codes , convert  =  _as_codes( text )
+    keep             =  np.ones( len( codes ) , dtype=bool )
+    keep[ _positions_from_layout( SpaceLayout.coerce( indices ) ) ]  =  False
+    return convert( codes[ keep ] )
+
+
+
+# ==================================================
+# FUNCTION: remove_spaces_fast
+# ==================================================
+#
+# Input:  String (or bytes) to operate on.
+#
+# Output: tuple of ( stripped text , SpaceLayout )
+#
+# Task:   build the space mask once and use it for both
+#         the indices and the stripped text
+#
+# ==================================================
+def remove_spaces_fast( text ):
+    if not HAVE_NUMPY:
+        return basic_method.remove_spaces_fast( text )
+    codes , convert  =  _as_codes( text )
+    is_space         =  codes == SPACE_CODE
+    layout           =  _layout_from_positions( np.flatnonzero( is_space ) , len( codes ) )
+    return convert( codes[ ~is_space ] ) , layout
+
+
+
+# ==================================================
+# FUNCTION: restore_spaces
+# ==================================================
+#
+# Input:
+#       -   text:    String (or bytes) to operate on.
+#       -   indices: SpaceLayout (or any iterable) of
+#                    the indices to fill with spaces
+#
+# Output: text with spaces inserted at each of the
+#         specified indices (index represents position
+#         of the string post-insertion)
+#
+# Task:   start from an output array full of spaces and
+#         scatter the stripped codes into every slot
+#         that is not a space index
+#
+# ==================================================
+def restore_spaces( text , indices ):
+    if not HAVE_NUMPY:
+        return basic_method.restore_spaces( text , indices )
+    codes , convert  =  _as_codes( text )
+    layout           =  SpaceLayout.coerce( indices )
+    restored         =  np.full( len( codes ) + len( layout ) , SPACE_CODE , dtype=codes.dtype )
+    fill             =  np.ones( len( restored ) , dtype=bool )
+    fill[ _positions_from_layout( layout ) ]  =  False
+    restored[ fill ]  =  codes
+    return convert( restored )
@@ -0,0 +1,194 @@
+# ==================================================
+# parallel.py
+# ==================================================
+#
+# Program: Space Removal and Replacement
+# Author:  Drake Young
+#
+# File Description:
+#   This file (parallel.py) splits one large document
+#   into ranges and removes/restores the spaces of
+#   each range in a separate process, then stitches
+#   the per-range results back together.
+#
+#   The result is identical to the serial functions
+#   in basic_method.py: ranges are contiguous and in
+#   order, and each range's space indices are shifted
+#   by the range's starting offset when stitched.
+#
+# ==================================================
+
+
+
+# ==================================================
+# IMPORTS
+# ==================================================
+#
+#   *   concurrent.futures: ProcessPoolExecutor, the
+#                           worker pool
+#   *   os:                 cpu_count, the default
+#                           number of workers
+#   *   array / bisect:     stitching and splitting
+#                           the index arrays
+#   *   basic_method:       the serial routines each
+#                           worker runs on its range
+#   *   space_layout:       SpaceLayout, the index type
+#
+# ==================================================
+from concurrent.futures import ProcessPoolExecutor
+import os
+from array import array
+from bisect import bisect_left
+
+from basic_method import remove_spaces_fast, restore_spaces, space_like
+from space_layout import SpaceLayout, typecode_for
+
+
+
+# ==================================================
+# CONSTANTS
+# ==================================================
+#
+#   *   MIN_PARALLEL_SIZE: inputs shorter than this are
+#                          handled serially; shipping
+#                          them to workers costs more
+#                          than it saves
+#   *   RANGES_PER_WORKER: ranges handed to each worker,
+#                          to even out uneven ranges
+#
+# ==================================================
+MIN_PARALLEL_SIZE  =  1 << 20
+RANGES_PER_WORKER  =  4
+
+
+
+# ==================================================
+# FUNCTION: split_ranges
+# ==================================================
+#
+# Input:
+#       -   length: total length to split
+#       -   count:  number of ranges wanted
+#
+# Output: list of ( start , end ) pairs covering
+#         0..length, in order, of near-equal size
+#
+# ==================================================
+def split_ranges( length , count ):
+    if length == 0:
+        return [ ( 0 , 0 ) ]
+    count  =  max( 1 , min( count , length ) )
+    step   =  -( -length // count )
+    return [ ( start , min( start + step , length ) ) for start in range( 0 , length , step ) ]
+
+
+
+# ==================================================
+# FUNCTION: _remove_range / _restore_range
+# ==================================================
+#
+# Task:   the work done in each worker process; kept at
+#         module level so they can be pickled
+#
+# ==================================================
+def _remove_range( chunk ):
+    stripped , layout  =  remove_spaces_fast( chunk )
+    return stripped , layout.positions
+
+def _restore_range( job ):
+    chunk , positions , start  =  job
+    local                      =  array( typecode_for( len( chunk ) + len( positions ) ) ,
+                                         map( ( -start ).__add__ , positions ) )
+    return restore_spaces( chunk , SpaceLayout.from_array( local ) )
+
+
+
+# ==================================================
+# FUNCTION: remove_spaces_parallel
+# ==================================================
+#
+# Input:
+#       -   text:     String (or bytes) to operate on.
+#       -   workers:  number of processes (defaults to
+#                     the number of CPUs)
+#       -   executor: optional existing executor to
+#                     reuse instead of starting a pool
+#
+# Output: tuple of ( stripped text , SpaceLayout ),
+#         the same as basic_method.remove_spaces_fast
+#
+# Task:   strip each range in a worker, then join the
+#         stripped pieces and shift each range's indices
+#         by its starting offset
+#
+# ==================================================
+def remove_spaces_parallel( text , workers=None , executor=None ):
+    workers  =  workers or os.cpu_count( ) or 1
+    if len( text ) < MIN_PARALLEL_SIZE or ( workers == 1 and executor is None ):
+        return remove_spaces_fast( text )
+    ranges   =  split_ranges( len( text ) , workers * RANGES_PER_WORKER )
+    chunks   =  ( text[ start : end ] for start , end in ranges )
+    results  =  _map( _remove_range , chunks , workers , executor )
+
+    pieces     =  [ ]
+    positions  =  array( typecode_for( len( text ) ) )
+    for ( start , _ ) , ( stripped , local ) in zip( ranges , results ):
+        pieces.append( stripped )
+        positions.extend( map( start.__add__ , local ) )
+    return space_like( text )[ : 0 ].join( pieces ) , SpaceLayout.from_array( positions )
+
+
+
+# ==================================================
+# FUNCTION: restore_spaces_parallel
+# ==================================================
+#
+# Input:
+#       -   text:     String (or bytes) to operate on.
+#       -   indices:  SpaceLayout (or any iterable) of
+#                     the indices to fill with spaces
+#       -   workers:  number of processes (defaults to
+#                     the number of CPUs)
+#       -   executor: optional existing executor to
+#                     reuse instead of starting a pool
+#
+# Output: the restored text, the same as
+#         basic_method.restore_spaces
+#
+# Task:   split the *restored* text into ranges; for a
+#         range [start, end) the spaces it holds are the
+#         indices between start and end, and its
+#         stripped text begins at start minus the number
+#         of spaces before start (likewise for end)
+#
+# ==================================================
+def restore_spaces_parallel( text , indices , workers=None , executor=None ):
+    layout   =  SpaceLayout.coerce( indices )
+    total    =  len( text ) + len( layout )
+    workers  =  workers or os.cpu_count( ) or 1
+    if total < MIN_PARALLEL_SIZE or ( workers == 1 and executor is None ):
+        return restore_spaces( text , layout )
+    positions  =  layout.positions
+    jobs       =  [ ]
+    for start , end in split_ranges( total , workers * RANGES_PER_WORKER ):
+        first  =  bisect_left( positions , start )
+        last   =  bisect_left( positions , end )
+        jobs.append( ( text[ start - first : end - last ] , positions[ first : last ] , start ) )
+    results  =  _map( _restore_range , jobs , workers , executor )
+    return space_like( text )[ : 0 ].join( results )
+
+
+
+# ==================================================
+# FUNCTION: _map
+# ==================================================
+#
+# Task:   run func over items in order, on the given
+#         executor or on a pool started for this call
+#
+# ==================================================
+def _map( func , items , workers , executor ):
+    if executor is not None:
+        return list( executor.map( func , items ) )
+    with ProcessPoolExecutor( max_workers=workers ) as pool:
+        return list( pool.map( func , items ) )
@@ -0,0 +1,204 @@
+# ==================================================
+# restored_text.py
+# ==================================================
+#
+# Program: Space Removal and Replacement
+# Author:  Drake Young
+#
+# File Description:
+#   This file (restored_text.py) holds RestoredText: a
+#   read-only view of the restored text, made from the
+#   stripped text and its SpaceLayout, that never
+#   builds the whole restored string unless asked to.
+#
+#   Creating a view is O(1). len( ) is O(1); indexing
+#   and slicing use SpaceLayout.rank (a binary search)
+#   to find the matching stripped text and restore only
+#   the requested range. Iterating, comparing and
+#   writing to a file go through chunks( ), so at most
+#   one chunk of restored text exists at a time.
+#
+# ==================================================
+
+
+
+# ==================================================
+# IMPORTS
+# ==================================================
+#
+#   *   itertools:    chain, for character iteration
+#   *   basic_method: restore_range for each range,
+#                     restore_spaces for the whole text,
+#                     space_like for single spaces
+#   *   space_layout: SpaceLayout, the layout type
+#
+# ==================================================
+from itertools import chain
+
+from basic_method import restore_range, restore_spaces, space_like
+from space_layout import SpaceLayout
+
+
+
+# ==================================================
+# CONSTANTS
+# ==================================================
+#
+#   *   DEFAULT_CHUNK_SIZE: characters (or bytes) per
+#                           chunk when iterating or
+#                           writing
+#
+# ==================================================
+DEFAULT_CHUNK_SIZE  =  1 << 16
+
+
+
+# ==================================================
+# CLASS: RestoredText
+# ==================================================
+#
+# Description:
+#   Lazy restored text. Behaves like the str (or
+#   bytes) restore_spaces would return for len( ),
+#   indexing, slicing, iteration and ==; use str( )
+#   (or bytes( ) for a bytes-backed view) to get the
+#   real thing.
+#
+# ==================================================
+class RestoredText( object ):
+    __slots__  =  ( 'stripped' , 'layout' )
+
+    # ==================================================
+    # METHOD: __init__
+    # ==================================================
+    #
+    # Input:
+    #       -   stripped: text without its spaces
+    #       -   layout:   SpaceLayout of the space
+    #                     positions (other iterables are
+    #                     converted)
+    #
+    # ==================================================
+    def __init__( self , stripped , layout ):
+        self.stripped  =  stripped
+        self.layout    =  SpaceLayout.coerce( layout )
+
+    def __len__( self ):
+        return len( self.stripped ) + len( self.layout )
+
+    # ==================================================
+    # METHOD: __getitem__
+    # ==================================================
+    #
+    # Input:  index or slice into the restored text
+    #
+    # Output: the character (or byte value), or the
+    #         restored str/bytes of the slice
+    #
+    # Notes:
+    #       -   a contiguous slice costs two binary
+    #           searches plus the size of the slice
+    #       -   stepped slices restore the covering range
+    #           first, then step through it
+    #
+    # ==================================================
+    def __getitem__( self , key ):
+        if isinstance( key , slice ):
+            start , stop , step  =  key.indices( len( self ) )
+            if step == 1:
+                return self._range( start , stop )
+            low , high  =  ( start , stop ) if step > 0 else ( stop + 1 , start + 1 )
+            end         =  stop - low if stop >= low else None
+            return self._range( low , high )[ start - low : end : step ]
+        if key < 0:
+            key  +=  len( self )
+        if not 0 <= key < len( self ):
+            raise IndexError( 'RestoredText index out of range' )
+        if key in self.layout:
+            return space_like( self.stripped )[ 0 ]
+        return self.stripped[ key - self.layout.rank( key ) ]
+
+    def _range( self , start , stop ):
+        return restore_range( self.stripped , self.layout , start , stop )
+
+    # ==================================================
+    # METHOD: chunks
+    # ==================================================
+    #
+    # Input:  chunk_size, characters (or bytes) per chunk
+    #
+    # Output: generator of consecutive restored chunks
+    #
+    # ==================================================
+    def chunks( self , chunk_size=DEFAULT_CHUNK_SIZE ):
+        for start in range( 0 , len( self ) , chunk_size ):
+            yield self._range( start , start + chunk_size )
+
+    def __iter__( self ):
+        return chain.from_iterable( self.chunks( ) )
+
+    # ==================================================
+    # METHOD: write_to
+    # ==================================================
+    #
+    # Input:
+    #       -   fileobj:    file to write the text to
+    #       -   chunk_size: characters (or bytes) per write
+    #
+    # Output: number of characters (or bytes) written
+    #
+    # ==================================================
+    def write_to( self , fileobj , chunk_size=DEFAULT_CHUNK_SIZE ):
+        for chunk in self.chunks( chunk_size ):
+            fileobj.write( chunk )
+        return len( self )
+
+    # ==================================================
+    # METHOD: materialize
+    # ==================================================
+    #
+    # Output: the whole restored str (or bytes); this is
+    #         the only method that builds it in one piece
+    #
+    # ==================================================
+    def materialize( self ):
+        return restore_spaces( self.stripped , self.layout )
+
+    def __str__( self ):
+        if not isinstance( self.stripped , str ):
+            raise TypeError( 'RestoredText of bytes: use bytes( ) rather than str( )' )
+        return self.materialize( )
+
+    def __bytes__( self ):
+        return bytes( self.materialize( ) )
+
+    # ==================================================
+    # METHOD: __eq__
+    # ==================================================
+    #
+    # Task:   compare chunk by chunk against another view
+    #         or a plain str/bytes, stopping at the first
+    #         difference
+    #
+    # ==================================================
+    def __eq__( self , other ):
+        if isinstance( other , RestoredText ):
+            if len( other ) != len( self ):
+                return False
+            return all( a == b for a , b in zip( self.chunks( ) , other.chunks( ) ) )
+        if isinstance( other , type( self.stripped ) ):
+            if len( other ) != len( self ):
+                return False
+            size  =  DEFAULT_CHUNK_SIZE
+            return all( chunk == other[ i * size : ( i + 1 ) * size ]
+                        for i , chunk in enumerate( self.chunks( size ) ) )
+        return NotImplemented
+
+    def __ne__( self , other ):
+        result  =  self.__eq__( other )
+        return result if result is NotImplemented else not result
+
+    __hash__  =  None
+
+    def __repr__( self ):
+        return 'RestoredText(%d characters, %d spaces)' % ( len( self ) , len( self.layout ) )
@@ -0,0 +1,309 @@
+# ==================================================
+# rwoadl_parallel.py
+# ==================================================
+#
+# Program: Space Removal and Replacement
+# Author:  Drake Young
+#
+# File Description:
+#   This file (rwoadl_parallel.py) runs several seeded
+#   "Random Walk on a Discrete Line" walkers (see
+#   RWOADL_initial.py) at once, in separate processes.
+#
+#   Two modes are offered:
+#       -   segment mode: the text is cut into disjoint
+#           segments, one walker solves each segment, and
+#           the segment results are joined in order
+#       -   race mode: every walker solves the whole
+#           text with its own seed; the first one to
+#           converge wins and the rest are terminated
+#
+#   Walker i always gets seed + i, so a run with the
+#   same seed and walker count repeats exactly.
+#
+# ==================================================
+
+
+
+# ==================================================
+# IMPORTS
+# ==================================================
+#
+#   *   concurrent.futures: ProcessPoolExecutor for
+#                           segment mode
+#   *   multiprocessing:    Pool for race mode (its
+#                           terminate( ) stops walkers
+#                           that are still running)
+#   *   os:                 cpu_count, the default
+#                           number of walkers
+#   *   random:             seeding each walker
+#   *   timeit:             default_timer, for main( )
+#   *   RWOADL_initial:     the walk itself
+#
+# ==================================================
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import random
+from timeit import default_timer
+
+import RWOADL_initial
+
+
+
+# ==================================================
+# FUNCTION: segment_bounds
+# ==================================================
+#
+# Input:
+#       -   text:  original text
+#       -   count: number of segments wanted
+#
+# Output: list of ( start , end ) pairs covering the
+#         text in order
+#
+# Task:   cut near equal-size points, moving each cut
+#         forward until it falls between two non-space
+#         characters. The walk cannot restore a space at
+#         the very start or end of its text, so no
+#         segment may begin or end with one unless the
+#         whole text does.
+#
+# ==================================================
+def segment_bounds( text , count ):
+    count   =  max( 1 , min( count , len( text ) ) )
+    step    =  -( -len( text ) // count ) if text else 0
+    bounds  =  [ ]
+    start   =  0
+    for target in range( step , len( text ) , step or 1 ):
+        cut  =  max( target , start + 1 )
+        while cut < len( text ) and ( text[ cut - 1 ] == ' ' or text[ cut ] == ' ' ):
+            cut  +=  1
+        if cut >= len( text ):
+            break
+        bounds.append( ( start , cut ) )
+        start  =  cut
+    bounds.append( ( start , len( text ) ) )
+    return bounds
+
+
+
+# ==================================================
+# FUNCTION: _walk
+# ==================================================
+#
+# Input:  job tuple of ( mode , seed , original ,
+#         removal , population_size )
+#
+# Output: the walker's result text
+#
+# Task:   the work done in each worker process; kept at
+#         module level so it can be pickled. A segment
+#         with no spaces is already its own result, and
+#         is returned without a walk (the walk needs at
+#         least two characters to mutate).
+#
+# ==================================================
+def _walk( job ):
+    mode , seed , original , removal , population_size  =  job
+    if ' ' not in original:
+        return original
+    random.seed( seed )
+    if mode == 'remove':
+        return RWOADL_initial.remove_spaces_compact( original , population_size )
+    return RWOADL_initial.restore_spaces_compact( original , removal , population_size )
+
+
+
+# ==================================================
+# FUNCTION: remove_spaces_segmented
+# ==================================================
+#
+# Input:
+#       -   original_string: string to remove spaces from
+#       -   walkers:         number of segments/processes
+#                            (defaults to the number of CPUs)
+#       -   population_size: candidates per generation
+#       -   seed:            base seed
+#       -   executor:        optional existing executor
+#
+# Output: original_string with all spaces removed
+#
+# ==================================================
+def remove_spaces_segmented( original_string , walkers=None , population_size=5 , seed=0 ,
+                             executor=None ):
+    walkers  =  walkers or os.cpu_count( ) or 1
+    jobs     =  [ ( 'remove' , seed + i , original_string[ start : end ] , None , population_size )
+                  for i , ( start , end ) in enumerate( segment_bounds( original_string , walkers ) ) ]
+    return ''.join( _map( jobs , walkers , executor ) )
+
+
+
+# ==================================================
+# FUNCTION: restore_spaces_segmented
+# ==================================================
+#
+# Input:
+#       -   original_string: original string before spaces were removed
+#       -   removal:         the string with its spaces removed
+#       -   walkers:         number of segments/processes
+#                            (defaults to the number of CPUs)
+#       -   population_size: candidates per generation
+#       -   seed:            base seed
+#       -   executor:        optional existing executor
+#
+# Output: removal with all spaces restored
+#
+# Task:   cut the original into segments, and cut the
+#         removal at the matching points (each original
+#         segment, stripped, is one removal segment)
+#
+# ==================================================
+def restore_spaces_segmented( original_string , removal , walkers=None , population_size=5 ,
+                              seed=0 , executor=None ):
+    walkers   =  walkers or os.cpu_count( ) or 1
+    jobs      =  [ ]
+    position  =  0
+    for i , ( start , end ) in enumerate( segment_bounds( original_string , walkers ) ):
+        segment    =  original_string[ start : end ]
+        length     =  len( segment ) - segment.count( ' ' )
+        jobs.append( ( 'restore' , seed + i , segment , removal[ position : position + length ] ,
+                       population_size ) )
+        position  +=  length
+    return ''.join( _map( jobs , walkers , executor ) )
+
+
+
+# ==================================================
+# FUNCTION: _map
+# ==================================================
+#
+# Task:   run the walker jobs in order, on the given
+#         executor or on a pool started for this call
+#
+# ==================================================
+def _map( jobs , walkers , executor ):
+    if len( jobs ) == 1 and executor is None:
+        return [ _walk( jobs[ 0 ] ) ]
+    if executor is not None:
+        return list( executor.map( _walk , jobs ) )
+    with ProcessPoolExecutor( max_workers=walkers ) as pool:
+        return list( pool.map( _walk , jobs ) )
+
+
+
+# ==================================================
+# FUNCTION: _race
+# ==================================================
+#
+# Input:
+#       -   jobs:      one job per walker
+#       -   converged: function telling whether a result
+#                      is a solution
+#
+# Output: the first converged result, or (if no walker
+#         converged before its generation cap) the
+#         result of the lowest-seeded walker
+#
+# Task:   collect results as they finish; leaving the
+#         'with' block terminates the walkers still
+#         running
+#
+# ==================================================
+def _race( jobs , converged ):
+    results  =  { }
+    with multiprocessing.Pool( processes=len( jobs ) ) as pool:
+        for seed , result in pool.imap_unordered( _seeded_walk , jobs ):
+            if converged( result ):
+                return result
+            results[ seed ]  =  result
+    return results[ min( results ) ]
+
+
+
+# ==================================================
+# FUNCTION: _seeded_walk
+# ==================================================
+#
+# Input:  job tuple (see _walk)
+#
+# Output: tuple of ( the walker's seed , its result ),
+#         so results arriving out of order can still be
+#         told apart by seed
+#
+# ==================================================
+def _seeded_walk( job ):
+    return job[ 1 ] , _walk( job )
+
+
+
+# ==================================================
+# FUNCTION: race_remove_spaces / race_restore_spaces
+# ==================================================
+#
+# Input:
+#       -   original_string: the original text
+#       -   removal:         (restore only) the stripped text
+#       -   walkers:         number of competing walkers
+#                            (defaults to the number of CPUs)
+#       -   population_size: candidates per generation
+#       -   seed:            base seed
+#
+# Output: the result of the first walker to converge
+#
+# ==================================================
+def race_remove_spaces( original_string , walkers=None , population_size=5 , seed=0 ):
+    walkers  =  walkers or os.cpu_count( ) or 1
+    jobs     =  [ ( 'remove' , seed + i , original_string , None , population_size )
+                  for i in range( walkers ) ]
+    return _race( jobs , lambda result : ' ' not in result )
+
+def race_restore_spaces( original_string , removal , walkers=None , population_size=5 , seed=0 ):
+    walkers  =  walkers or os.cpu_count( ) or 1
+    jobs     =  [ ( 'restore' , seed + i , original_string , removal , population_size )
+                  for i in range( walkers ) ]
+    return _race( jobs , lambda result : result == original_string )
+
+
+
+# ==================================================
+# FUNCTION: main
+# ==================================================
+#
+# Input:  N/A
+#
+# Output: N/A
+#
+# Task:   Act as the main driver of the program,
+#         showcasing segment mode on sentence.txt
+#
+# ==================================================
+def main():
+    original_string  =  RWOADL_initial.gather_text_from_file( 'sentence.txt' )
+    walkers          =  os.cpu_count( ) or 1
+    print( 'Segments: %s' % segment_bounds( original_string , walkers ) )
+
+    # Time to Remove Spaces
+    start            =  default_timer( )
+    spaces_removed   =  remove_spaces_segmented( original_string , walkers , population_size=200 )
+    end              =  default_timer( )
+    print( 'Removing Spaces: %.3f ms' % ( ( end - start ) * 1000 ) )
+
+    # Time to Restore Spaces
+    start            =  default_timer( )
+    spaces_restored  =  restore_spaces_segmented( original_string , spaces_removed , walkers ,
+                                                  population_size=200 )
+    end              =  default_timer( )
+    print( 'Restoring Spaces: %.3f ms' % ( ( end - start ) * 1000 ) )
+
+    # Print the Results nice and "pretty"
+    RWOADL_initial.print_pretty( 'Original Text:'   , original_string )
+    RWOADL_initial.print_pretty( 'Spaces Removed:'  , spaces_removed  )
+    RWOADL_initial.print_pretty( 'Spaces Restored:' , spaces_restored )
+    return
+
+
+
+# Only perform program operations if this file if it's the main file
+if __name__ == '__main__':
+    main( )
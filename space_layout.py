@@ -0,0 +1,392 @@
+# ==================================================
+# space_layout.py
+# ==================================================
+#
+# Program: Space Removal and Replacement
+# Author:  Drake Young
+#
+# File Description:
+#   This file (space_layout.py) holds the SpaceLayout
+#   type: a compact record of where the spaces (' ')
+#   sat in the original text. SeparatorLayout extends
+#   the idea to several separator characters.
+#
+#   The positions are kept as a sorted array of
+#   unsigned machine integers (4 bytes each for any
+#   text under 4 GiB) rather than a set of Python
+#   ints (roughly 50-70 bytes each), and because they
+#   are sorted they can be walked in order and
+#   searched with a binary search.
+#
+# ==================================================
+
+
+
+# ==================================================
+# IMPORTS
+# ==================================================
+#
+#   *   array:  compact storage of the positions
+#   *   bisect: binary search for membership tests
+#               and rank queries
+#   *   struct: packing the serialization header
+#   *   sys:    byte order of the running machine
+#
+# ==================================================
+from array import array
+from bisect import bisect_left
+import struct
+import sys
+
+
+
+# ==================================================
+# CONSTANTS
+# ==================================================
+#
+#   *   LAYOUT_MAGIC:  first bytes of a serialized
+#                      layout
+#   *   HEADER_FORMAT: magic, typecode, count
+#   *   SEPARATOR_*:   the same for SeparatorLayout,
+#                      plus is-text flag and alphabet
+#                      size
+#
+# ==================================================
+LAYOUT_MAGIC             =  b'SPL1'
+HEADER_FORMAT            =  '<4scQ'
+HEADER_SIZE              =  struct.calcsize( HEADER_FORMAT )
+SEPARATOR_MAGIC          =  b'SEP1'
+SEPARATOR_HEADER_FORMAT  =  '<4s?cIQ'
+SEPARATOR_HEADER_SIZE    =  struct.calcsize( SEPARATOR_HEADER_FORMAT )
+
+
+
+# ==================================================
+# FUNCTION: typecode_for
+# ==================================================
+#
+# Input:  length of the text the positions index into
+#
+# Output: array typecode wide enough to hold every
+#         position in a text of that length
+#
+# Task:   prefer 4-byte 'I' and only widen to 8-byte
+#         'Q' for texts that need it
+#
+# ==================================================
+def typecode_for( length ):
+    if length < 2 ** ( 8 * array( 'I' ).itemsize ):
+        return 'I'
+    return 'Q'
+
+
+
+# ==================================================
+# CLASS: SpaceLayout
+# ==================================================
+#
+# Description:
+#   Sorted, duplicate-free sequence of the indices
+#   that held a space in the original text. Supports
+#   len(), iteration, 'in', indexing/slicing,
+#   rank/select queries and conversion to/from bytes.
+#
+# ==================================================
+class SpaceLayout( object ):
+    __slots__  =  ( 'positions' , )
+
+    # ==================================================
+    # METHOD: __init__
+    # ==================================================
+    #
+    # Input:  any iterable of non-negative indices, in
+    #         any order
+    #
+    # Task:   sort the indices and pack them into an
+    #         array of the narrowest suitable type
+    #
+    # ==================================================
+    def __init__( self , positions=( ) ):
+        ordered         =  sorted( set( positions ) )
+        largest         =  ordered[ -1 ] if ordered else 0
+        self.positions  =  array( typecode_for( largest ) , ordered )
+
+    # ==================================================
+    # METHOD: from_array (classmethod)
+    # ==================================================
+    #
+    # Input:  array of indices already in ascending order
+    #
+    # Output: SpaceLayout wrapping that array as-is
+    #
+    # Task:   skip the sort/copy done by __init__ for
+    #         callers that produced the indices in order
+    #
+    # ==================================================
+    @classmethod
+    def from_array( cls , positions ):
+        layout            =  cls.__new__( cls )
+        layout.positions  =  positions
+        return layout
+
+    # ==================================================
+    # METHOD: coerce (classmethod)
+    # ==================================================
+    #
+    # Input:  a SpaceLayout or any iterable of indices
+    #         (e.g. the set older code passed around)
+    #
+    # Output: a SpaceLayout
+    #
+    # ==================================================
+    @classmethod
+    def coerce( cls , indices ):
+        if isinstance( indices , cls ):
+            return indices
+        return cls( indices )
+
+    def __len__( self ):
+        return len( self.positions )
+
+    def __iter__( self ):
+        return iter( self.positions )
+
+    def __contains__( self , index ):
+        i  =  bisect_left( self.positions , index )
+        return i < len( self.positions ) and self.positions[ i ] == index
+
+    def __getitem__( self , key ):
+        if isinstance( key , slice ):
+            return SpaceLayout.from_array( self.positions[ key ] )
+        return self.positions[ key ]
+
+    def __eq__( self , other ):
+        if not isinstance( other , SpaceLayout ):
+            return NotImplemented
+        return self.positions == other.positions
+
+    def __ne__( self , other ):
+        result  =  self.__eq__( other )
+        return result if result is NotImplemented else not result
+
+    __hash__  =  None
+
+    def __repr__( self ):
+        return 'SpaceLayout(%r)' % ( self.positions.tolist( ) , )
+
+    # ==================================================
+    # METHOD: rank
+    # ==================================================
+    #
+    # Input:  index into the original text
+    #
+    # Output: number of spaces before that index
+    #
+    # Notes:
+    #       -   the positions are sorted, so this is a
+    #           binary search: O(log n)
+    #       -   index - rank( index ) is where the
+    #           original index lands in the stripped text
+    #
+    # ==================================================
+    def rank( self , index ):
+        return bisect_left( self.positions , index )
+
+    # ==================================================
+    # METHOD: select
+    # ==================================================
+    #
+    # Input:  k, counting from 0
+    #
+    # Output: index of the k-th space in the original
+    #         text, O(1)
+    #
+    # ==================================================
+    def select( self , k ):
+        return self.positions[ k ]
+
+    # ==================================================
+    # PROPERTY: nbytes
+    # ==================================================
+    #
+    # Output: number of bytes used by the packed positions
+    #
+    # ==================================================
+    @property
+    def nbytes( self ):
+        return len( self.positions ) * self.positions.itemsize
+
+    # ==================================================
+    # METHOD: to_bytes
+    # ==================================================
+    #
+    # Output: bytes holding a small header (magic,
+    #         typecode, count) followed by the positions
+    #         in little-endian order
+    #
+    # ==================================================
+    def to_bytes( self ):
+        body  =  self.positions
+        if sys.byteorder != 'little':
+            body  =  array( body.typecode , body )
+            body.byteswap( )
+        header  =  struct.pack( HEADER_FORMAT , LAYOUT_MAGIC ,
+                                body.typecode.encode( 'ascii' ) , len( body ) )
+        return header + body.tobytes( )
+
+    # ==================================================
+    # METHOD: from_bytes (classmethod)
+    # ==================================================
+    #
+    # Input:  bytes produced by to_bytes
+    #
+    # Output: the SpaceLayout they describe
+    #
+    # ==================================================
+    @classmethod
+    def from_bytes( cls , data ):
+        magic , typecode , count  =  struct.unpack_from( HEADER_FORMAT , data )
+        if magic != LAYOUT_MAGIC:
+            raise ValueError( 'not a serialized SpaceLayout' )
+        positions  =  array( typecode.decode( 'ascii' ) )
+        end        =  HEADER_SIZE + count * positions.itemsize
+        if len( data ) < end:
+            raise ValueError( 'truncated SpaceLayout' )
+        positions.frombytes( data[ HEADER_SIZE : end ] )
+        if sys.byteorder != 'little':
+            positions.byteswap( )
+        return cls.from_array( positions )
+
+
+
+# ==================================================
+# CLASS: SeparatorLayout
+# ==================================================
+#
+# Description:
+#   Like SpaceLayout, but for text where more than one
+#   separator character was removed (spaces, tabs,
+#   non-breaking spaces, ...). Alongside the sorted
+#   positions it keeps one small symbol per position:
+#   the separator's index in 'alphabet'.
+#
+#   Iterating yields ( position , separator ) pairs.
+#
+# ==================================================
+class SeparatorLayout( object ):
+    __slots__  =  ( 'positions' , 'symbols' , 'alphabet' )
+
+    # ==================================================
+    # METHOD: __init__
+    # ==================================================
+    #
+    # Input:
+    #       -   positions: SpaceLayout of the separator
+    #                      indices
+    #       -   symbols:   array with one alphabet index
+    #                      per position, in the same order
+    #       -   alphabet:  str (or bytes) of the separator
+    #                      characters
+    #
+    # ==================================================
+    def __init__( self , positions , symbols , alphabet ):
+        if len( positions ) != len( symbols ):
+            raise ValueError( 'positions and symbols differ in length' )
+        self.positions  =  positions
+        self.symbols    =  symbols
+        self.alphabet   =  alphabet
+
+    # ==================================================
+    # METHOD: separators
+    # ==================================================
+    #
+    # Output: tuple of the separators, indexable by symbol
+    #         (one-character strs, or one-byte bytes)
+    #
+    # ==================================================
+    def separators( self ):
+        return tuple( self.alphabet[ i : i + 1 ] for i in range( len( self.alphabet ) ) )
+
+    def __len__( self ):
+        return len( self.positions )
+
+    def __iter__( self ):
+        return zip( self.positions , map( self.separators( ).__getitem__ , self.symbols ) )
+
+    def __eq__( self , other ):
+        if not isinstance( other , SeparatorLayout ):
+            return NotImplemented
+        return list( self ) == list( other )
+
+    def __ne__( self , other ):
+        result  =  self.__eq__( other )
+        return result if result is NotImplemented else not result
+
+    __hash__  =  None
+
+    def __repr__( self ):
+        return 'SeparatorLayout(%r)' % ( list( self ) , )
+
+    # ==================================================
+    # PROPERTY: nbytes
+    # ==================================================
+    #
+    # Output: number of bytes used by positions + symbols
+    #
+    # ==================================================
+    @property
+    def nbytes( self ):
+        return self.positions.nbytes + len( self.symbols ) * self.symbols.itemsize
+
+    # ==================================================
+    # METHOD: to_bytes / from_bytes (classmethod)
+    # ==================================================
+    #
+    # Format: SEPARATOR_HEADER_FORMAT (magic, is-text
+    #         flag, symbol typecode, alphabet byte length,
+    #         count), the alphabet (UTF-8 if text), the
+    #         symbols, then the positions as
+    #         SpaceLayout.to_bytes
+    #
+    # ==================================================
+    def to_bytes( self ):
+        is_text   =  isinstance( self.alphabet , str )
+        alphabet  =  self.alphabet.encode( 'utf-8' ) if is_text else bytes( self.alphabet )
+        symbols   =  self.symbols
+        if sys.byteorder != 'little':
+            symbols  =  array( symbols.typecode , symbols )
+            symbols.byteswap( )
+        header    =  struct.pack( SEPARATOR_HEADER_FORMAT , SEPARATOR_MAGIC , is_text ,
+                                  symbols.typecode.encode( 'ascii' ) , len( alphabet ) ,
+                                  len( symbols ) )
+        return header + alphabet + symbols.tobytes( ) + self.positions.to_bytes( )
+
+    @classmethod
+    def from_bytes( cls , data ):
+        magic , is_text , typecode , size , count  =  struct.unpack_from( SEPARATOR_HEADER_FORMAT ,
+                                                                           data )
+        if magic != SEPARATOR_MAGIC:
+            raise ValueError( 'not a serialized SeparatorLayout' )
+        offset     =  SEPARATOR_HEADER_SIZE
+        alphabet   =  bytes( data[ offset : offset + size ] )
+        offset    +=  size
+        symbols    =  array( typecode.decode( 'ascii' ) )
+        symbols.frombytes( data[ offset : offset + count * symbols.itemsize ] )
+        if sys.byteorder != 'little':
+            symbols.byteswap( )
+        positions  =  SpaceLayout.from_bytes( data[ offset + count * symbols.itemsize : ] )
+        return cls( positions , symbols , alphabet.decode( 'utf-8' ) if is_text else alphabet )
+
+
+
+# ==================================================
+# FUNCTION: symbol_typecode_for
+# ==================================================
+#
+# Input:  number of distinct separators
+#
+# Output: narrowest array typecode for their indices
+#
+# ==================================================
+def symbol_typecode_for( size ):
+    return 'B' if size <= 0x100 else 'H'
@@ -0,0 +1,277 @@
+# ==================================================
+# streaming.py
+# ==================================================
+#
+# Program: Space Removal and Replacement
+# Author:  Drake Young
+#
+# File Description:
+#   This file (streaming.py) removes/restores spaces
+#   chunk by chunk, so files far larger than memory
+#   can be processed with a fixed memory footprint.
+#
+#   Space positions are always global (indices into
+#   the whole original text, not into one chunk).
+#   They are handed out one array per chunk and can
+#   be written to a layout file as they arrive: the
+#   layout file is simply every position as a
+#   little-endian unsigned 64-bit integer.
+#
+# ==================================================
+
+
+
+# ==================================================
+# IMPORTS
+# ==================================================
+#
+#   *   array:        per-chunk position arrays
+#   *   itertools:    chain, for walking the position
+#                     arrays as one sequence
+#   *   sys:          byte order of the running machine
+#   *   basic_method: the in-memory remove/restore
+#                     routines applied to each chunk
+#
+# ==================================================
+from array import array
+from itertools import chain
+import sys
+
+from basic_method import remove_spaces_fast, restore_spaces, space_like
+
+
+
+# ==================================================
+# CONSTANTS
+# ==================================================
+#
+#   *   DEFAULT_CHUNK_SIZE: characters (or bytes) read
+#                           per chunk
+#   *   POSITION_TYPECODE:  array type of the global
+#                           positions and layout file
+#
+# ==================================================
+DEFAULT_CHUNK_SIZE  =  1 << 16
+POSITION_TYPECODE   =  'Q'
+
+
+
+# ==================================================
+# FUNCTION: remove_spaces_stream
+# ==================================================
+#
+# Input:
+#       -   fileobj:    text or binary file to read
+#       -   chunk_size: characters (or bytes) per read
+#
+# Output: generator of ( stripped_chunk , positions )
+#         pairs, where positions is an array of the
+#         global indices of the spaces removed from
+#         that chunk
+#
+# Task:   read one chunk at a time, strip it, and shift
+#         its space positions by the number of
+#         characters read before it
+#
+# ==================================================
+def remove_spaces_stream( fileobj , chunk_size=DEFAULT_CHUNK_SIZE ):
+    offset  =  0
+    while True:
+        chunk  =  fileobj.read( chunk_size )
+        if not chunk:
+            return
+        stripped , layout  =  remove_spaces_fast( chunk )
+        positions          =  array( POSITION_TYPECODE , map( offset.__add__ , layout ) )
+        offset            +=  len( chunk )
+        yield stripped , positions
+
+
+
+# ==================================================
+# FUNCTION: restore_spaces_stream
+# ==================================================
+#
+# Input:
+#       -   fileobj:    text or binary file holding the
+#                       stripped text
+#       -   positions:  iterable of position arrays (or
+#                       of plain indices) in ascending
+#                       order, e.g. read_layout_stream( )
+#       -   chunk_size: characters (or bytes) per read
+#
+# Output: generator of restored chunks
+#
+# ==================================================
+def restore_spaces_stream( fileobj , positions , chunk_size=DEFAULT_CHUNK_SIZE ):
+    for chunk , local in restore_chunks( fileobj , positions , chunk_size ):
+        yield restore_spaces( chunk , local )
+
+
+
+# ==================================================
+# FUNCTION: restore_chunks
+# ==================================================
+#
+# Input:  same as restore_spaces_stream
+#
+# Output: generator of ( chunk , local ) pairs, where
+#         restore_spaces( chunk , local ) is the next
+#         piece of restored text
+#
+# Task:   for every chunk of stripped text, work out the
+#         spaces that belong before each of its
+#         characters (as indices into the restored
+#         chunk), then give any spaces that trail the
+#         end of the text as a final chunk of their own
+#
+# Notes:
+#       -   the k-th space (counting from 0) at global
+#           index p comes right before stripped
+#           character p - k
+#       -   only one chunk plus one pending position is
+#           held at a time
+#       -   the pairs are independent of one another, so
+#           callers may restore them in parallel
+#
+# ==================================================
+def restore_chunks( fileobj , positions , chunk_size=DEFAULT_CHUNK_SIZE ):
+    pending   =  _flatten( positions )
+    upcoming  =  next( pending , None )
+    emitted   =  0                        # spaces emitted so far
+    consumed  =  0                        # stripped characters read so far
+    chunk     =  None
+    while True:
+        chunk  =  fileobj.read( chunk_size )
+        if not chunk:
+            break
+        out_start  =  consumed + emitted
+        consumed  +=  len( chunk )
+        local      =  [ ]
+        while upcoming is not None and upcoming - emitted < consumed:
+            local.append( upcoming - out_start )
+            emitted   +=  1
+            upcoming   =  next( pending , None )
+        yield chunk , local
+    trailing  =  0
+    while upcoming is not None:
+        if upcoming - emitted != consumed:
+            raise ValueError( 'layout does not match the stripped text' )
+        trailing  +=  1
+        emitted   +=  1
+        upcoming   =  next( pending , None )
+    if trailing:
+        yield space_like( chunk ) * trailing , [ ]
+
+
+
+# ==================================================
+# FUNCTION: _flatten
+# ==================================================
+#
+# Input:  iterable of position arrays, or of indices
+#
+# Output: iterator over the individual indices
+#
+# ==================================================
+def _flatten( positions ):
+    positions  =  iter( positions )
+    first      =  next( positions , None )
+    if first is None:
+        return iter( ( ) )
+    if isinstance( first , int ):
+        return chain( ( first , ) , positions )
+    return chain.from_iterable( chain( ( first , ) , positions ) )
+
+
+
+# ==================================================
+# FUNCTION: write_layout_chunk
+# ==================================================
+#
+# Input:
+#       -   layout_file: binary file to append to
+#       -   positions:   array of global indices from
+#                        remove_spaces_stream
+#
+# Output: N/A (positions are appended to the file)
+#
+# ==================================================
+def write_layout_chunk( layout_file , positions ):
+    if positions.typecode != POSITION_TYPECODE:
+        positions  =  array( POSITION_TYPECODE , positions )
+    if sys.byteorder != 'little':
+        positions  =  array( POSITION_TYPECODE , positions )
+        positions.byteswap( )
+    layout_file.write( positions.tobytes( ) )
+
+
+
+# ==================================================
+# FUNCTION: read_layout_stream
+# ==================================================
+#
+# Input:
+#       -   layout_file: binary file written with
+#                        write_layout_chunk
+#       -   chunk_size:  positions per array
+#
+# Output: generator of position arrays
+#
+# ==================================================
+def read_layout_stream( layout_file , chunk_size=DEFAULT_CHUNK_SIZE ):
+    itemsize  =  array( POSITION_TYPECODE ).itemsize
+    while True:
+        data  =  layout_file.read( chunk_size * itemsize )
+        if not data:
+            return
+        if len( data ) % itemsize:
+            raise ValueError( 'truncated layout file' )
+        positions  =  array( POSITION_TYPECODE )
+        positions.frombytes( data )
+        if sys.byteorder != 'little':
+            positions.byteswap( )
+        yield positions
+
+
+
+# ==================================================
+# FUNCTION: remove_spaces_file
+# ==================================================
+#
+# Input:
+#       -   source:      file to strip
+#       -   destination: file to write the stripped text
+#       -   layout_file: binary file for the positions
+#       -   chunk_size:  characters (or bytes) per read
+#
+# Output: N/A (results are written to the files)
+#
+# Task:   drive remove_spaces_stream, writing the
+#         stripped text and layout as each chunk is done
+#
+# ==================================================
+def remove_spaces_file( source , destination , layout_file , chunk_size=DEFAULT_CHUNK_SIZE ):
+    for stripped , positions in remove_spaces_stream( source , chunk_size ):
+        destination.write( stripped )
+        write_layout_chunk( layout_file , positions )
+
+
+
+# ==================================================
+# FUNCTION: restore_spaces_file
+# ==================================================
+#
+# Input:
+#       -   source:      file holding the stripped text
+#       -   layout_file: binary file written by
+#                        remove_spaces_file
+#       -   destination: file to write the restored text
+#       -   chunk_size:  characters (or bytes) per read
+#
+# Output: N/A (restored text is written to destination)
+#
+# ==================================================
+def restore_spaces_file( source , layout_file , destination , chunk_size=DEFAULT_CHUNK_SIZE ):
+    positions  =  read_layout_stream( layout_file , chunk_size )
+    for restored in restore_spaces_stream( source , positions , chunk_size ):
+        destination.write( restored )
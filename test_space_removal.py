@@ -0,0 +1,439 @@
+# ==================================================
+# test_space_removal.py
+# ==================================================
+#
+# Program: Space Removal and Replacement
+# Author:  Drake Young
+#
+# File Description:
+#   This file (test_space_removal.py) holds the
+#   regression tests: round trips, failure paths and
+#   the edge cases found in review. Run it with
+#
+#       python -m unittest test_space_removal
+#
+#   (or with pytest, which collects the same cases).
+#
+# ==================================================
+
+
+
+# ==================================================
+# IMPORTS
+# ==================================================
+#
+#   *   asyncio:   driving async_service
+#   *   glob:      finding batch.py's shards
+#   *   io:        in-memory streams
+#   *   os:        killing a worker process
+#   *   random:    seeding the RWOADL walks
+#   *   shutil / tempfile: scratch directories
+#   *   signal:    SIGKILL for that worker
+#   *   struct:    hand-made worker frames
+#   *   threading: stages open in two threads
+#   *   unittest:  the test framework (mock: silencing
+#                  argparse errors)
+#   *   concurrent.futures: a shut down executor
+#   *   project modules: the code under test
+#
+# ==================================================
+import asyncio
+import glob
+import io
+import os
+import random
+import shutil
+import signal
+import struct
+import tempfile
+import threading
+import unittest
+import unittest.mock
+from concurrent.futures import ThreadPoolExecutor
+
+import async_service
+import basic_method
+import batch
+import benchmark
+import cli
+import container
+import instrumentation
+import RWOADL_initial
+import rwoadl_parallel
+import worker_daemon
+
+
+
+# ==================================================
+# CLASS: AsyncServiceTests
+# ==================================================
+#
+# Description:
+#   async_service.BatchingService must answer every
+#   request, even when its executor fails.
+#
+# ==================================================
+class AsyncServiceTests( unittest.TestCase ):
+
+    def run_async( self , coroutine ):
+        return asyncio.run( asyncio.wait_for( coroutine , 30 ) )
+
+    def test_round_trip( self ):
+        async def go( ):
+            service            =  async_service.BatchingService( executor=ThreadPoolExecutor( ) )
+            stripped , layout  =  await service.remove( 'a b  c' )
+            restored           =  await service.restore( stripped , layout )
+            await service.close( )
+            return stripped , restored
+        self.assertEqual( self.run_async( go( ) ) , ( 'abc' , 'a b  c' ) )
+
+    def test_shut_down_executor_fails_requests( self ):
+        async def go( ):
+            executor  =  ThreadPoolExecutor( )
+            executor.shutdown( )
+            service   =  async_service.BatchingService( executor=executor , max_latency=0 )
+            for _ in range( 2 ):                        # the collector must survive the first
+                with self.assertRaises( RuntimeError ):
+                    await service.remove( 'a b' )
+            await service.close( )
+        self.run_async( go( ) )
+
+    @unittest.skipUnless( hasattr( signal , 'SIGKILL' ) , 'needs SIGKILL' )
+    def test_killed_worker_is_replaced( self ):
+        async def go( ):
+            service  =  async_service.BatchingService( max_latency=0 )
+            self.assertEqual( ( await service.remove( 'a b' ) )[ 0 ] , 'ab' )
+            for process in list( service.executor._processes.values( ) ):
+                os.kill( process.pid , signal.SIGKILL )
+            await asyncio.sleep( 0.5 )
+            try:
+                await service.remove( 'x y' )
+            except Exception:
+                pass                                    # the batch on the dead pool may fail
+            self.assertEqual( ( await service.remove( 'c d' ) )[ 0 ] , 'cd' )
+            await service.close( )
+        self.run_async( go( ) )
+
+
+
+# ==================================================
+# CLASS: CheckpointTests
+# ==================================================
+#
+# Description:
+#   A search resumed from its last checkpoint must end
+#   exactly as the uninterrupted search did, for both
+#   engines and both directions, with resume_from_
+#   checkpoint's default arguments.
+#
+# ==================================================
+class CheckpointTests( unittest.TestCase ):
+    TEXT  =  'the quick brown fox jumps over the lazy dog'
+
+    def setUp( self ):
+        self.directory  =  tempfile.mkdtemp( )
+        self.path       =  os.path.join( self.directory , 'search.ckpt' )
+
+    def tearDown( self ):
+        shutil.rmtree( self.directory )
+
+    def check_resume( self , solve ):
+        random.seed( 3 )
+        expected  =  solve( )
+        state     =  random.getstate( )
+        random.seed( 3 )
+        solve( checkpoint=RWOADL_initial.Checkpointer( self.path , every=7 ) )
+        random.seed( 99 )                               # resuming must restore the generator
+        self.assertEqual( RWOADL_initial.resume_from_checkpoint( self.path , self.TEXT ) , expected )
+        self.assertEqual( random.getstate( ) , state )
+
+    def test_resume_remove( self ):
+        for solve in ( RWOADL_initial.remove_spaces , RWOADL_initial.remove_spaces_compact ):
+            self.check_resume( lambda **options : solve( self.TEXT , 5 , **options ) )
+
+    def test_resume_restore_with_defaults( self ):
+        removal  =  self.TEXT.replace( ' ' , '' )
+        for solve in ( RWOADL_initial.restore_spaces , RWOADL_initial.restore_spaces_compact ):
+            self.check_resume( lambda **options : solve( self.TEXT , removal , 5 , **options ) )
+
+
+
+# ==================================================
+# CLASS: SegmentedWalkTests
+# ==================================================
+#
+# Description:
+#   rwoadl_parallel's segment mode must give what the
+#   serial walk gives, including on short texts and
+#   uneven cuts that leave one-character segments.
+#
+# ==================================================
+class SegmentedWalkTests( unittest.TestCase ):
+    CASES  =  [ ( 'abc defgh' , 3 ) , ( 'ab' , 4 ) , ( 'abcd' , 4 ) , ( 'a b' , 3 ) ,
+                ( 'a bc d efg' , 5 ) , ( 'The Quick Brown Fox' , 7 ) ]
+
+    def test_matches_serial_walk( self ):
+        with ThreadPoolExecutor( ) as executor:
+            for text , walkers in self.CASES:
+                random.seed( 0 )
+                removal   =  RWOADL_initial.remove_spaces_compact( text , 5 )
+                restored  =  RWOADL_initial.restore_spaces_compact( text , removal , 5 )
+                self.assertEqual( rwoadl_parallel.remove_spaces_segmented(
+                                      text , walkers , executor=executor ) , removal )
+                self.assertEqual( rwoadl_parallel.restore_spaces_segmented(
+                                      text , removal , walkers , executor=executor ) , restored )
+
+
+
+# ==================================================
+# CLASS: BatchTests
+# ==================================================
+#
+# Description:
+#   batch.py must shard every document in path order,
+#   restorable, while only a window of batches is in
+#   flight.
+#
+# ==================================================
+class BatchTests( unittest.TestCase ):
+
+    def setUp( self ):
+        self.directory  =  tempfile.mkdtemp( )
+
+    def tearDown( self ):
+        shutil.rmtree( self.directory )
+
+    def test_corpus_round_trip_in_order( self ):
+        source     =  os.path.join( self.directory , 'source' )
+        output     =  os.path.join( self.directory , 'output' )
+        os.makedirs( source )
+        documents  =  { }
+        for i in range( 53 ):
+            path               =  os.path.join( source , 'doc%03d.txt' % i )
+            documents[ path ]  =  ( ' a b %d  c ' % i * ( i + 1 ) ).encode( 'ascii' )
+            with open( path , 'wb' ) as f:
+                f.write( documents[ path ] )
+        stats  =  batch.process_corpus( source , output , workers=2 , shard_size=500 , batch_size=4 )
+        seen   =  [ ]
+        for index in sorted( glob.glob( os.path.join( output , '*.index.jsonl' ) ) ):
+            for path , stripped , layout in batch.read_shard( index ):
+                self.assertEqual( basic_method.restore_spaces( stripped , layout ) , documents[ path ] )
+                seen.append( path )
+        self.assertEqual( seen , sorted( documents ) )
+        self.assertEqual( stats[ 'documents' ] , 53 )
+
+    def test_window_is_bounded( self ):
+        submitted  =  [ ]
+
+        class Recorder( ThreadPoolExecutor ):
+            def submit( self , func , batch ):
+                submitted.append( batch )
+                return super( Recorder , self ).submit( func , batch )
+
+        paths  =  [ ]
+        for i in range( 40 ):
+            path  =  os.path.join( self.directory , '%02d.txt' % i )
+            with open( path , 'wb' ) as f:
+                f.write( b'a b' )
+            paths.append( path )
+        with Recorder( 1 ) as pool:
+            results  =  batch._ordered_batches( pool , paths , 2 , 3 )
+            next( results )
+            self.assertLessEqual( len( submitted ) , 3 )
+            self.assertEqual( len( list( results ) ) , 39 )
+
+
+
+# ==================================================
+# CLASS: BenchmarkTests
+# ==================================================
+#
+# Description:
+#   benchmark.py refuses a measurement with no timed
+#   calls instead of crashing in summarize( ).
+#
+# ==================================================
+class BenchmarkTests( unittest.TestCase ):
+
+    def test_repeats_must_be_positive( self ):
+        with self.assertRaises( ValueError ):
+            benchmark.time_stage( lambda : None , 0 , 0 )
+        with self.assertRaises( SystemExit ) , \
+             unittest.mock.patch( 'sys.stderr' , io.StringIO( ) ):
+            benchmark.main( [ '--repeats' , '0' ] )
+
+
+
+# ==================================================
+# CLASS: CommandLineTests
+# ==================================================
+#
+# Description:
+#   cli.py parses everyday strip/restore command lines
+#   without argparse; the result must match argparse's,
+#   and anything else must be left to argparse.
+#
+# ==================================================
+class CommandLineTests( unittest.TestCase ):
+
+    def test_simple_parse_matches_argparse( self ):
+        for argv in ( [ 'strip' ] ,
+                      [ 'strip' , 'in.txt' , '-o' , 'out.txt' , '--layout' , 'out.layout' ] ,
+                      [ 'strip' , '-' , '--layout=l' , '--workers' , '3' , '--pool' , 'thread' ,
+                        '--stats' , '--pretty' , '--lines' , '--block-size=10' ] ,
+                      [ 'restore' , 'in.txt' , '--layout' , 'in.layout' , '-o' , 'out.txt' ] ):
+            self.assertEqual( vars( cli._parse_simple( argv ) ) , vars( cli._parse_full( argv ) ) )
+
+    def test_unusual_arguments_need_argparse( self ):
+        for argv in ( [ ] , [ 'bench' ] , [ 'restore' ] , [ 'strip' , '-h' ] , [ 'strip' , 'a' , 'b' ] ,
+                      [ 'strip' , '--workers' , 'x' ] , [ 'strip' , '-o' ] ,
+                      [ 'restore' , '--lines' , '--layout' , 'l' ] ):
+            self.assertIsNone( cli._parse_simple( argv ) , argv )
+
+    def test_stream_round_trip( self ):
+        text      =  b'  a b  c\n d ' * 1000
+        stripped  =  io.BytesIO( )
+        layout    =  io.BytesIO( )
+        cli.strip_stream( io.BytesIO( text ) , stripped , layout , block_size=37 )
+        restored  =  io.BytesIO( )
+        cli.restore_stream( io.BytesIO( stripped.getvalue( ) ) , io.BytesIO( layout.getvalue( ) ) ,
+                            restored , block_size=41 )
+        self.assertEqual( restored.getvalue( ) , text )
+
+
+
+# ==================================================
+# CLASS: ContainerTests
+# ==================================================
+#
+# Description:
+#   container.py: a container cut short anywhere (in
+#   the header, index, layout or text) is reported as
+#   ValueError, with or without the checksum check.
+#
+# ==================================================
+class ContainerTests( unittest.TestCase ):
+
+    def setUp( self ):
+        text   =  ' '.join( 'word%d' % i for i in range( 300 ) )
+        out    =  io.BytesIO( )
+        container.strip_to_container( text , out , block_size=16 )
+        self.text  =  text
+        self.data  =  out.getvalue( )
+
+    def test_round_trip( self ):
+        self.assertEqual( container.restore_from_container( io.BytesIO( self.data ) ) , self.text )
+
+    def test_truncated_raises_value_error( self ):
+        index_end  =  container.HEADER_SIZE + 19 * container.INDEX_SIZE
+        for cut in ( 0 , 10 , container.HEADER_SIZE , container.HEADER_SIZE + 5 ,
+                     index_end + 3 , len( self.data ) - 1 ):
+            for verify in ( True , False ):
+                with self.assertRaises( ValueError ):
+                    container.read_container( io.BytesIO( self.data[ : cut ] ) , verify )
+
+
+
+# ==================================================
+# CLASS: InstrumentationTests
+# ==================================================
+#
+# Description:
+#   instrumentation.py: text is counted in encoded
+#   bytes, and each thread keeps its own stack of open
+#   stages.
+#
+# ==================================================
+class InstrumentationTests( unittest.TestCase ):
+
+    def tearDown( self ):
+        instrumentation.disable( )
+
+    def test_text_counted_in_bytes( self ):
+        events  =  [ ]
+        instrumentation.enable( [ events.append ] )
+        strip   =  instrumentation.instrumented( 'remove' )( basic_method.remove_spaces_fast )
+        strip( 'caf\u00e9 au lait' )
+        self.assertEqual( events[ 0 ][ 'bytes' ] , len( 'caf\u00e9 au lait'.encode( 'utf-8' ) ) )
+
+    def test_stage_stacks_per_thread( self ):
+        events     =  [ ]
+        collector  =  instrumentation.enable( [ events.append ] , trace_allocations=True )
+        inside     =  threading.Event( )
+        release    =  threading.Event( )
+
+        def other( ):
+            with instrumentation.stage( 'other' ):
+                inside.set( )
+                release.wait( 5 )
+
+        thread  =  threading.Thread( target=other )
+        with instrumentation.stage( 'outer' ) as outer:
+            thread.start( )
+            inside.wait( 5 )
+            self.assertEqual( collector.open_stages( ) , [ outer ] )
+            release.set( )
+            thread.join( )
+            self.assertEqual( collector.open_stages( ) , [ outer ] )
+        self.assertEqual( collector.open_stages( ) , [ ] )
+        self.assertEqual( sorted( event[ 'name' ] for event in events ) , [ 'other' , 'outer' ] )
+
+
+
+# ==================================================
+# CLASS: WorkerDaemonTests
+# ==================================================
+#
+# Description:
+#   worker_daemon.py framing: whole frames are served,
+#   a frame cut short is an error (never an empty
+#   successful job), and only a socket is replaced.
+#
+# ==================================================
+class WorkerDaemonTests( unittest.TestCase ):
+
+    def serve( self , data ):
+        output  =  io.BytesIO( )
+        worker_daemon.serve_stream( io.BytesIO( data ) , output )
+        return output.getvalue( )
+
+    def request( self , operation , a , b=b'' ):
+        return struct.pack( worker_daemon.REQUEST_FORMAT , operation , b'b' , len( a ) , len( b ) ) + a + b
+
+    def test_frames_round_trip( self ):
+        response  =  self.serve( self.request( b's' , b'a b' ) + self.request( b's' , b'c' ) )
+        status , length_a , length_b  =  struct.unpack_from( worker_daemon.RESPONSE_FORMAT , response )
+        self.assertEqual( status , worker_daemon.STATUS_OK )
+        self.assertEqual( response[ worker_daemon.RESPONSE_SIZE : worker_daemon.RESPONSE_SIZE + length_a ] ,
+                          b'ab' )
+        self.assertEqual( self.serve( b'' ) , b'' )
+
+    def test_truncated_frames_raise( self ):
+        whole  =  self.request( b's' , b'a b c' )
+        for cut in ( 3 , worker_daemon.REQUEST_SIZE , len( whole ) - 1 ):
+            with self.assertRaises( EOFError ):
+                self.serve( whole[ : cut ] )
+
+    def test_client_round_trip( self ):
+        with worker_daemon.spawn( ) as client:
+            stripped , layout  =  client.strip( 'a  b c' )
+            self.assertEqual( stripped , 'abc' )
+            self.assertEqual( client.restore( stripped , layout ) , 'a  b c' )
+
+    def test_socket_path_must_be_a_socket( self ):
+        directory  =  tempfile.mkdtemp( )
+        try:
+            path  =  os.path.join( directory , 'not-a-socket' )
+            with open( path , 'w' ) as f:
+                f.write( 'keep me' )
+            with self.assertRaises( FileExistsError ):
+                worker_daemon.serve_socket( path )
+            self.assertTrue( os.path.exists( path ) )
+        finally:
+            shutil.rmtree( directory )
+
+
+
+# Only perform program operations if this file if it's the main file
+if __name__ == '__main__':
+    unittest.main( )
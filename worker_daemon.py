@@ -0,0 +1,380 @@
+# ==================================================
+# worker_daemon.py
+# ==================================================
+#
+# Program: Space Removal and Replacement
+# Author:  Drake Young
+#
+# File Description:
+#   This file (worker_daemon.py) keeps one Python
+#   process running to strip and restore many small
+#   jobs, so callers that used to start a fresh
+#   interpreter per job (tens of milliseconds of
+#   startup and imports) pay only a round trip over a
+#   local socket or pipe.
+#
+#       python worker_daemon.py --socket /tmp/spaces.sock
+#       python worker_daemon.py --stdio
+#
+#   Clients use connect( path ) for the socket, or
+#   spawn( ), which starts a private --stdio worker and
+#   talks to it over its pipes.
+#
+# Protocol (all integers little-endian):
+#   -   request:  REQUEST_FORMAT header ( operation ,
+#                 kind , length of part a , length of
+#                 part b ), then part a, then part b
+#                   strip:   a = text,     b = empty
+#                   restore: a = stripped, b = layout
+#   -   response: RESPONSE_FORMAT header ( status ,
+#                 length of a , length of b ), then
+#                 the parts
+#                   strip:   a = stripped, b = layout
+#                   restore: a = restored, b = empty
+#                   error:   a = message,  b = empty
+#   -   kind b'b' works on the bytes as given; kind
+#       b't' treats them as UTF-8 text, so positions
+#       count characters rather than bytes
+#   -   layouts travel as the streaming.py layout
+#       format (unsigned 64-bit positions)
+#
+# ==================================================
+
+
+
+# ==================================================
+# IMPORTS
+# ==================================================
+#
+#   *   argparse:     command line options
+#   *   os / sys:     the socket path and std streams
+#   *   stat:         checking the socket path is a
+#                     socket before replacing it
+#   *   struct:       frame headers
+#   *   array:        layout encoding
+#   *   basic_method: remove_spaces_fast/restore_spaces
+#   *   space_layout: SpaceLayout, the layout type
+#
+#   Imported where first needed:
+#   *   socket / socketserver: the socket server and
+#                              client
+#   *   signal:                clean shutdown of the
+#                              socket server
+#   *   subprocess:            spawn( )
+#
+# ==================================================
+import argparse
+import os
+import stat
+import struct
+import sys
+from array import array
+
+from basic_method import remove_spaces_fast, restore_spaces
+from space_layout import SpaceLayout
+
+
+
+# ==================================================
+# CONSTANTS
+# ==================================================
+#
+#   *   REQUEST_FORMAT:  operation, kind, two lengths
+#   *   RESPONSE_FORMAT: status, two lengths
+#   *   STATUS_OK/ERROR: response status codes
+#
+# ==================================================
+REQUEST_FORMAT   =  '<ccQQ'
+REQUEST_SIZE     =  struct.calcsize( REQUEST_FORMAT )
+RESPONSE_FORMAT  =  '<cQQ'
+RESPONSE_SIZE    =  struct.calcsize( RESPONSE_FORMAT )
+STATUS_OK        =  b'o'
+STATUS_ERROR     =  b'e'
+
+
+
+# ==================================================
+# FUNCTION: _pack_layout / _unpack_layout
+# ==================================================
+#
+# Task:   convert a layout to and from its wire form
+#
+# ==================================================
+def _pack_layout( layout ):
+    positions  =  array( 'Q' , layout )
+    if sys.byteorder != 'little':
+        positions.byteswap( )
+    return positions.tobytes( )
+
+def _unpack_layout( data ):
+    positions  =  array( 'Q' )
+    positions.frombytes( data )
+    if sys.byteorder != 'little':
+        positions.byteswap( )
+    return SpaceLayout.from_array( positions )
+
+
+
+# ==================================================
+# FUNCTION: _read_exact
+# ==================================================
+#
+# Input:
+#       -   reader:   binary file object
+#       -   size:     bytes wanted
+#       -   boundary: True when reading a frame header,
+#                     where the input may cleanly end
+#
+# Output: exactly size bytes, or b'' when the input
+#         ends at a frame boundary
+#
+# Notes:
+#       -   any other shortfall (a header or part cut
+#           off before its promised length) raises
+#           EOFError rather than passing on a short or
+#           empty frame
+#
+# ==================================================
+def _read_exact( reader , size , boundary=False ):
+    data  =  reader.read( size ) if size else b''
+    while len( data ) < size:
+        more  =  reader.read( size - len( data ) )
+        if not more:
+            break
+        data  +=  more
+    if len( data ) < size:
+        if boundary and not data:
+            return b''
+        raise EOFError( 'connection closed mid-frame (%d of %d bytes)' % ( len( data ) , size ) )
+    return data
+
+
+
+# ==================================================
+# FUNCTION: handle_job
+# ==================================================
+#
+# Input:  operation, kind and the two request parts
+#
+# Output: the two response parts
+#
+# ==================================================
+def handle_job( operation , kind , a , b ):
+    text  =  kind == b't'
+    if text:
+        a  =  a.decode( 'utf-8' )
+    if operation == b's':
+        stripped , layout  =  remove_spaces_fast( a )
+        stripped           =  stripped.encode( 'utf-8' ) if text else stripped
+        return stripped , _pack_layout( layout )
+    if operation == b'r':
+        restored  =  restore_spaces( a , _unpack_layout( b ) )
+        return ( restored.encode( 'utf-8' ) if text else restored ) , b''
+    raise ValueError( 'unknown operation %r' % operation )
+
+
+
+# ==================================================
+# FUNCTION: serve_stream
+# ==================================================
+#
+# Input:
+#       -   reader: binary file object requests arrive on
+#       -   writer: binary file object for the responses
+#
+# Output: N/A (returns when the input ends)
+#
+# ==================================================
+def serve_stream( reader , writer ):
+    while True:
+        header  =  _read_exact( reader , REQUEST_SIZE , boundary=True )
+        if not header:
+            return
+        operation , kind , length_a , length_b  =  struct.unpack( REQUEST_FORMAT , header )
+        a  =  _read_exact( reader , length_a )
+        b  =  _read_exact( reader , length_b )
+        try:
+            status , ( a , b )  =  STATUS_OK , handle_job( operation , kind , a , b )
+        except Exception as error:
+            message             =  '%s: %s' % ( type( error ).__name__ , error )
+            status , ( a , b )  =  STATUS_ERROR , ( message.encode( 'utf-8' ) , b'' )
+        writer.write( struct.pack( RESPONSE_FORMAT , status , len( a ) , len( b ) ) )
+        writer.write( a )
+        writer.write( b )
+        writer.flush( )
+
+
+
+# ==================================================
+# FUNCTION: serve_socket
+# ==================================================
+#
+# Input:  path of the Unix socket to listen on
+#
+# Output: N/A (serves until interrupted)
+#
+# Task:   one thread per connection; each connection
+#         may send any number of jobs. A stale socket
+#         left at path is replaced; any other kind of
+#         file there is refused.
+#
+# ==================================================
+def serve_socket( path ):
+    import socketserver
+
+    class Handler( socketserver.StreamRequestHandler ):
+        def handle( self ):
+            serve_stream( self.rfile , self.wfile )
+
+    class Server( socketserver.ThreadingMixIn , socketserver.UnixStreamServer ):
+        daemon_threads  =  True
+
+    if os.path.lexists( path ):
+        if not stat.S_ISSOCK( os.lstat( path ).st_mode ):
+            raise FileExistsError( '%s exists and is not a socket' % path )
+        os.unlink( path )
+    server  =  Server( path , Handler )
+    try:
+        server.serve_forever( )
+    finally:
+        server.server_close( )
+        os.unlink( path )
+
+
+
+# ==================================================
+# CLASS: WorkerClient
+# ==================================================
+#
+# Description:
+#   Sends jobs to a running worker over a pair of
+#   binary file objects, one job at a time. Use
+#   connect( ) or spawn( ) to make one.
+#
+# ==================================================
+class WorkerClient( object ):
+
+    def __init__( self , reader , writer , closer=None ):
+        self.reader  =  reader
+        self.writer  =  writer
+        self.closer  =  closer
+
+    # ==================================================
+    # METHOD: strip / restore
+    # ==================================================
+    #
+    # Output: same as basic_method.remove_spaces_fast /
+    #         basic_method.restore_spaces; str input
+    #         gives str output, bytes gives bytes
+    #
+    # ==================================================
+    def strip( self , text ):
+        stripped , layout  =  self._call( b's' , text , b'' )
+        return stripped , _unpack_layout( layout )
+
+    def restore( self , stripped , layout ):
+        return self._call( b'r' , stripped , _pack_layout( layout ) )[ 0 ]
+
+    def _call( self , operation , a , b ):
+        text  =  isinstance( a , str )
+        if text:
+            a  =  a.encode( 'utf-8' )
+        self.writer.write( struct.pack( REQUEST_FORMAT , operation , b't' if text else b'b' ,
+                                        len( a ) , len( b ) ) )
+        self.writer.write( a )
+        self.writer.write( b )
+        self.writer.flush( )
+        header  =  _read_exact( self.reader , RESPONSE_SIZE , boundary=True )
+        if not header:
+            raise EOFError( 'worker closed the connection' )
+        status , length_a , length_b  =  struct.unpack( RESPONSE_FORMAT , header )
+        a  =  _read_exact( self.reader , length_a )
+        b  =  _read_exact( self.reader , length_b )
+        if status != STATUS_OK:
+            raise RuntimeError( 'worker: %s' % a.decode( 'utf-8' ) )
+        return ( a.decode( 'utf-8' ) if text else a ) , b
+
+    def close( self ):
+        if self.closer is not None:
+            self.closer( )
+            self.closer  =  None
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self , *exc_info ):
+        self.close( )
+        return False
+
+
+
+# ==================================================
+# FUNCTION: connect / spawn
+# ==================================================
+#
+# connect: client for a worker listening on the Unix
+#          socket at path
+# spawn:   start a private worker on --stdio and return
+#          a client talking to it over its pipes; the
+#          worker exits when the client is closed
+#
+# ==================================================
+def connect( path ):
+    import socket
+    sock    =  socket.socket( socket.AF_UNIX , socket.SOCK_STREAM )
+    sock.connect( path )
+    reader  =  sock.makefile( 'rb' )
+    writer  =  sock.makefile( 'wb' )
+
+    def close( ):
+        writer.close( )
+        reader.close( )
+        sock.close( )
+    return WorkerClient( reader , writer , close )
+
+def spawn( python=None ):
+    import subprocess
+    process  =  subprocess.Popen( [ python or sys.executable , os.path.abspath( __file__ ) , '--stdio' ] ,
+                                  stdin=subprocess.PIPE , stdout=subprocess.PIPE )
+
+    def close( ):
+        process.stdin.close( )
+        process.wait( )
+        process.stdout.close( )
+    return WorkerClient( process.stdout , process.stdin , close )
+
+
+
+# ==================================================
+# FUNCTION: main
+# ==================================================
+#
+# Input:  command line arguments (defaults to sys.argv)
+#
+# Output: N/A
+#
+# ==================================================
+def main( argv=None ):
+    parser  =  argparse.ArgumentParser( description='Serve strip/restore jobs from one process.' )
+    where   =  parser.add_mutually_exclusive_group( required=True )
+    where.add_argument( '--socket' , help='Unix socket path to listen on' )
+    where.add_argument( '--stdio' , action='store_true' , help='serve jobs on stdin/stdout' )
+    args    =  parser.parse_args( argv )
+
+    if args.stdio:
+        serve_stream( sys.stdin.buffer , sys.stdout.buffer )
+    else:
+        # stop cleanly (removing the socket file) on SIGTERM as well as Ctrl-C
+        import signal
+        signal.signal( signal.SIGTERM , lambda signum , frame : sys.exit( 0 ) )
+        try:
+            serve_socket( args.socket )
+        except KeyboardInterrupt:
+            pass
+    return
+
+
+
+# Only perform program operations if this file if it's the main file
+if __name__ == '__main__':
+    main( )